@@ -6,19 +6,13 @@ echo ========================================================
 echo      🏦 LAB RISCO QUANT: AUTOMACAO FINANCEIRA 🚀
 echo ========================================================
 echo.
-echo [1/3] 🔄 Conectando no Banco de Dados e Atualizando Cotacoes...
-python src/scripts/etl_sql.py
-
-echo.
-echo [2/3] 📊 Calculando Riscos e Gerando Dashboard Excel...
-python src/scripts/relatorio_excel.py
-
+echo 🔄 ETL ^> Metricas ^> Excel ^> Distribuicao (um unico processo Python)
+echo    Reexecucao seletiva: EXECUTAR_SISTEMA.bat --etapas excel email
 echo.
-echo [3/3] 📧 Modulo de Distribuicao de Relatorios...
-python src/scripts/enviar_email.py
+python src/scripts/pipeline.py %*
 
 echo.
 echo ========================================================
-echo ✅ CICLO COMPLETO FINALIZADO!
+echo ✅ EXECUCAO ENCERRADA (ver o resumo das etapas acima)
 echo ========================================================
 pause
\ No newline at end of file
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+import risco_movel as rm
+
+# ==============================================================================
+# BACKTEST DE VaR (FORA DA AMOSTRA)
+# Para cada dia t, o VaR previsto é calculado com a janela que termina em t-1 e
+# comparado ao retorno realizado em t. Exceção = perda maior que o VaR previsto.
+# Testes: Kupiec (POF), Christoffersen (independência e cobertura condicional)
+# e zonas do semáforo de Basileia. Todos os ativos x modelos x níveis de uma vez.
+# ==============================================================================
+
+MODELOS = ('Histórico', 'Normal', 'Cornish-Fisher')
+NIVEIS = (1, 2.5, 5)
+JANELA = 252
+
+# Semáforo de Basileia: probabilidade binomial acumulada de até x exceções
+LIMITE_AMARELO = 0.95
+LIMITE_VERMELHO = 0.9999
+
+
+def _kupiec(n, x, p):
+    """LR de proporção de falhas (POF), ~ qui-quadrado(1)."""
+    from scipy.special import xlogy  # SciPy carregado no primeiro backtest, não no import do módulo
+    with np.errstate(invalid='ignore', divide='ignore'):
+        phat = x / n
+        lr = -2 * (xlogy(n - x, 1 - p) + xlogy(x, p)) + 2 * (xlogy(n - x, 1 - phat) + xlogy(x, phat))
+    return np.maximum(lr, 0.0)
+
+
+def _christoffersen(n00, n01, n10, n11):
+    """LR de independência das exceções (cadeia de Markov de 1ª ordem), ~ qui-quadrado(1)."""
+    from scipy.special import xlogy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pi01 = n01 / (n00 + n01)
+        pi11 = n11 / (n10 + n11)
+        pi = (n01 + n11) / (n00 + n01 + n10 + n11)
+        restrita = xlogy(n00 + n10, 1 - pi) + xlogy(n01 + n11, pi)
+        livre = (xlogy(n00, 1 - pi01) + xlogy(n01, pi01) +
+                 xlogy(n10, 1 - np.nan_to_num(pi11)) + xlogy(n11, np.nan_to_num(pi11)))
+        lr = -2 * (restrita - livre)
+    return np.maximum(np.nan_to_num(lr), 0.0)
+
+
+def _zona(n, x, p):
+    """Zona do semáforo ('Verde', 'Amarela', 'Vermelha') pela binomial acumulada de x exceções."""
+    import scipy.stats
+    acumulada = scipy.stats.binom.cdf(x, n, p)
+    return np.where(acumulada < LIMITE_AMARELO, 'Verde',
+                    np.where(acumulada < LIMITE_VERMELHO, 'Amarela', 'Vermelha'))
+
+
+def backtest_var(retornos, janela=JANELA, niveis=NIVEIS, modelos=MODELOS):
+    """
+    Backtest fora da amostra do VaR móvel. Retorna um DataFrame com uma linha por
+    (Ativo, Modelo, Nível): observações, exceções, esperado, taxa, estatísticas LR,
+    p-valores (Kupiec, Christoffersen, Cobertura Condicional) e zona de Basileia.
+    """
+    import scipy.stats
+    previsoes = rm.vars_moveis(retornos, janela, niveis)
+    r = retornos.to_numpy(dtype=np.float64)
+    tickers = list(retornos.columns)
+    partes = []
+    for modelo in modelos:
+        for nivel in niveis:
+            # Previsão para t = VaR da janela que termina em t-1
+            var = np.vstack([np.full((1, r.shape[1]), np.nan), previsoes[(modelo, nivel)][:-1]])
+            valido = ~np.isnan(var) & ~np.isnan(r)
+            with np.errstate(invalid='ignore'):
+                excecao = (r < -var) & valido
+            n = valido.sum(axis=0)
+            x = excecao.sum(axis=0)
+
+            # Transições entre dias consecutivos válidos
+            par = valido[:-1] & valido[1:]
+            antes, depois = excecao[:-1], excecao[1:]
+            n00 = (~antes & ~depois & par).sum(axis=0)
+            n01 = (~antes & depois & par).sum(axis=0)
+            n10 = (antes & ~depois & par).sum(axis=0)
+            n11 = (antes & depois & par).sum(axis=0)
+
+            p = nivel / 100
+            lr_pof = _kupiec(n, x, p)
+            lr_ind = _christoffersen(n00, n01, n10, n11)
+            lr_cc = lr_pof + lr_ind
+            with np.errstate(invalid='ignore', divide='ignore'):
+                taxa = x / n
+            partes.append(pd.DataFrame({
+                'Ativo': tickers, 'Modelo': modelo, 'Nível': nivel,
+                'Observações': n, 'Exceções': x, 'Esperadas': n * p, 'Taxa': taxa,
+                'LR_Kupiec': lr_pof, 'p_Kupiec': scipy.stats.chi2.sf(lr_pof, 1),
+                'LR_Christoffersen': lr_ind, 'p_Christoffersen': scipy.stats.chi2.sf(lr_ind, 1),
+                'LR_CC': lr_cc, 'p_CC': scipy.stats.chi2.sf(lr_cc, 2),
+                'Zona': _zona(n, x, p),
+            }))
+    return pd.concat(partes, ignore_index=True)
@@ -0,0 +1,206 @@
+import sqlite3
+from operator import itemgetter
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# BASE DE PREÇOS (FORMATO LONGO)
+# Uma linha por (ticker, data): adicionar um ticker não muda o schema.
+# Chave primária composta (ticker, date) + índice por data, modo WAL para que
+# o relatório consiga ler enquanto o ETL grava.
+# Toda escrita incrementa a "geração" da base (tabela 'versao_base'), na mesma
+# transação: quem guarda cópias derivadas (ex.: snapshot_precos) sabe se está velho.
+# ==============================================================================
+
+TABELA = "precos"
+TABELA_LEGADA = "cotacoes"  # Formato antigo: uma coluna por ticker
+TABELA_VERSAO = "versao_base"
+CAMPOS = ("adj_close", "close", "volume")
+FORMATO_DATA = "%Y-%m-%d"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {tabela} (
+    ticker    TEXT NOT NULL,
+    date      TEXT NOT NULL,
+    adj_close REAL,
+    close     REAL,
+    volume    REAL,
+    PRIMARY KEY (ticker, date)
+) WITHOUT ROWID
+"""
+
+
+def _criar_schema(conn, tabela=TABELA):
+    conn.execute(_SCHEMA.format(tabela=tabela))
+    conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{tabela}_date ON {tabela} (date)")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {TABELA_VERSAO} (chave TEXT PRIMARY KEY, geracao INTEGER NOT NULL)")
+
+
+def _existe(conn, nome):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (nome,)).fetchone() is not None
+
+
+def conectar(caminho_db, migrar=True):
+    """Abre a base em modo WAL, garante o schema e migra a tabela larga antiga, se existir."""
+    conn = sqlite3.connect(caminho_db, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    _criar_schema(conn)
+    if migrar and _existe(conn, TABELA_LEGADA):
+        migrar_tabela_larga(conn)
+    return conn
+
+# ==============================================================================
+# ESCRITA (UPSERT TRANSACIONAL E TROCA ATÔMICA)
+# ==============================================================================
+
+def para_formato_longo(adj_close, close=None, volume=None):
+    """Converte DataFrames largos (Date x Ticker) no formato longo da base."""
+    campos = {"adj_close": adj_close, "close": close if close is not None else adj_close, "volume": volume}
+    partes = []
+    for nome, df in campos.items():
+        if df is None:
+            continue
+        s = df.stack()
+        s.index.names = ["date", "ticker"]
+        partes.append(s.rename(nome))
+    longo = pd.concat(partes, axis=1).reset_index()
+    longo["date"] = pd.to_datetime(longo["date"]).dt.strftime(FORMATO_DATA)
+    for nome in CAMPOS:
+        if nome not in longo.columns:
+            longo[nome] = np.nan
+    return longo.dropna(subset=["adj_close"])[["ticker", "date", *CAMPOS]]
+
+
+def _linhas(longo):
+    dados = longo[["ticker", "date", *CAMPOS]].astype(object)
+    return list(dados.where(pd.notna(dados), None).itertuples(index=False, name=None))
+
+
+def _nova_geracao(conn):
+    conn.execute(f"INSERT INTO {TABELA_VERSAO} VALUES (?, 1) "
+                 "ON CONFLICT(chave) DO UPDATE SET geracao = geracao + 1", (TABELA,))
+
+
+def gravar(conn, longo, tabela=TABELA):
+    """Upsert das linhas (ticker, date, adj_close, close, volume). Não abre nem fecha transação."""
+    sql = (f"INSERT INTO {tabela} (ticker, date, adj_close, close, volume) VALUES (?, ?, ?, ?, ?) "
+           "ON CONFLICT(ticker, date) DO UPDATE SET "
+           "adj_close = excluded.adj_close, close = excluded.close, volume = excluded.volume")
+    linhas = _linhas(longo)
+    conn.executemany(sql, linhas)
+    if linhas:
+        _nova_geracao(conn)
+    return len(linhas)
+
+
+def upsert(conn, longo):
+    """Upsert numa única transação: leitores em WAL veem tudo ou nada."""
+    with conn:
+        return gravar(conn, longo)
+
+
+def substituir(conn, longo):
+    """Recarga completa com troca atômica: grava numa tabela nova e renomeia na mesma transação."""
+    temporaria = f"{TABELA}_novo"
+    with conn:
+        conn.execute(f"DROP TABLE IF EXISTS {temporaria}")
+        conn.execute(_SCHEMA.format(tabela=temporaria))
+        n = gravar(conn, longo, tabela=temporaria)
+        conn.execute(f"DROP TABLE {TABELA}")
+        conn.execute(f"ALTER TABLE {temporaria} RENAME TO {TABELA}")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{TABELA}_date ON {TABELA} (date)")
+        _nova_geracao(conn)
+    return n
+
+
+def migrar_tabela_larga(conn):
+    """Copia a tabela larga 'cotacoes' para o formato longo e a renomeia para 'cotacoes_legado'."""
+    largo = pd.read_sql(f'SELECT * FROM "{TABELA_LEGADA}"', conn, index_col="Date")
+    largo.index = pd.to_datetime(largo.index)
+    with conn:
+        n = gravar(conn, para_formato_longo(largo))
+        conn.execute(f'ALTER TABLE "{TABELA_LEGADA}" RENAME TO "{TABELA_LEGADA}_legado"')
+    print(f"🔁 Tabela '{TABELA_LEGADA}' migrada para o formato longo ({n} cotações).")
+    return n
+
+# ==============================================================================
+# LEITURA
+# ==============================================================================
+
+def ultimas_datas(conn):
+    """Última data gravada por ticker (watermark), direto do índice da chave primária."""
+    linhas = conn.execute(f"SELECT ticker, MAX(date) FROM {TABELA} GROUP BY ticker").fetchall()
+    return {t: pd.Timestamp(d) for t, d in linhas}
+
+
+def geracao(conn):
+    """Contador de escritas da tabela de preços (0 = nunca gravada)."""
+    linha = conn.execute(f"SELECT geracao FROM {TABELA_VERSAO} WHERE chave = ?", (TABELA,)).fetchone()
+    return linha[0] if linha else 0
+
+
+def listar_tickers(conn):
+    return [t for (t,) in conn.execute(f"SELECT DISTINCT ticker FROM {TABELA} ORDER BY ticker")]
+
+
+def _filtros(tickers, inicio, fim):
+    clausulas, params = [], []
+    if tickers is not None:
+        tickers = list(tickers)
+        clausulas.append(f"ticker IN ({', '.join('?' * len(tickers))})")
+        params += tickers
+    if inicio is not None:
+        clausulas.append("date >= ?")
+        params.append(pd.Timestamp(inicio).strftime(FORMATO_DATA))
+    if fim is not None:
+        clausulas.append("date <= ?")
+        params.append(pd.Timestamp(fim).strftime(FORMATO_DATA))
+    return (" WHERE " + " AND ".join(clausulas)) if clausulas else "", params
+
+
+def ler_matrizes_numpy(conn, tickers=None, inicio=None, fim=None, campos=CAMPOS, ordem="C"):
+    """
+    Lê vários campos numa única consulta e devolve ({campo: matriz}, datas, tickers):
+    matrizes float64 (datas x tickers) na ordem de memória pedida, NaN onde não há cotação.
+    """
+    campos = list(campos)
+    if any(c not in CAMPOS for c in campos):
+        raise ValueError(f"campo deve ser um de {CAMPOS}")
+    where, params = _filtros(tickers, inicio, fim)
+    linhas = conn.execute(f"SELECT ticker, date, {', '.join(campos)} FROM {TABELA}{where}", params).fetchall()
+    if not linhas:
+        colunas = list(tickers) if tickers is not None else []
+        vazias = {c: np.empty((0, len(colunas)), order=ordem) for c in campos}
+        return vazias, pd.DatetimeIndex([], name="Date"), colunas
+    # Transpõe as tuplas coluna a coluna (itemgetter é bem mais barato que zip(*linhas))
+    coluna = lambda i: list(map(itemgetter(i), linhas))
+    pos_d, datas = pd.factorize(np.asarray(coluna(1), dtype=object), sort=True)
+    if tickers is None:
+        pos_t, colunas = pd.factorize(np.asarray(coluna(0), dtype=object), sort=True)
+        colunas = list(colunas)
+    else:
+        colunas = list(tickers)
+        indice = {t: i for i, t in enumerate(colunas)}
+        pos_t = np.fromiter(map(indice.__getitem__, coluna(0)), dtype=np.intp, count=len(linhas))
+    matrizes = {}
+    for i, campo in enumerate(campos, start=2):
+        matriz = np.full((len(datas), len(colunas)), np.nan, order=ordem)
+        matriz[pos_d, pos_t] = np.array(coluna(i), dtype=np.float64)  # None -> NaN
+        matrizes[campo] = matriz
+    return matrizes, pd.DatetimeIndex(pd.to_datetime(datas, format=FORMATO_DATA), name="Date"), colunas
+
+
+def ler_matriz_numpy(conn, tickers=None, inicio=None, fim=None, campo="adj_close"):
+    """
+    Lê a janela pedida e devolve (matriz, datas, tickers) já alinhada:
+    matriz float64 (datas x tickers), NaN onde o ticker não tem cotação na data.
+    """
+    matrizes, datas, colunas = ler_matrizes_numpy(conn, tickers, inicio, fim, [campo])
+    return matrizes[campo], datas, colunas
+
+
+def ler_matriz(conn, tickers=None, inicio=None, fim=None, campo="adj_close"):
+    """Mesmo que ler_matriz_numpy, mas como DataFrame largo (Date x Ticker)."""
+    matriz, datas, colunas = ler_matriz_numpy(conn, tickers, inicio, fim, campo)
+    return pd.DataFrame(matriz, index=datas, columns=colunas)
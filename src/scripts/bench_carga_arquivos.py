@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import tempfile
+import zipfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+import base_precos as bp
+import carga_arquivos as ca
+
+# ==============================================================================
+# BENCHMARK: CARGA EM BLOCOS DE UM DUMP GRANDE (LAYOUT LONGO, DENTRO DE UM .ZIP)
+# Gera um dump sintético (ticker, date, adj_close, close, volume) com n_ativos x
+# n_dias linhas, carrega na base sem extrair o zip e mede vazão e pico de
+# memória Python (tracemalloc): o pico deve depender do bloco, não do arquivo.
+# Uso: python bench_carga_arquivos.py [n_dias] [n_ativos ...]
+# ==============================================================================
+
+
+def dump_sintetico(caminho_zip, n_dias, n_ativos, seed=3):
+    """Escreve o dump direto no zip, um ativo por vez (o gerador também não segura tudo)."""
+    rng = np.random.default_rng(seed)
+    datas = pd.bdate_range("2010-01-04", periods=n_dias).strftime(bp.FORMATO_DATA)
+    with zipfile.ZipFile(caminho_zip, "w", zipfile.ZIP_DEFLATED) as zf:
+        with zf.open("dump.csv", "w", force_zip64=True) as f:
+            f.write(b"ticker,date,adj_close,close,volume\n")
+            for i in range(n_ativos):
+                precos = 50 * np.cumprod(1 + 0.02 * rng.standard_t(4, n_dias))
+                pd.DataFrame({"ticker": f"ATV{i:05d}", "date": datas, "adj_close": precos,
+                              "close": precos * 1.01, "volume": rng.integers(1e3, 1e6, n_dias)}
+                             ).to_csv(f, header=False, index=False)
+
+
+def main(n_dias=2500, tamanhos=(200, 1000, 2000)):
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"{'Cotações':>10} | {'Zip (MB)':>8} | {'Tempo (s)':>9} | {'Cotações/s':>10} | {'Pico (MB)':>9}")
+        for n_ativos in tamanhos:
+            caminho_zip = os.path.join(pasta, f"dump_{n_ativos}.zip")
+            caminho_db = os.path.join(pasta, f"mercado_{n_ativos}.db")
+            dump_sintetico(caminho_zip, n_dias, n_ativos)
+            # Conexão própria: mede só a carga (sem a republicação do snapshot, que lê a base inteira)
+            conn = bp.conectar(caminho_db)
+            t0 = time.perf_counter()
+            n = ca.carregar_arquivo(caminho_zip, conn=conn)
+            segundos = time.perf_counter() - t0
+            conn.close()
+            # Memória numa segunda carga (base nova): o tracemalloc distorce o tempo
+            conn = bp.conectar(os.path.join(pasta, f"memoria_{n_ativos}.db"))
+            tracemalloc.start()
+            ca.carregar_arquivo(caminho_zip, conn=conn)
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            conn.close()
+            print(f"{n:>10,} | {os.path.getsize(caminho_zip) / 1024**2:>8.1f} | {segundos:>9.1f} | "
+                  f"{n / segundos:>10,.0f} | {pico / 1024**2:>9.1f}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(args[0], tuple(args[1:])) if len(args) > 1 else main(*args)
@@ -0,0 +1,61 @@
+import time
+import sys
+import numpy as np
+
+import covariancia as cv
+from bench_motor_metricas import gerar_retornos
+
+# ==============================================================================
+# BENCHMARK: np.cov 2x2 POR ATIVO + .corr() x MATRIZ ÚNICA
+# Compara o Beta ativo a ativo (np.cov(r, bench) por ticker, como no relatório
+# antigo) mais a correlação do pandas com a MatrizCovariancia, e mede a
+# atualização EWMA de um dia contra recalcular a janela inteira.
+# Uso: python bench_covariancia.py [n_dias] [n_ativos ...]
+# ==============================================================================
+
+
+def betas_loop(retornos, bench):
+    """Referência: uma matriz 2x2 por ativo, como no loop original."""
+    b = retornos[bench]
+    betas = []
+    for t in retornos.columns:
+        matrix = np.cov(retornos[t], b)
+        betas.append(matrix[0, 1] / matrix[1, 1])
+    return np.array(betas)
+
+
+def main(n_dias=1260, tamanhos=(10, 100, 1000)):
+    print(f"⏱️  Benchmark de covariância / Beta ({n_dias} dias)")
+    print(f"{'Ativos':>7} | {'Loop+corr (s)':>13} | {'Matriz (s)':>10} | {'Speedup':>8} | "
+          f"{'+1 dia EWMA (ms)':>16} | {'Max |dif| Beta':>14}")
+    for n in tamanhos:
+        retornos = gerar_retornos(n_dias, n)
+        bench = retornos.columns[0]
+
+        t0 = time.perf_counter()
+        ref = betas_loop(retornos, bench)
+        retornos.corr()
+        t_loop = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        matriz = cv.MatrizCovariancia(retornos)
+        betas = matriz.betas(bench)
+        matriz.correlacao()
+        t_matriz = time.perf_counter() - t0
+
+        dia = retornos.iloc[-1].to_numpy()
+        t0 = time.perf_counter()
+        matriz.atualizar(dia)
+        t_dia = (time.perf_counter() - t0) * 1000
+
+        dif = np.nanmax(np.abs(betas.to_numpy() - ref))
+        print(f"{n:>7} | {t_loop:>13.3f} | {t_matriz:>10.3f} | {t_loop / t_matriz:>7.0f}x | "
+              f"{t_dia:>16.2f} | {dif:>14.2e}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    if len(args) > 1:
+        main(args[0], tuple(args[1:]))
+    else:
+        main(*args)
@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import smtplib
+import tempfile
+from email.message import EmailMessage
+
+import distribuicao as dist
+from smtp_local import ServidorSMTPLocal
+
+# ==============================================================================
+# BENCHMARK: DISTRIBUIÇÃO EM LOTE CONTRA O SMTP LOCAL
+# Compara o envio ingênuo (uma conexão nova por mensagem, anexo relido e a
+# mensagem inteira montada a cada envio) com distribuicao.distribuir (conexões
+# reaproveitadas, anexo codificado uma vez) para centenas de destinatários,
+# sem rede: o servidor é o smtp_local, com latência simulada por mensagem.
+# Uso: python bench_distribuicao.py [n_mensagens] [tamanho_anexo_kb] [atraso_ms]
+# ==============================================================================
+
+CONEXOES = (1, 4, 8)
+
+
+def envio_ingenuo(porta, destinatarios, arquivo):
+    """Referência: o que um laço simples com smtplib faria para cada destinatário."""
+    for d in destinatarios:
+        msg = EmailMessage()
+        msg['From'], msg['To'], msg['Subject'] = 'risco@lab.local', d['email'], "Relatório Risco de Mercado"
+        msg.set_content(f"Prezado(a) {d['nome']},\n\nSegue em anexo o relatório.")
+        with open(arquivo, 'rb') as f:
+            msg.add_attachment(f.read(), maintype='application', subtype='octet-stream',
+                               filename=os.path.basename(arquivo))
+        with smtplib.SMTP('127.0.0.1', porta) as smtp:
+            smtp.send_message(msg)
+
+
+def main(n=300, kb=500, atraso_ms=5):
+    destinatarios = [{'email': f"analista{i:04d}@lab.local", 'nome': f"Analista {i}"} for i in range(n)]
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "Relatorio_Bench.xlsx")
+        with open(arquivo, 'wb') as f:
+            f.write(os.urandom(kb * 1024))
+
+        print(f"⏱️  Distribuição: {n} mensagens, anexo de {kb} KB, latência simulada de {atraso_ms} ms por mensagem")
+        print(f"{'Modo':<22} | {'Segundos':>9} | {'Msg/s':>8} | {'Recebidas':>9} | {'MB':>7}")
+        with ServidorSMTPLocal(atraso=atraso_ms / 1000) as srv:
+            t0 = time.perf_counter()
+            envio_ingenuo(srv.porta, destinatarios, arquivo)
+            seg = time.perf_counter() - t0
+            print(f"{'Ingênuo (1 por vez)':<22} | {seg:>9.2f} | {n / seg:>8.0f} | {srv.mensagens:>9} | {srv.bytes / 1e6:>7.1f}")
+
+        for conexoes in CONEXOES:
+            with ServidorSMTPLocal(atraso=atraso_ms / 1000) as srv:
+                config = {'smtp': {'host': '127.0.0.1', 'porta': srv.porta, 'conexoes': conexoes},
+                          'destinatarios': destinatarios}
+                t0 = time.perf_counter()
+                status = dist.distribuir(config, arquivo)
+                seg = time.perf_counter() - t0
+                ok = (status['Status'] == 'enviado').sum()
+                print(f"{f'Lote ({conexoes} conexões)':<22} | {seg:>9.2f} | {n / seg:>8.0f} | {srv.mensagens:>9} | "
+                      f"{srv.bytes / 1e6:>7.1f}{'' if ok == n else f'  ⚠️ {n - ok} falhas'}")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
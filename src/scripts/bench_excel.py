@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+import motor_metricas as mm
+import excel_streaming as xs
+from bench_motor_metricas import gerar_retornos
+
+# ==============================================================================
+# BENCHMARK: BUILDER EXCEL PADRÃO (Workbook em memória) x STREAMING (write_only)
+# Tempo, pico de memória Python (tracemalloc) e tamanho do arquivo gerado,
+# para tabelas de métricas sintéticas com N ativos.
+# Uso: python bench_excel.py [n_ativos ...]
+# ==============================================================================
+
+SETORES = ['Commodity', 'Financeiro', 'Varejo', 'Defensiva', 'Utilidades', 'Tecnologia']
+
+
+def tabela_sintetica(n_ativos, n_dias=504):
+    """Tabela de métricas no formato de relatorio_excel.calcular_metricas_sql."""
+    import relatorio_excel as rel
+    retornos = gerar_retornos(n_dias, n_ativos)
+    tabela = mm.tabela_metricas(retornos, retornos['^BVSP'], 0.1075, 252)
+    setores = np.random.default_rng(1).choice(SETORES, size=n_ativos)
+    tabela.insert(0, 'Setor', setores)
+    return tabela.reset_index()[rel.COLUNAS_RELATORIO]
+
+
+def medir(func, *args):
+    """(segundos, pico de memória em MB): duas execuções, pois o tracemalloc distorce o tempo."""
+    t0 = time.perf_counter()
+    func(*args)
+    segundos = time.perf_counter() - t0
+    tracemalloc.start()
+    func(*args)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return segundos, pico / 1024**2
+
+
+def main(tamanhos=(9, 200, 1500, 5000)):
+    import relatorio_excel as rel
+    print(f"{'Ativos':>7} | {'Padrão (s)':>10} | {'Pico (MB)':>9} | {'Arq (KB)':>8} || "
+          f"{'Streaming (s)':>13} | {'Pico (MB)':>9} | {'Arq (KB)':>8}")
+    vazio = pd.DataFrame()
+    with tempfile.TemporaryDirectory() as pasta:
+        for n in tamanhos:
+            df = tabela_sintetica(n)
+            arq_p = os.path.join(pasta, f"padrao_{n}.xlsx")
+            arq_s = os.path.join(pasta, f"streaming_{n}.xlsx")
+            t_p, m_p = medir(rel.construir_excel_padrao, df, vazio, arq_p)
+            t_s, m_s = medir(xs.construir_excel_streaming, df, vazio, arq_s, rel.RISK_FREE)
+            print(f"{n:>7} | {t_p:>10.2f} | {m_p:>9.1f} | {os.path.getsize(arq_p) / 1024:>8.0f} || "
+                  f"{t_s:>13.2f} | {m_s:>9.1f} | {os.path.getsize(arq_s) / 1024:>8.0f}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(tuple(args) if args else (9, 200, 1500, 5000))
@@ -0,0 +1,79 @@
+import os
+import re
+import sys
+import subprocess
+
+# ==============================================================================
+# BENCHMARK: TEMPO DE IMPORTAÇÃO (PARTIDA A FRIO)
+# Cada módulo é importado num interpretador novo com 'python -X importtime';
+# vale o menor tempo cumulativo de N rodadas (cache de disco já quente).
+# Também confere que as dependências pesadas (SciPy, openpyxl, yfinance) NÃO
+# são carregadas só por importar os módulos: elas entram no primeiro uso.
+# Uso: python bench_importacao.py [modulo ...]   (sai com código 1 se estourar a meta)
+# ==============================================================================
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+
+# Meta (ms) por módulo. pandas + numpy sozinhos já levam ~300 ms numa máquina comum;
+# antes do import preguiçoso, scipy.stats levava estes módulos para ~1,2-1,5 s.
+ALVOS_MS = {
+    'dados_mercado': 600,
+    'motor_metricas': 600,
+    'risco_movel': 600,
+    'relatorio_excel': 650,
+    'pipeline': 700,
+}
+PESADOS = ('scipy', 'openpyxl', 'yfinance')
+RODADAS = 5
+TOP_N = 8  # Maiores tempos próprios exibidos para o módulo mais lento
+
+_LINHA = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def medir(modulo, rodadas=RODADAS):
+    """(menor tempo cumulativo em ms, linhas (próprio_us, nome) da rodada mais rápida, pesados carregados)."""
+    codigo = (f"import sys, {modulo}; "
+              f"print('PESADOS:' + ','.join(m for m in {PESADOS!r} if m in sys.modules))")
+    melhor, detalhes, pesados = None, [], []
+    for _ in range(rodadas):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo], cwd=DIRETORIO_ATUAL,
+                              capture_output=True, text=True, check=True)
+        linhas = [m.groups() for m in map(_LINHA.match, proc.stderr.splitlines()) if m]
+        # Linha do próprio módulo no nível de cima (recuo de um espaço); o cumulativo inclui tudo o que ele puxou
+        total = next(int(cum) for _, cum, recuo, nome in linhas if nome == modulo and len(recuo) == 1)
+        if melhor is None or total < melhor:
+            melhor = total
+            detalhes = sorted(((int(proprio), nome) for proprio, _, _, nome in linhas), reverse=True)
+        marcador = next(l for l in proc.stdout.splitlines() if l.startswith("PESADOS:"))  # O módulo pode imprimir no import
+        pesados = [p for p in marcador[len("PESADOS:"):].split(",") if p]
+    return melhor / 1000, detalhes, pesados
+
+
+def main(modulos=None):
+    modulos = modulos or list(ALVOS_MS)
+    falhas = []
+    resultados = {}
+    print(f"{'Módulo':<18} | {'Import (ms)':>11} | {'Meta (ms)':>9} | Pesados carregados")
+    for modulo in modulos:
+        ms, detalhes, pesados = medir(modulo)
+        resultados[modulo] = (ms, detalhes)
+        alvo = ALVOS_MS.get(modulo)
+        estourou = alvo is not None and ms > alvo
+        if estourou or pesados:
+            falhas.append(modulo)
+        print(f"{modulo:<18} | {ms:>11.0f} | {alvo if alvo else '-':>9} | "
+              f"{', '.join(pesados) or '-'}{'  ❌' if estourou or pesados else ''}")
+
+    lento = max(resultados, key=lambda m: resultados[m][0])
+    print(f"\nMaiores tempos próprios em '{lento}':")
+    for proprio, nome in resultados[lento][1][:TOP_N]:
+        print(f"   {proprio / 1000:>7.1f} ms  {nome}")
+    if falhas:
+        print(f"\n❌ Fora da meta: {', '.join(falhas)}")
+        return 1
+    print("\n✅ Todos os módulos dentro da meta.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:] or None))
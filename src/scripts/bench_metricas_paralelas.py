@@ -0,0 +1,45 @@
+import os
+import time
+import sys
+import numpy as np
+
+import motor_metricas as mm
+import metricas_paralelas as mp
+from bench_motor_metricas import gerar_retornos
+
+# ==============================================================================
+# BENCHMARK: MOTOR VETORIZADO (1 NÚCLEO) x SHARDS EM PROCESSOS
+# Mede o speedup com 1, 2, 4, ... processos sobre uma matriz grande.
+# Em uma máquina Linux multi-core o ganho deve ser próximo de linear.
+# Uso: python bench_metricas_paralelas.py [n_dias] [n_series] [tamanho_shard]
+# ==============================================================================
+
+RISK_FREE = 0.1075
+
+
+def main(n_dias=1260, n_series=10_000, tamanho_shard=mp.TAMANHO_SHARD):
+    retornos = gerar_retornos(n_dias, n_series)
+    bench = retornos['^BVSP']
+    print(f"⏱️  Benchmark paralelo ({n_dias} dias x {n_series} séries, shard={tamanho_shard}, "
+          f"{os.cpu_count()} núcleos)")
+
+    t0 = time.perf_counter()
+    ref = mm.tabela_metricas(retornos, bench, RISK_FREE, 252)
+    t_serial = time.perf_counter() - t0
+    print(f"{'Processos':>10} | {'Tempo (s)':>9} | {'Speedup':>8} | {'Max |dif|':>10}")
+    print(f"{'serial':>10} | {t_serial:>9.2f} | {1.0:>7.1f}x | {0.0:>10.2e}")
+
+    n = 1
+    while n <= (os.cpu_count() or 1):
+        t0 = time.perf_counter()
+        par = mp.tabela_metricas_paralela(retornos, bench, RISK_FREE, 252, n_processos=n,
+                                          tamanho_shard=tamanho_shard)
+        t_par = time.perf_counter() - t0
+        dif = np.nanmax(np.abs(par.to_numpy() - ref.to_numpy()))
+        print(f"{n:>10} | {t_par:>9.2f} | {t_serial / t_par:>7.1f}x | {dif:>10.2e}")
+        n *= 2
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,85 @@
+import time
+import sys
+import numpy as np
+import pandas as pd
+
+import dados_mercado as dm
+import motor_metricas as mm
+
+# ==============================================================================
+# BENCHMARK: LOOP POR TICKER x MOTOR VETORIZADO
+# Mede como o tempo da tabela de métricas escala com o número de colunas e
+# confere que o motor vetorizado reproduz os números do loop original.
+# Uso: python bench_motor_metricas.py [n_dias] [n_ativos ...]
+# ==============================================================================
+
+RISK_FREE = 0.1075
+
+
+def gerar_retornos(n_dias, n_ativos, seed=42):
+    """Retornos sintéticos de cauda gorda (t-Student, 4 g.l.) com um fator de mercado comum."""
+    rng = np.random.default_rng(seed)
+    mercado = rng.standard_t(4, size=(n_dias, 1)) * 0.01
+    idios = rng.standard_t(4, size=(n_dias, n_ativos)) * 0.015
+    betas = rng.uniform(0.5, 1.5, size=n_ativos)
+    datas = pd.bdate_range("2015-01-01", periods=n_dias)
+    colunas = ['^BVSP'] + [f"ATV{i:05d}" for i in range(n_ativos - 1)]
+    matriz = np.clip(mercado * betas + idios, -0.5, None)
+    matriz[:, 0] = np.clip(mercado[:, 0], -0.5, None)
+    return pd.DataFrame(matriz, index=datas, columns=colunas)
+
+
+def metricas_loop(retornos, bench_ret):
+    """Réplica do loop original de relatorio_excel.calcular_metricas_sql (referência)."""
+    lista = []
+    for ticker in retornos.columns:
+        r = retornos[ticker]
+        ret_total = dm.total_return(r)
+        vol = dm.annualize_vol(r, 252)
+        sharpe = dm.sharpe_ratio(r, RISK_FREE, 252)
+        max_dd = dm.drawdown(r)["Drawdown"].min()
+        downside_dev = r[r < 0].std(ddof=0) * np.sqrt(252)
+        ann_ret = dm.annualize_rets(r, 252)
+        sortino = (ann_ret - RISK_FREE) / downside_dev if downside_dev != 0 else 0
+        matrix = np.cov(r, bench_ret)
+        beta = matrix[0, 1] / matrix[1, 1]
+        lista.append({
+            'Ativo': ticker, 'Retorno': ret_total, 'Volatilidade': vol,
+            'Sharpe': sharpe, 'Sortino': sortino, 'Beta': beta, 'Max DD': max_dd,
+            'VaR_Normal': dm.var_gaussian(r, level=5, modified=False),
+            'VaR_Hist': dm.var_historic(r, level=5),
+            'VaR_CF': dm.var_gaussian(r, level=5, modified=True),
+            'CVaR': dm.cvar_historic(r, level=5), 'Worst Day': r.min(),
+            'Kurt': dm.kurtosis(r), 'Calmar': ann_ret / abs(max_dd) if max_dd != 0 else 0
+        })
+    return pd.DataFrame(lista).set_index('Ativo')
+
+
+def cronometrar(func, *args, repeticoes=3):
+    """Menor tempo (s) entre algumas repetições."""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        resultado = func(*args)
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor, resultado
+
+
+def main(n_dias=504, tamanhos=(10, 100, 500, 1500)):
+    print(f"⏱️  Benchmark da tabela de métricas ({n_dias} dias)")
+    print(f"{'Ativos':>8} | {'Loop (s)':>10} | {'Vetorizado (s)':>14} | {'Speedup':>8} | {'Max |dif|':>10}")
+    for n_ativos in tamanhos:
+        retornos = gerar_retornos(n_dias, n_ativos)
+        bench_ret = retornos['^BVSP']
+        t_loop, ref = cronometrar(metricas_loop, retornos, bench_ret, repeticoes=1)
+        t_vet, vet = cronometrar(mm.tabela_metricas, retornos, bench_ret, RISK_FREE, 252)
+        dif = np.nanmax(np.abs(vet[ref.columns].to_numpy() - ref.to_numpy()))
+        print(f"{n_ativos:>8} | {t_loop:>10.3f} | {t_vet:>14.4f} | {t_loop / t_vet:>7.0f}x | {dif:>10.2e}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    if args:
+        main(args[0], tuple(args[1:]) or (10, 100, 500, 1500))
+    else:
+        main()
@@ -0,0 +1,56 @@
+import time
+import sys
+import numpy as np
+
+import dados_mercado as dm
+import risco_carteira as rc
+from bench_motor_metricas import gerar_retornos
+
+# ==============================================================================
+# BENCHMARK: LOOP POR CARTEIRA x LOTE MATRICIAL
+# Avalia milhares de alocações candidatas de uma vez e confere os números
+# contra dm.var_historic / dm.var_gaussian / dm.cvar_historic carteira a carteira.
+# Uso: python bench_risco_carteira.py [n_dias] [n_ativos] [n_carteiras ...]
+# ==============================================================================
+
+
+def gerar_pesos(n_carteiras, n_ativos, seed=7):
+    """Carteiras long-only aleatórias (pesos somam 1)."""
+    pesos = np.random.default_rng(seed).dirichlet(np.ones(n_ativos), size=n_carteiras)
+    return pesos
+
+
+def risco_loop(retornos, pesos):
+    """Referência: uma carteira por vez com as funções de dados_mercado."""
+    linhas = []
+    for w in pesos:
+        rp = retornos @ w
+        linhas.append([dm.var_historic(rp), dm.var_gaussian(rp), dm.var_gaussian(rp, modified=True),
+                       dm.cvar_historic(rp)])
+    return np.array(linhas)
+
+
+def main(n_dias=1260, n_ativos=100, tamanhos=(100, 1000, 10_000)):
+    retornos = gerar_retornos(n_dias, n_ativos)
+    print(f"⏱️  Benchmark de risco de carteiras ({n_dias} dias x {n_ativos} ativos)")
+    print(f"{'Carteiras':>10} | {'Loop (s)':>9} | {'Lote (s)':>9} | {'Speedup':>8} | {'Max |dif|':>10}")
+    for n in tamanhos:
+        pesos = gerar_pesos(n, n_ativos)
+        n_loop = min(n, 1000)  # O loop é extrapolado acima de 1000 carteiras
+        t0 = time.perf_counter()
+        ref = risco_loop(retornos, pesos[:n_loop])
+        t_loop = (time.perf_counter() - t0) * n / n_loop
+        t0 = time.perf_counter()
+        lote = rc.risco_carteiras(retornos, pesos)
+        t_lote = time.perf_counter() - t0
+        calc = lote['resumo'][['VaR_Hist', 'VaR_Normal', 'VaR_CF', 'CVaR']].to_numpy()[:n_loop]
+        dif = np.nanmax(np.abs(calc - ref))
+        print(f"{n:>10} | {t_loop:>9.2f} | {t_lote:>9.3f} | {t_loop / t_lote:>7.0f}x | {dif:>10.2e}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    if len(args) > 2:
+        main(args[0], args[1], tuple(args[2:]))
+    else:
+        main(*args)
@@ -0,0 +1,57 @@
+import time
+import sys
+import numpy as np
+
+import dados_mercado as dm
+import risco_movel as rm
+from bench_motor_metricas import gerar_retornos
+
+# ==============================================================================
+# BENCHMARK: ROLLING().APPLY(dm.*) x MOTOR DE JANELA MÓVEL
+# O caminho ingênuo chama as funções de 'dados_mercado' uma vez por janela e por
+# ativo (O(n·w) chamadas Python). Confere também que os números batem.
+# Uso: python bench_risco_movel.py [n_dias] [n_ativos ...]
+# ==============================================================================
+
+JANELA = 252
+
+
+def metricas_moveis_ingenuo(retornos, janela=JANELA):
+    """Caminho ingênuo (referência): pandas rolling().apply ativo a ativo."""
+    rolante = retornos.rolling(janela)
+    return {
+        'VaR_Hist': rolante.apply(lambda r: dm.var_historic(r, level=5), raw=False),
+        'CVaR': rolante.apply(lambda r: dm.cvar_historic(r, level=5), raw=False),
+        'VaR_CF': rolante.apply(lambda r: dm.var_gaussian(r, level=5, modified=True), raw=False),
+        'Skew': rolante.apply(dm.skewness, raw=False),
+        'Kurt': rolante.apply(dm.kurtosis, raw=False),
+    }
+
+
+def main(n_dias=1260, tamanhos=(5, 20)):
+    print(f"⏱️  Benchmark de risco em janela móvel ({n_dias} dias, janela {JANELA})")
+    print(f"{'Ativos':>8} | {'Ingênuo (s)':>11} | {'Motor (s)':>9} | {'Speedup':>8} | {'Max |dif|':>10}")
+    for n_ativos in tamanhos:
+        retornos = gerar_retornos(n_dias, n_ativos)
+        t0 = time.perf_counter()
+        ref = metricas_moveis_ingenuo(retornos)
+        t_ing = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        mov = rm.metricas_moveis(retornos, JANELA, bench_ret='^BVSP')
+        t_mot = time.perf_counter() - t0
+        dif = max(np.nanmax(np.abs(mov[m].to_numpy() - ref[m].to_numpy())) for m in ref)
+        print(f"{n_ativos:>8} | {t_ing:>11.2f} | {t_mot:>9.3f} | {t_ing / t_mot:>7.0f}x | {dif:>10.2e}")
+
+    # Só o motor, no tamanho do universo real
+    retornos = gerar_retornos(n_dias, 1500)
+    t0 = time.perf_counter()
+    rm.metricas_moveis(retornos, JANELA, bench_ret='^BVSP')
+    print(f"Motor com 1500 ativos: {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    if args:
+        main(args[0], tuple(args[1:]) or (5, 20))
+    else:
+        main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import subprocess
+import http.client
+import numpy as np
+
+import base_precos as bp
+import snapshot_precos as sp
+import servico_risco as sr
+from bench_snapshot_precos import base_sintetica
+
+# ==============================================================================
+# BENCHMARK: SCRIPT A FRIO x SERVIÇO RESIDENTE
+# Mesma pergunta ("VaR CF de 1% de um ativo") respondida por um processo novo
+# (importa a pilha, lê a base, calcula a tabela) e pelo servico_risco com o
+# estado quente (conexão HTTP persistente). Depois mede a latência das
+# consultas com 4 leitores simultâneos enquanto a base recebe dias novos e o
+# estado é atualizado sem parar (nenhuma consulta pode falhar nem esperar a carga).
+# Uso: python bench_servico_risco.py [n_dias] [n_ativos] [n_consultas]
+# ==============================================================================
+
+LEITORES = 4
+DIAS_ETL = 10
+SCRIPT_FRIO = (
+    "import sys; sys.path.insert(0, {pasta!r})\n"
+    "import servico_risco as sr, motor_metricas as mm, relatorio_excel as rel\n"
+    "r = sr.carregar_retornos({db!r})\n"
+    "t = mm.tabela_metricas(r, r[{bench!r}], rel.RISK_FREE, 252, level=1)\n"
+    "print(t.loc[{ticker!r}, 'VaR_CF'])\n"
+)
+
+
+def consultar(conexao, url):
+    conexao.request('GET', url)
+    resposta = conexao.getresponse()
+    return resposta.status, json.loads(resposta.read())
+
+
+def percentis(tempos):
+    ms = np.array(tempos) * 1000
+    return f"p50 {np.percentile(ms, 50):7.2f} ms | p99 {np.percentile(ms, 99):7.2f} ms"
+
+
+def main(n_dias=2500, n_ativos=100, n_consultas=500):
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_db = os.path.join(pasta, "mercado.db")
+        print(f"⏱️  Serviço de risco: base sintética {n_dias} dias x {n_ativos} ativos")
+        conn = base_sintetica(caminho_db, n_dias, n_ativos)
+        precos = bp.ler_matriz(conn)
+        bench, ticker = precos.columns[0], precos.columns[1]
+        # O "ETL" do teste de concorrência regrava os últimos DIAS_ETL pregões, um por vez (e republica o snapshot)
+        ultimos = bp.para_formato_longo(precos.iloc[-DIAS_ETL:])
+        with conn:
+            conn.execute(f"DELETE FROM {bp.TABELA} WHERE date >= ?", (ultimos['date'].min(),))
+            bp._nova_geracao(conn)
+
+        script = SCRIPT_FRIO.format(pasta=os.path.dirname(os.path.abspath(__file__)), db=caminho_db,
+                                    bench=bench, ticker=ticker)
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", script], check=True, capture_output=True)
+        t_frio = time.perf_counter() - t0
+        print(f"{'Script a frio':<28} | {t_frio * 1000:9.1f} ms por pergunta")
+
+        t0 = time.perf_counter()
+        servico = sr.ServicoRisco(caminho_db)
+        print(f"{'Carga do serviço':<28} | {(time.perf_counter() - t0) * 1000:9.1f} ms (uma vez)")
+        url = f"/metricas?tickers={ticker}&level=1"
+        with sr.ServidorRisco(servico, porta=0, intervalo=0.05) as srv:
+            conexao = http.client.HTTPConnection('127.0.0.1', srv.porta)
+            consultar(conexao, url)  # Primeira consulta no nível 1 calcula a tabela desse nível
+            tempos = []
+            for _ in range(n_consultas):
+                t0 = time.perf_counter()
+                consultar(conexao, url)
+                tempos.append(time.perf_counter() - t0)
+            print(f"{'Serviço (estado quente)':<28} | {percentis(tempos)} | {t_frio / np.median(tempos):,.0f}x")
+
+            tempos, falhas, geracoes = [], [], set()
+            parar = threading.Event()
+
+            def leitor():
+                c = http.client.HTTPConnection('127.0.0.1', srv.porta)
+                while not parar.is_set():
+                    t0 = time.perf_counter()
+                    status, corpo = consultar(c, url)
+                    tempos.append(time.perf_counter() - t0)
+                    if status != 200:
+                        falhas.append(status)
+                    geracoes.add(corpo.get('geracao'))
+
+            threads = [threading.Thread(target=leitor) for _ in range(LEITORES)]
+            for t in threads:
+                t.start()
+            for data in sorted(ultimos['date'].unique()):
+                bp.upsert(conn, ultimos[ultimos['date'] == data])
+                sp.republicar(conn, caminho_db)
+                time.sleep(0.1)
+            time.sleep(0.3)
+            parar.set()
+            for t in threads:
+                t.join()
+            conn.close()
+            print(f"{f'{LEITORES} leitores + atualizações':<28} | {percentis(tempos)} | {len(tempos)} consultas, "
+                  f"{len(geracoes)} gerações vistas, {servico.atualizacoes} atualizações "
+                  f"(última em {servico.estado.segundos * 1000:.0f} ms), {len(falhas)} falhas")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+
+import base_precos as bp
+import snapshot_precos as sp
+from bench_motor_metricas import gerar_retornos
+
+# ==============================================================================
+# BENCHMARK: LEITURA DE PREÇOS — SQL x SNAPSHOT COLUNAR MAPEADO
+# Monta uma base sintética (n_dias x n_ativos) e compara o tempo até ter o
+# DataFrame de preços (Date x Ticker) em memória por cada caminho.
+# Uso: python bench_snapshot_precos.py [n_dias] [n_ativos]
+# ==============================================================================
+
+
+def base_sintetica(caminho_db, n_dias, n_ativos):
+    retornos = gerar_retornos(n_dias, n_ativos)
+    retornos.index = pd.bdate_range("2015-01-02", periods=n_dias, name="Date")
+    precos = 100 * (1 + retornos).cumprod()
+    conn = bp.conectar(caminho_db)
+    bp.upsert(conn, bp.para_formato_longo(precos))
+    return conn
+
+
+def cronometrar(func, repeticoes=3):
+    melhor = np.inf
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        resultado = func()
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor, resultado
+
+
+def main(n_dias=2500, n_ativos=1000):
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_db = os.path.join(pasta, "mercado.db")
+        print(f"Base sintética: {n_dias} dias x {n_ativos} ativos ({n_dias * n_ativos:,} linhas)")
+        conn = base_sintetica(caminho_db, n_dias, n_ativos)
+
+        def sql_pivot():  # Caminho "antigo": read_sql + parse de datas + pivot
+            longo = pd.read_sql(f"SELECT ticker, date, adj_close FROM {bp.TABELA}", conn)
+            longo["date"] = pd.to_datetime(longo["date"])
+            return longo.pivot(index="date", columns="ticker", values="adj_close")
+
+        t_sql, ref = cronometrar(sql_pivot)
+        t_np, via_bp = cronometrar(lambda: bp.ler_matriz(conn))
+        t0 = time.perf_counter()
+        sp.publicar(conn, caminho_db)
+        t_pub = time.perf_counter() - t0
+        t_snap, snap = cronometrar(lambda: sp.carregar(caminho_db), repeticoes=10)
+        conn.close()
+
+        assert np.array_equal(snap.to_numpy(), via_bp.to_numpy(), equal_nan=True)
+        assert np.array_equal(snap.to_numpy(), ref.to_numpy(), equal_nan=True)
+        print(f"read_sql + to_datetime + pivot : {t_sql * 1e3:9.1f} ms")
+        print(f"bp.ler_matriz (SQLite)         : {t_np * 1e3:9.1f} ms")
+        print(f"sp.publicar (uma vez, no ETL)  : {t_pub * 1e3:9.1f} ms")
+        print(f"sp.carregar (memmap)           : {t_snap * 1e3:9.1f} ms  ({t_np / t_snap:,.0f}x)")
+        del snap
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
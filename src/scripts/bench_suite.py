@@ -0,0 +1,373 @@
+import os
+import re
+import sys
+import gc
+import json
+import glob
+import time
+import argparse
+import platform
+import shutil
+import tempfile
+import subprocess
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+import dados_mercado as dm
+import motor_metricas as mm
+import base_precos as bp
+import snapshot_precos as sp
+import risco_movel as rm
+import covariancia as cv
+import cenarios_stress as cs
+from bench_motor_metricas import gerar_retornos
+
+# ==============================================================================
+# SUÍTE DE BENCHMARKS (REPRODUZÍVEL)
+# Mede as funções de dados_mercado, a tabela de métricas, os builders de Excel e
+# a leitura da base sobre matrizes sintéticas de cauda gorda (t-Student, seed
+# fixa), numa grade de linhas (dias) x colunas (ativos). Grava um JSON por
+# execução e compara duas execuções apontando regressões.
+# Uso:
+#   python bench_suite.py run [--perfil rapido|completo] [--casos REGEX] [--baseline]
+#   python bench_suite.py compare [BASE.json] [ATUAL.json] [--tolerancia 0.25]
+# ==============================================================================
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(DIRETORIO_ATUAL))
+PASTA_RESULTADOS = os.path.join(RAIZ_PROJETO, "benchmarks")
+CAMINHO_BASELINE = os.path.join(PASTA_RESULTADOS, "baseline.json")
+
+# Grade de tamanhos. max_celulas corta combinações que não cabem na memória da máquina.
+PERFIS = {
+    'rapido': dict(linhas=(250, 2500), ativos=(10, 100, 1000), max_celulas=2_500_000),
+    'completo': dict(linhas=(250, 2500, 25_000), ativos=(10, 100, 1000, 10_000), max_celulas=25_000_000),
+}
+
+TEMPO_ALVO = 0.5     # Repete cada caso até somar ~meio segundo...
+MAX_REPETICOES = 25  # ...ou até este número de repetições
+TOLERANCIA = 0.25    # compare: +25% no tempo mínimo = regressão
+PISO_SEGUNDOS = 0.002  # Diferenças absolutas menores que isso são ruído
+
+# ==============================================================================
+# CASOS
+# Cada caso recebe os retornos (DataFrame dias x ativos) e devolve a função a
+# cronometrar; o preparo (fora do cronômetro) fica no corpo do caso.
+# eixo: 'ambos' (linhas x ativos), 'linhas' (uma coluna só) ou 'ativos' (não depende dos dias).
+# ==============================================================================
+
+CASOS = {}
+_PASTA_TEMP = None  # Criada por executar() e apagada no fim
+
+
+def _pasta():
+    return tempfile.mkdtemp(dir=_PASTA_TEMP)
+
+
+def caso(nome, eixo='ambos', max_celulas=None, max_ativos=None, min_linhas=None):
+    def registrar(func):
+        CASOS[nome] = dict(preparar=func, eixo=eixo, max_celulas=max_celulas,
+                           max_ativos=max_ativos, min_linhas=min_linhas)
+        return func
+    return registrar
+
+
+@caso('dm.total_return')
+def _(r): return lambda: dm.total_return(r)
+
+
+@caso('dm.annualize_rets')
+def _(r): return lambda: dm.annualize_rets(r, 252)
+
+
+@caso('dm.annualize_vol')
+def _(r): return lambda: dm.annualize_vol(r, 252)
+
+
+@caso('dm.sharpe_ratio')
+def _(r): return lambda: dm.sharpe_ratio(r, 0.1075, 252)
+
+
+@caso('dm.skewness')
+def _(r): return lambda: dm.skewness(r)
+
+
+@caso('dm.kurtosis')
+def _(r): return lambda: dm.kurtosis(r)
+
+
+@caso('dm.drawdown', eixo='linhas')
+def _(r):
+    serie = r.iloc[:, 0]
+    return lambda: dm.drawdown(serie)
+
+
+@caso('dm.var_historic')
+def _(r): return lambda: dm.var_historic(r, 5)
+
+
+@caso('dm.cvar_historic')
+def _(r): return lambda: dm.cvar_historic(r, 5)
+
+
+@caso('dm.tail_historic', max_celulas=10_000_000)
+def _(r): return lambda: dm.tail_historic(r, (1, 2.5, 5, 10))
+
+
+@caso('dm.var_gaussian')
+def _(r): return lambda: dm.var_gaussian(r, 5)
+
+
+@caso('dm.var_gaussian_cf')
+def _(r): return lambda: dm.var_gaussian(r, 5, modified=True)
+
+
+@caso('dm.AcumuladorMomentos.update')
+def _(r):
+    return lambda: dm.AcumuladorMomentos(r.columns).update(r)
+
+
+@caso('dm.var_monte_carlo', max_ativos=1000)
+def _(r): return lambda: dm.var_monte_carlo(r, 5, n_cenarios=20_000)
+
+
+@caso('mm.tabela_metricas')
+def _(r):
+    bench = r.iloc[:, 0]
+    return lambda: mm.tabela_metricas(r, bench, 0.1075, 252)
+
+
+@caso('mm.tabela_drawdown')
+def _(r): return lambda: mm.tabela_drawdown(r)
+
+
+@caso('cv.MatrizCovariancia', max_ativos=1000)
+def _(r): return lambda: cv.MatrizCovariancia(r).betas(r.columns[0])
+
+
+@caso('cv.atualizar', eixo='ativos', max_ativos=1000)
+def _(r):
+    matriz = cv.MatrizCovariancia(r)
+    dia = r.iloc[-1].to_numpy()
+    return lambda: matriz.atualizar(dia)
+
+
+@caso('cs.replay_cenarios', min_linhas=2500)
+def _(r):
+    pesos = np.random.default_rng(7).dirichlet(np.ones(r.shape[1]), size=1000)
+    return lambda: cs.replay_cenarios(r, pesos)
+
+
+@caso('rm.vars_moveis', min_linhas=500, max_celulas=10_000_000)
+def _(r): return lambda: rm.vars_moveis(r, 250, (1, 5))
+
+
+def _tabela_relatorio(r):
+    import relatorio_excel as rel
+    tabela = mm.tabela_metricas(r, r.iloc[:, 0], rel.RISK_FREE, 252)
+    setores = np.random.default_rng(1).choice(['Commodity', 'Financeiro', 'Varejo', 'Defensiva'], size=r.shape[1])
+    tabela.insert(0, 'Setor', setores)
+    return tabela.reset_index()[rel.COLUNAS_RELATORIO]
+
+
+@caso('excel.streaming', eixo='ativos')
+def _(r):
+    import excel_streaming as xs
+    tabela, pasta = _tabela_relatorio(r), _pasta()
+    return lambda: xs.construir_excel_streaming(tabela, pd.DataFrame(), os.path.join(pasta, "s.xlsx"), 0.1075)
+
+
+@caso('excel.padrao', eixo='ativos', max_ativos=1000)
+def _(r):
+    import relatorio_excel as rel
+    tabela, pasta = _tabela_relatorio(r), _pasta()
+    return lambda: rel.construir_excel_padrao(tabela, pd.DataFrame(), os.path.join(pasta, "p.xlsx"))
+
+
+def _base_sintetica(r):
+    """Grava os preços numa base temporária (e publica o snapshot) fora do cronômetro."""
+    caminho_db = os.path.join(_pasta(), "mercado.db")
+    precos = 100 * (1 + r).cumprod()
+    precos.index.name = "Date"
+    conn = bp.conectar(caminho_db)
+    bp.upsert(conn, bp.para_formato_longo(precos))
+    sp.publicar(conn, caminho_db)
+    return conn, caminho_db
+
+
+@caso('db.ler_matriz', max_celulas=2_500_000)
+def _(r):
+    conn, _ = _base_sintetica(r)
+    return lambda: bp.ler_matriz(conn)
+
+
+@caso('db.snapshot', max_celulas=2_500_000)
+def _(r):
+    _, caminho_db = _base_sintetica(r)
+    return lambda: sp.carregar(caminho_db)
+
+# ==============================================================================
+# EXECUÇÃO
+# ==============================================================================
+
+def cronometrar(func, tempo_alvo=TEMPO_ALVO, max_repeticoes=MAX_REPETICOES):
+    """Repete a chamada até tempo_alvo (mín. 3 vezes se couber) e devolve os tempos."""
+    tempos = []
+    gc.collect()
+    while len(tempos) < max_repeticoes:
+        t0 = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - t0)
+        if sum(tempos) >= tempo_alvo and len(tempos) >= min(3, max_repeticoes):
+            break
+        if tempos[0] >= tempo_alvo:  # Caso lento: uma medida basta
+            break
+    return tempos
+
+
+def _tamanhos(eixo, perfil):
+    linhas, ativos = perfil['linhas'], perfil['ativos']
+    if eixo == 'linhas':
+        return [(n, min(ativos)) for n in linhas]
+    if eixo == 'ativos':
+        return [(min(linhas), m) for m in ativos]
+    return [(n, m) for n in linhas for m in ativos]
+
+
+def _metadados(nome_perfil):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIRETORIO_ATUAL,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'data': datetime.now().isoformat(timespec="seconds"), 'perfil': nome_perfil, 'commit': commit,
+        'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+        'dados_mercado': dm.__version__, 'plataforma': platform.platform(), 'cpus': os.cpu_count(),
+    }
+
+
+def executar(nome_perfil='rapido', filtro=None):
+    """Roda a grade do perfil e devolve o dicionário de resultados (ver JSON)."""
+    perfil = PERFIS[nome_perfil]
+    casos = {n: c for n, c in CASOS.items() if filtro is None or re.search(filtro, n)}
+
+    # Agrupa por tamanho para gerar cada matriz uma vez só
+    plano = {}
+    for nome, c in casos.items():
+        for linhas, ativos in _tamanhos(c['eixo'], perfil):
+            limite = min(perfil['max_celulas'], c['max_celulas'] or np.inf)
+            if linhas * ativos > limite or (c['max_ativos'] and ativos > c['max_ativos']) \
+                    or (c['min_linhas'] and linhas < c['min_linhas']):
+                continue
+            plano.setdefault((linhas, ativos), []).append(nome)
+
+    global _PASTA_TEMP
+    _PASTA_TEMP = tempfile.mkdtemp(prefix="bench_suite_")
+    resultados = []
+    try:
+        for (linhas, ativos), nomes in sorted(plano.items()):
+            r = gerar_retornos(linhas, ativos)
+            for nome in nomes:
+                tempos = cronometrar(casos[nome]['preparar'](r))
+                resultados.append({
+                    'caso': nome, 'linhas': linhas, 'ativos': ativos, 'repeticoes': len(tempos),
+                    'minimo': min(tempos), 'mediana': float(np.median(tempos)),
+                })
+                print(f"{nome:<28} {linhas:>7} x {ativos:<6} {min(tempos) * 1e3:>11.2f} ms  (n={len(tempos)})")
+            del r
+            gc.collect()
+    finally:
+        shutil.rmtree(_PASTA_TEMP, ignore_errors=True)
+        _PASTA_TEMP = None
+    return {'meta': _metadados(nome_perfil), 'resultados': resultados}
+
+
+def salvar(resultado, caminho=None):
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    caminho = caminho or os.path.join(PASTA_RESULTADOS, f"resultado_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=1, ensure_ascii=False)
+    return caminho
+
+# ==============================================================================
+# COMPARAÇÃO
+# ==============================================================================
+
+def _chave(item):
+    return item['caso'], item['linhas'], item['ativos']
+
+
+def comparar(base, atual, tolerancia=TOLERANCIA, piso=PISO_SEGUNDOS):
+    """
+    DataFrame caso a caso (tempo mínimo base x atual). 'Situação':
+    'REGRESSÃO' se atual > base * (1 + tolerancia) e a diferença passar do piso;
+    'melhora' no sentido oposto; 'ok' caso contrário.
+    """
+    antes = {_chave(i): i['minimo'] for i in base['resultados']}
+    linhas = []
+    for item in atual['resultados']:
+        t_base = antes.get(_chave(item))
+        if t_base is None:
+            continue
+        t_atual = item['minimo']
+        razao = t_atual / t_base if t_base else np.inf
+        if razao > 1 + tolerancia and t_atual - t_base > piso:
+            situacao = 'REGRESSÃO'
+        elif razao < 1 / (1 + tolerancia) and t_base - t_atual > piso:
+            situacao = 'melhora'
+        else:
+            situacao = 'ok'
+        linhas.append([*_chave(item), t_base * 1e3, t_atual * 1e3, razao, situacao])
+    return pd.DataFrame(linhas, columns=['Caso', 'Linhas', 'Ativos', 'Base (ms)', 'Atual (ms)', 'Razão', 'Situação'])
+
+
+def _ler(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _mais_recente():
+    arquivos = sorted(glob.glob(os.path.join(PASTA_RESULTADOS, "resultado_*.json")))
+    if not arquivos:
+        raise FileNotFoundError(f"Nenhum resultado em {PASTA_RESULTADOS}: rode 'bench_suite.py run' antes.")
+    return arquivos[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suíte de benchmarks do Lab Risco Quant")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_run = sub.add_parser("run", help="executa a suíte e grava o JSON")
+    p_run.add_argument("--perfil", choices=sorted(PERFIS), default="rapido")
+    p_run.add_argument("--casos", help="regex sobre o nome dos casos (ex: '^dm\\.')")
+    p_run.add_argument("--saida", help="arquivo JSON de saída")
+    p_run.add_argument("--baseline", action="store_true", help="grava também como baseline")
+    p_cmp = sub.add_parser("compare", help="compara dois JSONs (padrão: baseline x último resultado)")
+    p_cmp.add_argument("base", nargs="?", default=CAMINHO_BASELINE)
+    p_cmp.add_argument("atual", nargs="?")
+    p_cmp.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    args = parser.parse_args(argv)
+
+    if args.comando == "run":
+        resultado = executar(args.perfil, args.casos)
+        caminho = salvar(resultado, args.saida)
+        print(f"💾 Resultados: {caminho}")
+        if args.baseline:
+            print(f"📌 Baseline: {salvar(resultado, CAMINHO_BASELINE)}")
+        return 0
+
+    base, atual = _ler(args.base), _ler(args.atual or _mais_recente())
+    tabela = comparar(base, atual, args.tolerancia)
+    with pd.option_context('display.max_rows', None, 'display.width', 140):
+        print(tabela.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    if base['meta'].get('plataforma') != atual['meta'].get('plataforma'):
+        print("⚠️ Execuções em máquinas diferentes: compare com cautela.")
+    regressoes = tabela[tabela['Situação'] == 'REGRESSÃO']
+    print(f"{len(regressoes)} regressões / {(tabela['Situação'] == 'melhora').sum()} melhoras "
+          f"em {len(tabela)} casos (tolerância {args.tolerancia:.0%})")
+    return 1 if len(regressoes) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
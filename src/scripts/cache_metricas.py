@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# CACHE DE MÉTRICAS (ENDEREÇADO POR CONTEÚDO)
+# Cada ativo vira uma chave = hash(retornos do ativo + benchmark + datas +
+# parâmetros + versão da biblioteca). Se o preço de um ticker não mudou, a linha
+# dele vem do cache; só os tickers alterados são recalculados.
+# ==============================================================================
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(DIRETORIO_ATUAL))
+CAMINHO_CACHE = os.path.join(RAIZ_PROJETO, "dados", "cache_metricas.db")
+
+MAX_ENTRADAS = 50_000
+MAX_IDADE_DIAS = 30
+
+
+class CacheMetricas:
+    """
+    Cache persistente (SQLite) de linhas da tabela de métricas, uma por ativo.
+    - max_entradas / max_idade_dias: despejo por tamanho (LRU) e por idade.
+    - hits / misses: contadores da execução, exibidos no log do relatório.
+    """
+
+    def __init__(self, caminho=None, max_entradas=MAX_ENTRADAS, max_idade_dias=MAX_IDADE_DIAS):
+        self.caminho = caminho or CAMINHO_CACHE
+        self.max_entradas = max_entradas
+        self.max_idade_dias = max_idade_dias
+        self.hits = 0
+        self.misses = 0
+        if not os.path.exists(os.path.dirname(os.path.abspath(self.caminho))):
+            os.makedirs(os.path.dirname(os.path.abspath(self.caminho)))
+        self.conn = sqlite3.connect(self.caminho, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_metricas ("
+            "chave TEXT PRIMARY KEY, valores TEXT NOT NULL, criado_em REAL NOT NULL, acessado_em REAL NOT NULL)")
+
+    # --- Chaves ---
+    @staticmethod
+    def chave_base(indice, bench_ret, parametros, versao):
+        """Parte comum a todos os ativos: datas, benchmark, parâmetros e versão."""
+        h = hashlib.sha256()
+        h.update(np.asarray(indice.asi8 if hasattr(indice, "asi8") else indice).tobytes())
+        if bench_ret is not None:
+            h.update(np.ascontiguousarray(np.asarray(bench_ret, dtype=np.float64)).tobytes())
+        h.update(json.dumps(parametros, sort_keys=True, default=str).encode())
+        h.update(str(versao).encode())
+        return h.digest()
+
+    @staticmethod
+    def chaves_ativos(retornos, base):
+        """Uma chave por coluna: hash(base + nome do ticker + bytes da série de retornos)."""
+        matriz = np.asfortranarray(retornos.to_numpy(dtype=np.float64))
+        chaves = []
+        for j, ticker in enumerate(retornos.columns):
+            h = hashlib.sha256(base)
+            h.update(str(ticker).encode())
+            h.update(matriz[:, j].tobytes())
+            chaves.append(h.hexdigest())
+        return chaves
+
+    # --- Leitura / escrita ---
+    def _ler(self, chaves):
+        encontrados = {}
+        for i in range(0, len(chaves), 900):  # Respeita o limite de parâmetros do SQLite
+            lote = chaves[i:i + 900]
+            sql = f"SELECT chave, valores FROM cache_metricas WHERE chave IN ({', '.join('?' * len(lote))})"
+            encontrados.update(self.conn.execute(sql, lote).fetchall())
+        if encontrados:
+            with self.conn:
+                self.conn.executemany("UPDATE cache_metricas SET acessado_em = ? WHERE chave = ?",
+                                      [(time.time(), c) for c in encontrados])
+        return {c: json.loads(v) for c, v in encontrados.items()}
+
+    def _gravar(self, linhas):
+        agora = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO cache_metricas (chave, valores, criado_em, acessado_em) VALUES (?, ?, ?, ?)",
+                [(c, json.dumps(v), agora, agora) for c, v in linhas.items()])
+
+    def obter_ou_calcular(self, retornos, calcular, bench_ret=None, parametros=None, versao=""):
+        """
+        Devolve a tabela de métricas (um ativo por linha, índice = ticker).
+        'calcular(sub_retornos)' só é chamado para as colunas que não estão no cache.
+        """
+        base = self.chave_base(retornos.index, bench_ret, parametros or {}, versao)
+        chaves = self.chaves_ativos(retornos, base)
+        encontrados = self._ler(chaves)
+        faltando = [t for t, c in zip(retornos.columns, chaves) if c not in encontrados]
+        self.hits += len(chaves) - len(faltando)
+        self.misses += len(faltando)
+
+        if faltando:
+            novos = calcular(retornos[faltando])
+            chave_de = dict(zip(retornos.columns, chaves))
+            linhas = {chave_de[t]: {k: (None if pd.isna(v) else float(v)) for k, v in linha.items()}
+                      for t, linha in novos.to_dict("index").items()}
+            self._gravar(linhas)
+            encontrados.update(linhas)
+
+        tabela = pd.DataFrame([encontrados[c] for c in chaves], index=retornos.columns).astype(np.float64)
+        tabela.index.name = "Ativo"
+        return tabela
+
+    # --- Manutenção ---
+    def despejar(self):
+        """Remove entradas mais velhas que max_idade_dias e, acima de max_entradas, as menos usadas."""
+        limite = time.time() - self.max_idade_dias * 86400
+        with self.conn:
+            removidas = self.conn.execute("DELETE FROM cache_metricas WHERE acessado_em < ?", (limite,)).rowcount
+            total = self.conn.execute("SELECT COUNT(*) FROM cache_metricas").fetchone()[0]
+            if total > self.max_entradas:
+                removidas += self.conn.execute(
+                    "DELETE FROM cache_metricas WHERE chave IN ("
+                    "SELECT chave FROM cache_metricas ORDER BY acessado_em ASC LIMIT ?)",
+                    (total - self.max_entradas,)).rowcount
+        return removidas
+
+    def resumo(self):
+        total = self.hits + self.misses
+        taxa = self.hits / total if total else 0.0
+        return f"🗃️  Cache de métricas: {self.hits} hits / {self.misses} misses ({taxa:.0%})"
+
+    def fechar(self):
+        self.conn.close()
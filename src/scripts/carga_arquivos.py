@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+import zipfile
+from contextlib import contextmanager
+import pandas as pd
+
+import base_precos as bp
+import snapshot_precos as sp
+
+# ==============================================================================
+# CARGA DE ARQUIVOS DE COTAÇÕES (OFFLINE, EM BLOCOS)
+# Lê CSVs de preços (soltos ou DENTRO de um .zip, sem extrair) em blocos de
+# linhas e grava na base com upsert, commitando a cada N cotações. A memória
+# fica limitada ao tamanho do bloco, então um dump de vários GB entra do mesmo
+# jeito que os arquivos do repositório. Dois layouts são aceitos:
+#   - Largo (Date x Ativo): o dos arquivos do repositório, com nomes de exibição.
+#   - Longo (ticker, date, adj_close[, close, volume]): típico de dumps de fornecedor.
+# ==============================================================================
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(DIRETORIO_ATUAL))
+CAMINHO_DB = os.path.join(RAIZ_PROJETO, "dados", "mercado.db")
+
+# Arquivos que acompanham o repositório (o segundo é mais recente e prevalece na sobreposição)
+ARQUIVOS_PADRAO = [
+    os.path.join(RAIZ_PROJETO, "dados", "cotacoes_acoes.zip"),
+    os.path.join(RAIZ_PROJETO, "notebooks", "dados", "cotacoes.csv"),
+]
+
+# names_map do notebook brazilian_asset_allocation, invertido (nome de exibição -> ticker)
+MAPA_NOMES = {
+    'IBOVESPA': '^BVSP',
+    'Vale': 'VALE3.SA', 'Petrobras': 'PETR4.SA',
+    'Itau': 'ITUB4.SA', 'BTG Pactual': 'BPAC11.SA',
+    'Magalu': 'MGLU3.SA', 'Renner': 'LREN3.SA',
+    'Weg': 'WEGE3.SA', 'Taesa': 'TAEE11.SA',
+}
+
+LINHAS_POR_BLOCO = 50_000        # Linhas do CSV lidas por vez
+COTACOES_POR_TRANSACAO = 500_000  # Commit a cada N cotações gravadas
+
+# Aliases aceitos no layout longo (cabeçalho normalizado: minúsculas, '_' no lugar de espaço)
+_ALIASES_LONGO = {
+    "ticker": "ticker", "symbol": "ticker", "ativo": "ticker",
+    "date": "date", "data": "date",
+    "adj_close": "adj_close", "adjclose": "adj_close", "fechamento_ajustado": "adj_close",
+    "close": "close", "fechamento": "close",
+    "volume": "volume",
+}
+
+
+@contextmanager
+def abrir_csv(caminho, membro=None):
+    """Abre o CSV para leitura em streaming; num .zip, descomprime sob demanda (sem extrair)."""
+    if caminho.endswith(".zip"):
+        with zipfile.ZipFile(caminho) as zf:
+            if membro is None:
+                csvs = [n for n in zf.namelist() if n.endswith(".csv")]
+                if not csvs:
+                    raise FileNotFoundError(f"Nenhum .csv dentro de {caminho}")
+                membro = csvs[0]
+            with zf.open(membro) as f:
+                yield f
+    else:
+        with open(caminho, "rb") as f:
+            yield f
+
+
+def _layout_longo(colunas):
+    """Mapa coluna -> campo da base se o cabeçalho for do layout longo; senão None."""
+    normalizadas = {c: _ALIASES_LONGO.get(str(c).strip().lower().replace(" ", "_")) for c in colunas}
+    campos = set(normalizadas.values())
+    if {"ticker", "date"} <= campos and campos & {"adj_close", "close"}:
+        return {c: campo for c, campo in normalizadas.items() if campo}
+    return None
+
+
+def _bloco_largo(bloco, mapa_nomes):
+    bloco = bloco.rename(columns=mapa_nomes)
+    return bp.para_formato_longo(bloco)
+
+
+def _bloco_longo(bloco, colunas, mapa_nomes):
+    bloco = bloco[list(colunas)].rename(columns=colunas)
+    if mapa_nomes:
+        bloco["ticker"] = bloco["ticker"].map(mapa_nomes).fillna(bloco["ticker"])
+    bloco["date"] = pd.to_datetime(bloco["date"]).dt.strftime(bp.FORMATO_DATA)
+    if "adj_close" not in bloco.columns:
+        bloco["adj_close"] = bloco["close"]
+    for campo in bp.CAMPOS:
+        if campo not in bloco.columns:
+            bloco[campo] = bloco["adj_close"] if campo == "close" else float("nan")
+    return bloco.dropna(subset=["adj_close"])[["ticker", "date", *bp.CAMPOS]]
+
+
+def ler_em_blocos(caminho, mapa_nomes=None, linhas_por_bloco=LINHAS_POR_BLOCO, membro=None):
+    """
+    Gera DataFrames no formato longo da base (ticker, date, adj_close, close, volume),
+    um por bloco de linhas do arquivo. Nomes de exibição viram tickers via mapa_nomes
+    (padrão: MAPA_NOMES); colunas fora do mapa são usadas como estão.
+    """
+    mapa_nomes = MAPA_NOMES if mapa_nomes is None else mapa_nomes
+    with abrir_csv(caminho, membro) as f:
+        leitor = pd.read_csv(f, chunksize=linhas_por_bloco)
+        colunas_longo = None
+        for i, bloco in enumerate(leitor):
+            if i == 0:
+                colunas_longo = _layout_longo(bloco.columns)
+            if colunas_longo is None:
+                # Largo: a primeira coluna é a data
+                yield _bloco_largo(bloco.set_index(bloco.columns[0]), mapa_nomes)
+            else:
+                yield _bloco_longo(bloco, colunas_longo, mapa_nomes)
+
+
+def carregar_arquivo(caminho, caminho_db=None, mapa_nomes=None, tickers=None, inicio=None,
+                     linhas_por_bloco=LINHAS_POR_BLOCO, cotacoes_por_transacao=COTACOES_POR_TRANSACAO,
+                     conn=None):
+    """
+    Grava um arquivo de cotações na base (upsert), bloco a bloco.
+    - tickers / inicio: filtros opcionais aplicados em cada bloco.
+    - cotacoes_por_transacao: tamanho do lote de commit. Se a carga falhar no meio,
+      os lotes já commitados ficam (upsert é idempotente: basta rodar de novo).
+    - conn: conexão aberta (quem a passou faz a republicação do snapshot).
+    Retorna o número de cotações gravadas.
+    """
+    proprio = conn is None
+    conn = conn or bp.conectar(caminho_db or CAMINHO_DB)
+    filtro = set(tickers) if tickers is not None else None
+    inicio = pd.Timestamp(inicio).strftime(bp.FORMATO_DATA) if inicio is not None else None
+    total = pendentes = 0
+    t0 = time.perf_counter()
+    try:
+        for longo in ler_em_blocos(caminho, mapa_nomes, linhas_por_bloco):
+            if filtro is not None:
+                longo = longo[longo["ticker"].isin(filtro)]
+            if inicio is not None:
+                longo = longo[longo["date"] >= inicio]
+            n = bp.gravar(conn, longo)
+            total += n
+            pendentes += n
+            if pendentes >= cotacoes_por_transacao:
+                conn.commit()
+                pendentes = 0
+        conn.commit()
+        segundos = time.perf_counter() - t0
+        print(f"📦 {os.path.basename(caminho)}: {total:,} cotações gravadas em {segundos:.1f}s")
+        if proprio and total:
+            sp.republicar(conn, caminho_db or CAMINHO_DB)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if proprio:
+            conn.close()
+    return total
+
+
+def carregar_arquivos(caminhos=None, caminho_db=None, mapa_nomes=None, **kwargs):
+    """Carrega vários arquivos em sequência (padrão: os do repositório) e republica o snapshot."""
+    caminhos = caminhos or ARQUIVOS_PADRAO
+    caminho_db = caminho_db or CAMINHO_DB
+    os.makedirs(os.path.dirname(os.path.abspath(caminho_db)), exist_ok=True)
+    conn = bp.conectar(caminho_db)
+    try:
+        total = 0
+        for caminho in caminhos:
+            if not os.path.exists(caminho):
+                print(f"⚠️ Arquivo não encontrado: {caminho}")
+                continue
+            total += carregar_arquivo(caminho, mapa_nomes=mapa_nomes, conn=conn, **kwargs)
+        if total:
+            sp.republicar(conn, caminho_db)
+        return total
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    # Uso: python carga_arquivos.py [arquivo.csv|arquivo.zip ...]
+    carregar_arquivos(sys.argv[1:] or None)
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+import motor_metricas as mm
+import risco_carteira as rc
+
+# ==============================================================================
+# CENÁRIOS DE STRESS (REPLAY HISTÓRICO E CHOQUES)
+# Reaplica crises datadas sobre a base de retornos: para cada janela, o P&L
+# acumulado, o maior drawdown dentro da janela e o pior dia de TODOS os ativos
+# e de quantas carteiras forem pedidas. Por cenário é uma passada só sobre a
+# matriz (dias da janela x séries): as carteiras entram como colunas extras
+# (retornos @ pesos.T, pesos constantes como em risco_carteira) e a riqueza sai
+# do acumulado de log(1 + r), com o pico partindo do nível do início da janela.
+#
+# Choques definidos pelo usuário (vetor de retornos por ativo) são aplicados a
+# milhares de carteiras com um único produto matricial: pesos @ choques.T.
+# ==============================================================================
+
+# Nome -> (início, fim, descrição). Datas inclusivas, em dias de pregão da base.
+CENARIOS = {
+    'Crise 2008 (Lehman)': ('2008-09-01', '2008-10-27', "Quebra do Lehman Brothers até a mínima do Ibovespa em outubro."),
+    'Joesley Day': ('2017-05-18', '2017-05-18', "Delação da JBS divulgada na noite anterior: circuit breaker no Ibovespa."),
+    'Greve dos Caminhoneiros': ('2018-05-21', '2018-06-18', "Paralisação nacional e revisão do crescimento."),
+    'COVID-19': ('2020-02-21', '2020-03-23', "Do último pico pré-pandemia à mínima de março (seis circuit breakers)."),
+    'Pacote Fiscal 2024': ('2024-11-27', '2024-12-18', "Anúncio do pacote de gastos, dólar acima de R$ 6 e juros futuros em alta."),
+}
+
+COLUNAS_CENARIOS = ['Início', 'Fim', 'Pregões', 'Cobertura', 'Descrição']
+COLUNAS_STRESS = ['Cenário', 'Início', 'Fim', 'Pregões', 'Ativo', 'P&L', 'Max DD', 'Pior Dia']
+
+
+def _janelas(datas, cenarios):
+    """(nome, início, fim, descrição, linha inicial, linha final exclusiva, cobertura) de cada cenário."""
+    janelas = []
+    for nome, (inicio, fim, descricao) in cenarios.items():
+        inicio, fim = pd.Timestamp(inicio), pd.Timestamp(fim)
+        a = datas.searchsorted(inicio, side='left')
+        b = datas.searchsorted(fim, side='right')
+        if b <= a:
+            cobertura = 'sem dados'
+        elif (a == 0 and datas[0] > inicio) or (b == len(datas) and datas[-1] < fim):
+            cobertura = 'parcial'  # A base começa depois do início (ou termina antes do fim) da crise
+        else:
+            cobertura = 'completa'
+        janelas.append((nome, inicio, fim, descricao, a, b, cobertura))
+    return janelas
+
+
+def replay_cenarios(retornos, pesos=None, cenarios=None):
+    """
+    Reaplica os cenários históricos sobre os ativos e (opcionalmente) carteiras.
+
+    - retornos: DataFrame (dias x ativos) indexado por data, sem NaN.
+    - pesos: vetor, matriz ou DataFrame (carteiras x tickers), como em risco_carteira.
+    - cenarios: {nome: (início, fim, descrição)}. Padrão: CENARIOS.
+
+    Retorna um dicionário de DataFrames:
+    - 'cenarios': cenários x ['Início', 'Fim', 'Pregões', 'Cobertura', 'Descrição'].
+    - 'pnl', 'max_dd', 'pior_dia': cenários x séries (ativos e depois carteiras).
+      Cenário sem nenhum pregão na base -> linha NaN.
+    """
+    if not isinstance(retornos, pd.DataFrame) or not isinstance(retornos.index, pd.DatetimeIndex):
+        raise TypeError("retornos deve ser um DataFrame indexado por data")
+    retornos = retornos.sort_index()
+    R, tickers = mm._como_matriz(retornos)
+    W, nomes = rc._como_pesos(pesos, tickers) if pesos is not None else (None, [])
+    series = tickers + nomes
+    janelas = _janelas(retornos.index, CENARIOS if cenarios is None else cenarios)
+
+    pnl, max_dd, pior = (np.full((len(janelas), len(series)), np.nan) for _ in range(3))
+    for i, (_, _, _, _, a, b, _) in enumerate(janelas):
+        if b <= a:
+            continue
+        X = R[a:b]
+        if W is not None:
+            X = np.hstack([X, X @ W.T])  # Carteiras como colunas extras da mesma janela
+        with np.errstate(divide='ignore'):
+            log_riqueza = np.cumsum(np.log1p(X), axis=0)
+        pico = np.maximum(np.maximum.accumulate(log_riqueza, axis=0), 0.0)  # 0 = nível do início
+        pnl[i] = np.expm1(log_riqueza[-1])
+        max_dd[i] = np.expm1((log_riqueza - pico).min(axis=0))
+        pior[i] = X.min(axis=0)
+
+    indice = pd.Index([j[0] for j in janelas], name='Cenário')
+    tabela = pd.DataFrame([[j[1], j[2], j[5] - j[4], j[6], j[3]] for j in janelas],
+                          index=indice, columns=COLUNAS_CENARIOS)
+    return {
+        'cenarios': tabela,
+        'pnl': pd.DataFrame(pnl, index=indice, columns=series),
+        'max_dd': pd.DataFrame(max_dd, index=indice, columns=series),
+        'pior_dia': pd.DataFrame(pior, index=indice, columns=series),
+    }
+
+
+def tabela_longa(resultado, coberturas=('completa',)):
+    """Uma linha por (cenário, série) com as colunas de COLUNAS_STRESS (formato do relatório)."""
+    cen = resultado['cenarios']
+    cen = cen[cen['Cobertura'].isin(coberturas)]
+    if cen.empty:
+        return pd.DataFrame(columns=COLUNAS_STRESS)
+    longo = pd.concat({
+        'P&L': resultado['pnl'].loc[cen.index].stack(),
+        'Max DD': resultado['max_dd'].loc[cen.index].stack(),
+        'Pior Dia': resultado['pior_dia'].loc[cen.index].stack(),
+    }, axis=1)
+    longo.index.names = ['Cenário', 'Ativo']
+    longo = longo.reset_index().join(cen[['Início', 'Fim', 'Pregões']], on='Cenário')
+    return longo[COLUNAS_STRESS]
+
+
+def aplicar_choques(pesos, choques, tickers=None):
+    """
+    P&L instantâneo de cada carteira sob cada choque: pesos @ choques.T.
+
+    - pesos: vetor, matriz ou DataFrame (carteiras x tickers), como em risco_carteira.
+    - choques: {ticker: retorno}, Series (um choque) ou DataFrame (choques x tickers).
+      Ticker ausente do choque = variação zero. Ex.: resultado['pnl'] de replay_cenarios
+      usa o P&L acumulado de cada ativo na crise como choque (carteira comprada e parada).
+    - tickers: ordem das colunas quando pesos/choques vêm como ndarray.
+    Retorna DataFrame carteiras x choques.
+    """
+    if isinstance(choques, dict):
+        choques = pd.Series(choques, name='Choque')
+    if isinstance(choques, pd.Series):
+        choques = choques.to_frame(choques.name if choques.name is not None else 'Choque').T
+    if not isinstance(choques, pd.DataFrame):
+        if tickers is None:
+            raise ValueError("choques em ndarray precisam da lista de tickers")
+        matriz = np.atleast_2d(np.asarray(choques, dtype=np.float64))
+        choques = pd.DataFrame(matriz, columns=tickers, index=[f"Choque {i + 1}" for i in range(len(matriz))])
+    if tickers is None:
+        tickers = list(pesos.columns) if isinstance(pesos, pd.DataFrame) else list(choques.columns)
+    W, nomes = rc._como_pesos(pesos, tickers)
+    S = choques.reindex(columns=tickers, fill_value=0.0).to_numpy(dtype=np.float64)
+    return pd.DataFrame(W @ S.T, index=nomes, columns=choques.index)
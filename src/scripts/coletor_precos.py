@@ -0,0 +1,179 @@
+import time
+import random
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+
+# ==============================================================================
+# COLETOR DE PREÇOS (LOTES CONCORRENTES)
+# Divide o universo em lotes e chama provedor.baixar(lote, inicio) num pool de
+# threads limitado, com retentativa por lote (backoff exponencial + jitter) e
+# limite de chamadas por segundo compartilhado entre as threads. Um lote que
+# esgota as tentativas é partido ao meio até isolar o(s) ticker(s) problemático(s):
+# a falha de um ativo não derruba os outros. Se as duas metades falham com o mesmo
+# erro, o problema é do provedor e a bisseção para ali. Cada ticker sai com um status.
+#
+# Provedor = qualquer objeto com .baixar(tickers, inicio) -> DataFrame longo
+# (ticker, date, adj_close, close, volume). Atributos opcionais ajustam o coletor:
+#   tamanho_lote, max_threads, chamadas_por_segundo
+# ==============================================================================
+
+TAMANHO_LOTE = 25
+MAX_THREADS = 4
+TENTATIVAS = 3
+ESPERA_INICIAL = 1.0   # segundos antes da 2ª tentativa (dobra a cada nova falha)
+ESPERA_MAXIMA = 30.0
+CHAMADAS_POR_SEGUNDO = None  # None = sem limite
+
+COLUNAS_STATUS = ['Ticker', 'Início', 'Status', 'Cotações', 'Tentativas', 'Segundos', 'Erro']
+TABELA_STATUS = "status_coleta"
+
+
+class LimitadorTaxa:
+    """Espaça as chamadas (de todas as threads) em pelo menos 1/chamadas_por_segundo segundos."""
+
+    def __init__(self, chamadas_por_segundo=None, dormir=time.sleep):
+        self.intervalo = 1.0 / chamadas_por_segundo if chamadas_por_segundo else 0.0
+        self._proxima = time.monotonic()
+        self._trava = threading.Lock()
+        self.dormir = dormir
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        with self._trava:
+            agora = time.monotonic()
+            vez = max(agora, self._proxima)
+            self._proxima = vez + self.intervalo
+        if vez > agora:
+            self.dormir(vez - agora)
+
+
+def _lotes(tickers, tamanho):
+    return [tickers[i:i + tamanho] for i in range(0, len(tickers), tamanho)]
+
+
+def _status(lote, inicio, longo, tentativas, segundos, erro=None):
+    """Uma linha de status por ticker do lote."""
+    contagem = longo['ticker'].value_counts() if longo is not None and len(longo) else {}
+    linhas = []
+    for t in lote:
+        n = int(contagem.get(t, 0))
+        situacao = 'erro' if erro is not None else ('ok' if n else 'sem_dados')
+        linhas.append([t, inicio, situacao, n, tentativas, round(segundos, 3), erro])
+    return linhas
+
+
+class Coletor:
+    """
+    Coleta concorrente de preços. Parâmetros não informados vêm dos atributos do
+    provedor (se existirem) ou das constantes do módulo.
+    - dormir: função de espera do backoff e do limite de taxa (injetável para testes; padrão time.sleep).
+    """
+
+    def __init__(self, provedor, tamanho_lote=None, max_threads=None, tentativas=TENTATIVAS,
+                 espera_inicial=ESPERA_INICIAL, espera_maxima=ESPERA_MAXIMA, chamadas_por_segundo=None,
+                 dormir=time.sleep):
+        self.provedor = provedor
+        self.tamanho_lote = tamanho_lote or getattr(provedor, 'tamanho_lote', TAMANHO_LOTE)
+        self.max_threads = max_threads or getattr(provedor, 'max_threads', MAX_THREADS)
+        self.tentativas = max(1, tentativas)
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        taxa = chamadas_por_segundo or getattr(provedor, 'chamadas_por_segundo', CHAMADAS_POR_SEGUNDO)
+        self.limitador = LimitadorTaxa(taxa, dormir)
+        self.dormir = dormir
+
+    def _chamar(self, lote, inicio, tentativas):
+        """Tenta baixar o lote; devolve (longo, tentativas usadas, erro ou None)."""
+        erro = None
+        for k in range(tentativas):
+            if k:
+                espera = min(self.espera_maxima, self.espera_inicial * 2 ** (k - 1))
+                self.dormir(espera * random.uniform(0.5, 1.0))  # Jitter: threads não voltam juntas
+            self.limitador.esperar()
+            try:
+                return self.provedor.baixar(lote, inicio), k + 1, None
+            except Exception as e:
+                erro = f"{type(e).__name__}: {e}"
+        return None, tentativas, erro
+
+    def _baixar_lote(self, lote, inicio):
+        """Baixa um lote; se esgotar as tentativas, parte ao meio para isolar o ticker que falha."""
+        t0 = time.perf_counter()
+        longo, usadas, erro = self._chamar(lote, inicio, self.tentativas)
+        if erro is None:
+            return longo, _status(lote, inicio, longo, usadas, time.perf_counter() - t0)
+        return self._partir(lote, inicio, usadas, erro, t0)
+
+    def _partir(self, lote, inicio, usadas, erro, t0):
+        """
+        Bisseção de um lote que falhou (usadas = tentativas já gastas com ele). Se as
+        duas metades falham com o mesmo erro, a falha não é de um ticker (provedor fora
+        do ar, cota esgotada...): o lote inteiro sai com esse erro, sem descer mais.
+        """
+        if len(lote) == 1:
+            return None, _status(lote, inicio, None, usadas, time.perf_counter() - t0, erro)
+        meio = len(lote) // 2
+        metades = [(metade, *self._chamar(metade, inicio, self.tentativas)) for metade in (lote[:meio], lote[meio:])]
+        erros = {e for *_, e in metades}
+        desistir = len(erros) == 1 and None not in erros
+        partes, linhas = [], []
+        for metade, sub, u, e in metades:
+            if e is None:
+                partes.append(sub)
+                linhas += _status(metade, inicio, sub, usadas + u, time.perf_counter() - t0)
+            elif desistir:
+                linhas += _status(metade, inicio, None, usadas + u, time.perf_counter() - t0, e)
+            else:
+                sub, st = self._partir(metade, inicio, usadas + u, e, t0)
+                if sub is not None:
+                    partes.append(sub)
+                linhas += st
+        return (pd.concat(partes, ignore_index=True) if partes else None), linhas
+
+    def coletar(self, pedidos):
+        """
+        Gera (DataFrame longo ou None, linhas de status) à medida que os lotes terminam.
+        - pedidos: {data_inicio: [tickers]} (ver etl_sql._agrupar_por_inicio).
+        Quem consome (thread principal) grava na base: a conexão SQLite não é compartilhada.
+        """
+        tarefas = [(inicio, lote) for inicio, tickers in sorted(pedidos.items())
+                   for lote in _lotes(list(tickers), self.tamanho_lote)]
+        if not tarefas:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_threads, len(tarefas))) as pool:
+            futuros = [pool.submit(self._baixar_lote, lote, inicio) for inicio, lote in tarefas]
+            for futuro in as_completed(futuros):
+                yield futuro.result()
+
+
+def tabela_status(linhas):
+    """Linhas de status -> DataFrame (uma linha por ticker, ordem alfabética)."""
+    status = pd.DataFrame(linhas, columns=COLUNAS_STATUS)
+    return status.sort_values('Ticker', ignore_index=True)
+
+
+def resumo(status, max_linhas=20):
+    """Imprime o placar da coleta e os tickers com erro."""
+    contagem = status['Status'].value_counts()
+    print(f"📡 Coleta: {contagem.get('ok', 0)} ok / {contagem.get('sem_dados', 0)} sem dados novos / "
+          f"{contagem.get('erro', 0)} com erro ({len(status)} ativos)")
+    erros = status[status['Status'] == 'erro']
+    for row in erros.head(max_linhas).itertuples(index=False):
+        print(f"   ⚠️ {row.Ticker}: {row.Erro} ({row.Tentativas} tentativas)")
+    if len(erros) > max_linhas:
+        print(f"   ... e mais {len(erros) - max_linhas} ativos com erro (ver tabela '{TABELA_STATUS}')")
+
+
+def gravar_status(conn, status):
+    """Registra o status por ticker desta execução na tabela 'status_coleta' (não abre transação)."""
+    conn.execute(f"""CREATE TABLE IF NOT EXISTS {TABELA_STATUS} (
+        executado_em TEXT, ticker TEXT, inicio TEXT, status TEXT,
+        cotacoes INTEGER, tentativas INTEGER, segundos REAL, erro TEXT)""")
+    agora = datetime.now().isoformat(timespec="seconds")
+    conn.executemany(f"INSERT INTO {TABELA_STATUS} VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     [(agora, r.Ticker, pd.Timestamp(r.Início).strftime("%Y-%m-%d"), r.Status,
+                       int(r.Cotações), int(r.Tentativas), float(r.Segundos), r.Erro if isinstance(r.Erro, str) else None)
+                      for r in status.itertuples(index=False)])
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+import motor_metricas as mm
+
+# ==============================================================================
+# MATRIZ DE COVARIÂNCIA (AMOSTRAL E EWMA / RISKMETRICS)
+# Covariância, correlação, volatilidade e o Beta de TODOS os ativos contra um
+# benchmark saem da mesma matriz N x N, montada com um único produto matricial
+# (BLAS) sobre os retornos. Em vez de um np.cov 2x2 por ativo, o Beta é só a
+# coluna do benchmark dividida pela variância dele.
+#
+# Estado guardado (sem o histórico):
+#   - amostral: n, média e soma dos produtos cruzados centrados (Welford/Chan);
+#   - EWMA: Σ_t = λ Σ_{t-1} + (1 - λ) r_t r_tᵀ, média zero como no RiskMetrics.
+# atualizar() incorpora os dias novos em O(dias novos x N²), sem reprocessar o passado.
+# ==============================================================================
+
+LAMBDA_RISKMETRICS = 0.94  # Decaimento diário do RiskMetrics (J.P. Morgan, 1996)
+BENCHMARK = '^BVSP'
+
+
+def _pesos_ewma(n, lam):
+    """Pesos (1 - λ) λ^(n-1-t) de cada dia, do mais antigo (t=0) ao mais recente."""
+    return (1 - lam) * lam ** np.arange(n - 1, -1, -1, dtype=np.float64)
+
+
+def correlacao_de(cov):
+    """Correlação a partir de uma covariância (variância zero -> NaN na linha/coluna)."""
+    desvio = np.sqrt(np.diag(cov))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = cov / np.outer(desvio, desvio)
+    np.fill_diagonal(corr, np.where(desvio > 0, 1.0, np.nan))
+    return corr
+
+
+class MatrizCovariancia:
+    """
+    Covariância amostral e EWMA de um universo de ativos, com atualização incremental.
+
+    - retornos: DataFrame (dias x ativos) ou ndarray 2-D, sem NaN.
+    - lam: decaimento do EWMA (0.94 = RiskMetrics diário).
+    - ddof: graus de liberdade da amostral (1 = pandas/np.cov; 0 = populacional).
+    O EWMA parte do segundo momento (média zero) da própria janela inicial; com
+    λ = 0.94 o peso dessa semente some depois de poucos meses de pregões.
+    """
+
+    def __init__(self, retornos, lam=LAMBDA_RISKMETRICS, ddof=1):
+        if not 0 < lam < 1:
+            raise ValueError(f"lam deve estar entre 0 e 1 (recebido {lam})")
+        R, self.tickers = mm._como_matriz(retornos)
+        if R.shape[0] < 1:
+            raise ValueError("retornos sem nenhum dia")
+        self.lam, self.ddof = lam, ddof
+        self.ultima_data = retornos.index[-1] if isinstance(retornos, (pd.DataFrame, pd.Series)) else None
+
+        # Amostral: média e produtos cruzados centrados (um único gemm)
+        self.n = R.shape[0]
+        self.media = R.mean(axis=0)
+        D = R - self.media
+        self._m2 = D.T @ D
+
+        # EWMA: λ^T Σ_0 + Σ_t (1 - λ) λ^(T-1-t) r_t r_tᵀ, também num gemm só
+        semente = (R.T @ R) / self.n
+        w = _pesos_ewma(self.n, lam)
+        self._ewma = lam ** self.n * semente + (R * w[:, None]).T @ R
+
+    # --------------------------------------------------------------------------
+    # Atualização incremental
+    # --------------------------------------------------------------------------
+    def atualizar(self, retornos):
+        """
+        Incorpora dias novos (um dia = vetor de N retornos; vários = matriz dias x N).
+        Com DataFrame indexado por data, só entram os dias depois de ultima_data.
+        Devolve o próprio objeto.
+        """
+        if isinstance(retornos, pd.Series):
+            retornos = retornos.to_frame().T if retornos.name is not None else retornos.to_numpy()
+        if isinstance(retornos, pd.DataFrame):
+            if self.ultima_data is not None:
+                retornos = retornos[retornos.index > self.ultima_data]
+            if retornos.empty:
+                return self
+            ultima = retornos.index[-1]
+            novos = retornos.reindex(columns=self.tickers).to_numpy(dtype=np.float64)
+        else:
+            ultima = None
+            novos = np.atleast_2d(np.asarray(retornos, dtype=np.float64))
+        if novos.shape[1] != len(self.tickers):
+            raise ValueError(f"dia com {novos.shape[1]} retornos, mas há {len(self.tickers)} ativos")
+        if np.isnan(novos).any():
+            raise ValueError("retornos novos com NaN (ativo ausente no dia?)")
+        k = novos.shape[0]
+
+        # Amostral: combina (n, média, M2) antigos com os do lote novo (Chan et al.)
+        media_k = novos.mean(axis=0)
+        D = novos - media_k
+        delta = media_k - self.media
+        total = self.n + k
+        self._m2 += D.T @ D + np.outer(delta, delta) * (self.n * k / total)
+        self.media = self.media + delta * (k / total)
+        self.n = total
+
+        # EWMA: decai o estado k dias e soma os produtos dos dias novos
+        w = _pesos_ewma(k, self.lam)
+        self._ewma *= self.lam ** k
+        self._ewma += (novos * w[:, None]).T @ novos
+        if ultima is not None:
+            self.ultima_data = ultima
+        return self
+
+    # --------------------------------------------------------------------------
+    # Consultas (ndarray para uso interno, DataFrame/Series para o usuário)
+    # --------------------------------------------------------------------------
+    def matriz(self, ewma=False):
+        """Covariância N x N (cópia) na ordem de self.tickers."""
+        if ewma:
+            return self._ewma.copy()
+        return self._m2 / (self.n - self.ddof) if self.n > self.ddof else np.full_like(self._m2, np.nan)
+
+    def covariancia(self, ewma=False):
+        return pd.DataFrame(self.matriz(ewma), index=self.tickers, columns=self.tickers)
+
+    def correlacao(self, ewma=False):
+        return pd.DataFrame(correlacao_de(self.matriz(ewma)), index=self.tickers, columns=self.tickers)
+
+    def volatilidade(self, ewma=False, periods_per_year=1):
+        """Desvio de cada ativo (diário por padrão; 252 = anualizado)."""
+        return pd.Series(np.sqrt(np.diag(self.matriz(ewma)) * periods_per_year), index=self.tickers)
+
+    def betas(self, bench=BENCHMARK, ewma=False):
+        """Beta de todos os ativos contra a coluna 'bench' (variância zero -> NaN)."""
+        if bench not in self.tickers:
+            raise ValueError(f"benchmark '{bench}' não está entre os ativos da matriz")
+        j = self.tickers.index(bench)
+        cov = self.matriz(ewma)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            beta = cov[:, j] / cov[j, j]
+        return pd.Series(beta, index=self.tickers, name='Beta')
+
+    def alinhada(self, tickers, ewma=False):
+        """Sub-matriz na ordem pedida (ex.: os ativos de uma carteira)."""
+        pos = [self.tickers.index(t) for t in tickers]
+        return self.matriz(ewma)[np.ix_(pos, pos)]
+
+    # --------------------------------------------------------------------------
+    # Persistência do estado (.npz): o próximo processo continua de onde parou
+    # --------------------------------------------------------------------------
+    def salvar(self, caminho):
+        np.savez(caminho, tickers=np.array(self.tickers, dtype=str), n=self.n, media=self.media,
+                 m2=self._m2, ewma=self._ewma, lam=self.lam, ddof=self.ddof,
+                 ultima_data=np.array(str(self.ultima_data) if self.ultima_data is not None else ''))
+
+    @classmethod
+    def carregar(cls, caminho):
+        with np.load(caminho) as z:
+            obj = cls.__new__(cls)
+            obj.tickers = z['tickers'].tolist()
+            obj.n, obj.lam, obj.ddof = int(z['n']), float(z['lam']), int(z['ddof'])
+            obj.media, obj._m2, obj._ewma = z['media'], z['m2'], z['ewma']
+            data = str(z['ultima_data'])
+            obj.ultima_data = pd.Timestamp(data) if data else None
+        return obj
@@ -1,5 +1,9 @@
 import pandas as pd
-import scipy.stats
+import hashlib
+import math
+import functools
+import threading
+from collections import OrderedDict
 import numpy as np
 
 # ==============================================================================
@@ -8,6 +12,9 @@ import numpy as np
 # Baseado na metodologia EDHEC Risk Institute
 # ==============================================================================
 
+# Versão dos cálculos: entra na chave do cache de métricas (mudou a conta -> subir a versão)
+__version__ = "2.2.0"
+
 # 1. BIBLIOTECA QUANT (DEFINIÇÕES MATEMÁTICAS)
 
 def total_return(r):
@@ -68,18 +75,113 @@ def kurtosis(r):
     return exp / sigma_r**4
 
 
+def _cauda_historica(x, niveis):
+    """
+    Núcleo das métricas de cauda: x (dias x ativos), niveis (1-D).
+    UMA ordenação parcial (np.partition) por coluna serve a todos os níveis.
+    Retorna (quantis, médias da cauda), ambos (níveis x ativos), com o sinal dos retornos.
+    """
+    T = x.shape[0]
+    pos = niveis / 100 * (T - 1)  # Mesma interpolação linear de np.percentile
+    baixo = np.floor(pos).astype(np.intp)
+    cima = np.minimum(baixo + 1, T - 1)
+    parcial = np.partition(x, np.unique(np.concatenate([baixo, cima])), axis=0)
+    q = parcial[baixo] + (pos - baixo)[:, None] * (parcial[cima] - parcial[baixo])
+    na_cauda = x[None, :, :] <= q[:, None, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media_cauda = np.where(na_cauda, x[None, :, :], 0.0).sum(axis=1) / na_cauda.sum(axis=1)
+    com_nan = np.isnan(x).any(axis=0)  # Como np.percentile: coluna com NaN -> NaN
+    q[:, com_nan] = np.nan
+    media_cauda[:, com_nan] = np.nan
+    return q, media_cauda
+
+
+def _formatar_cauda(valores, r, level):
+    """Devolve no formato da entrada: escalar/Series/DataFrame (nível único ou vários níveis)."""
+    um_nivel = np.ndim(level) == 0
+    if isinstance(r, pd.DataFrame):
+        return pd.Series(valores[0], index=r.columns) if um_nivel else pd.DataFrame(valores, index=np.atleast_1d(level), columns=r.columns)
+    if isinstance(r, pd.Series):
+        return valores[0, 0] if um_nivel else pd.Series(valores[:, 0], index=np.atleast_1d(level))
+    if np.ndim(r) == 1:
+        return valores[0, 0] if um_nivel else valores[:, 0]
+    return valores[0] if um_nivel else valores
+
+
+def tail_historic(r, levels=(1, 2.5, 5, 10)):
+    """
+    VaR e CVaR Históricos em VÁRIOS níveis de uma vez: retorna a tupla (VaR, CVaR).
+    Aceita Series, DataFrame ou ndarray (1-D ou 2-D). Para uma lista de níveis, o
+    resultado é (níveis x ativos); para um nível só, o mesmo formato de var_historic.
+    Ex: var, cvar = tail_historic(retornos, [1, 2.5, 5, 10])
+    """
+    if not isinstance(r, (pd.Series, pd.DataFrame, np.ndarray)):
+        raise TypeError("Expected r to be Series, DataFrame or ndarray")
+    x = np.asarray(r, dtype=np.float64)
+    x = x[:, None] if x.ndim == 1 else x
+    q, media_cauda = _cauda_historica(x, np.atleast_1d(np.asarray(levels, dtype=np.float64)))
+    # Multiplica por -1 para retornar um número positivo (perda positiva)
+    return _formatar_cauda(-q, r, levels), _formatar_cauda(-media_cauda, r, levels)
+
+
 def var_historic(r, level=5):
     """
     Retorna o VaR Histórico (Value at Risk) em um certo nível percentual.
     Ex: level=5 significa que estamos olhando para os 5% piores casos da história.
+    'level' também pode ser uma lista de níveis (ver tail_historic).
     """
-    if isinstance(r, pd.DataFrame):
-        return r.aggregate(var_historic, level=level)
-    elif isinstance(r, pd.Series):
-        # Multiplica por -1 para retornar um número positivo (perda positiva)
-        return -np.percentile(r, level)
+    return tail_historic(r, level)[0]
+
+# Aproximação racional de Acklam para o quantil da Normal (erro relativo ~1e-9),
+# refinada com um passo de Halley sobre math.erfc: bate com scipy.stats.norm.ppf
+# na precisão de máquina sem importar o SciPy (que sozinho pesa ~1s no start).
+_ACKLAM_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+             1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_ACKLAM_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+             6.680131188771972e+01, -1.328068155288572e+01)
+_ACKLAM_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+             -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_ACKLAM_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00)
+_ACKLAM_CORTE = 0.02425
+
+
+def _polinomio(coefs, x):
+    total = 0.0
+    for c in coefs:
+        total = total * x + c
+    return total
+
+
+@functools.lru_cache(maxsize=256)
+def _norm_ppf_escalar(p):
+    if math.isnan(p) or p < 0 or p > 1:
+        return math.nan
+    if p == 0:
+        return -math.inf
+    if p > 0.5:
+        return -_norm_ppf_escalar(1 - p)  # Simetria (1 - p é exato aqui): o refino fica na cauda esquerda
+    if p < _ACKLAM_CORTE:
+        q = math.sqrt(-2 * math.log(p))
+        x = _polinomio(_ACKLAM_C, q) / (_polinomio(_ACKLAM_D, q) * q + 1)
     else:
-        raise TypeError("Expected r to be Series or DataFrame")
+        q = p - 0.5
+        t = q * q
+        x = _polinomio(_ACKLAM_A, t) * q / (_polinomio(_ACKLAM_B, t) * t + 1)
+    # Passo de Halley: corrige x pelo erro da CDF (0.5 * erfc(-x/√2))
+    e = 0.5 * math.erfc(-x / math.sqrt(2)) - p
+    u = e * math.sqrt(2 * math.pi) * math.exp(x * x / 2)
+    return x - u / (1 + x * u / 2)
+
+
+def norm_ppf(p):
+    """
+    Quantil da Normal padrão (mesmo resultado de scipy.stats.norm.ppf, só com NumPy/math).
+    Escalares ficam em cache (os níveis de VaR se repetem a cada chamada).
+    """
+    if np.ndim(p) == 0:
+        return np.float64(_norm_ppf_escalar(float(p)))
+    return np.vectorize(_norm_ppf_escalar, otypes=[np.float64])(p)
+
 
 def var_gaussian(r, level=5, modified=False):
     """
@@ -91,7 +193,7 @@ def var_gaussian(r, level=5, modified=False):
         - Se False: Retorna o VaR Normal padrão (assume curva de sino).
     """
     # Computa o Z-score baseado na distribuição normal (ex: 1.65 para 5%)
-    z = scipy.stats.norm.ppf(level/100)
+    z = norm_ppf(level/100)
     
     if modified:
         # Modificação de Cornish-Fisher: Ajusta o Z baseado na "loucura" real dos dados
@@ -114,13 +216,351 @@ def cvar_historic(r, level=5):
     
     O que ele responde: "Nos piores 5% dos dias, qual é a MÉDIA do prejuízo?"
     É muito mais agressivo e realista que o VaR comum.
+    Usa a mesma ordenação do VaR (tail_historic), sem reordenar os dados.
     """
-    if isinstance(r, pd.Series):
-        # 1. Descobre quanto é o VaR Histórico
-        is_beyond = r <= -var_historic(r, level=level)
-        # 2. Calcula a média de tudo que for PIOR que o VaR
-        return -r[is_beyond].mean()
-    elif isinstance(r, pd.DataFrame):
-        return r.aggregate(cvar_historic, level=level)
-    else:
-        raise TypeError("Expected r to be Series or DataFrame")
+    return tail_historic(r, level)[1]
+
+# 2. ESTATÍSTICA INCREMENTAL (STREAMING)
+
+class AcumuladorMomentos:
+    """
+    Acumulador de momentos (contagem, média, M2, M3, M4) por ativo, atualizado online.
+    Fórmulas de Welford/Pébay: cada atualização custa O(linhas novas), não O(histórico).
+    - update(novos_retornos): incorpora um lote (DataFrame dias x ativos); NaN é ignorado.
+    - merge(outro): combina acumuladores de partições diferentes (ex: processamento paralelo).
+    - salvar(conn) / carregar(conn): persiste o estado na tabela 'estado_momentos'.
+    Marca d'água: a última data já incorporada de cada ticker (lotes indexados por data).
+    update() ignora as linhas desse ticker até essa data, então reaplicar um lote que se
+    sobrepõe ao estado (ex: depois de carregar()) não conta o mesmo dia duas vezes.
+    skewness() e kurtosis() batem com as funções skewness/kurtosis deste módulo.
+    """
+
+    SEM_DATA = np.iinfo(np.int64).min  # Marca d'água de ticker sem nenhuma data incorporada (= NaT)
+
+    def __init__(self, tickers=()):
+        self.tickers = list(tickers)
+        n = len(self.tickers)
+        self.n = np.zeros(n)
+        self.mean = np.zeros(n)
+        self.m2 = np.zeros(n)
+        self.m3 = np.zeros(n)
+        self.m4 = np.zeros(n)
+        self.ultima = np.full(n, self.SEM_DATA, dtype=np.int64)  # Nanossegundos (Timestamp.value)
+
+    def _alinhar(self, tickers):
+        """Garante que todos os tickers existem no estado (ticker novo entra zerado)."""
+        novos = [t for t in tickers if t not in self.tickers]
+        if novos:
+            self.tickers += novos
+            for nome in ("n", "mean", "m2", "m3", "m4"):
+                setattr(self, nome, np.concatenate([getattr(self, nome), np.zeros(len(novos))]))
+            self.ultima = np.concatenate([self.ultima, np.full(len(novos), self.SEM_DATA, dtype=np.int64)])
+        posicao = {t: i for i, t in enumerate(self.tickers)}
+        return np.array([posicao[t] for t in tickers], dtype=int)
+
+    @staticmethod
+    def _combinar(na, ma, a2, a3, a4, nb, mb, b2, b3, b4):
+        """Combina dois conjuntos de momentos (Pébay, 2008). Colunas com n=0 ficam com o outro lado."""
+        n = na + nb
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mb - ma
+            d_n = np.where(n > 0, delta / n, 0.0)
+            mean = ma + nb * d_n
+            m2 = a2 + b2 + delta * d_n * na * nb
+            m3 = (a3 + b3 + delta * d_n**2 * na * nb * (na - nb)
+                  + 3 * d_n * (na * b2 - nb * a2))
+            m4 = (a4 + b4 + delta * d_n**3 * na * nb * (na**2 - na * nb + nb**2)
+                  + 6 * d_n**2 * (na**2 * b2 + nb**2 * a2) + 4 * d_n * (na * b3 - nb * a3))
+        return n, mean, m2, m3, m4
+
+    def update(self, novos_retornos):
+        """
+        Incorpora um lote de retornos (DataFrame, Series ou array alinhado a self.tickers).
+        Com índice de datas, as linhas até a marca d'água de cada ticker são puladas e a
+        marca avança para a última data do lote. Array sem datas não tem essa proteção.
+        """
+        if isinstance(novos_retornos, pd.Series):
+            novos_retornos = novos_retornos.to_frame().T
+        if isinstance(novos_retornos, pd.DataFrame):
+            idx = self._alinhar(list(novos_retornos.columns))
+            x = novos_retornos.to_numpy(dtype=np.float64)
+            if isinstance(novos_retornos.index, pd.DatetimeIndex) and len(x):
+                datas = novos_retornos.index.as_unit("ns").asi8
+                ja_incluidas = datas[:, None] <= self.ultima[idx]
+                if ja_incluidas.any():
+                    x = np.where(ja_incluidas, np.nan, x)
+                self.ultima[idx] = np.maximum(self.ultima[idx], datas.max())
+        else:
+            x = np.atleast_2d(np.asarray(novos_retornos, dtype=np.float64))
+            idx = np.arange(x.shape[1])
+        validos = ~np.isnan(x)
+        nb = validos.sum(axis=0).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mb = np.where(nb > 0, np.nansum(x, axis=0) / nb, 0.0)
+        d = np.where(validos, x - mb, 0.0)
+        d2 = d * d
+        lote = (nb, mb, d2.sum(axis=0), (d2 * d).sum(axis=0), (d2 * d2).sum(axis=0))
+        estado = (self.n[idx], self.mean[idx], self.m2[idx], self.m3[idx], self.m4[idx])
+        self.n[idx], self.mean[idx], self.m2[idx], self.m3[idx], self.m4[idx] = self._combinar(*estado, *lote)
+        return self
+
+    def merge(self, outro):
+        """Combina com outro acumulador (mesmos ativos ou não) e retorna self."""
+        idx = self._alinhar(outro.tickers)
+        estado = (self.n[idx], self.mean[idx], self.m2[idx], self.m3[idx], self.m4[idx])
+        self.n[idx], self.mean[idx], self.m2[idx], self.m3[idx], self.m4[idx] = self._combinar(
+            *estado, outro.n, outro.mean, outro.m2, outro.m3, outro.m4)
+        self.ultima[idx] = np.maximum(self.ultima[idx], outro.ultima)
+        return self
+
+    # --- Estatísticas derivadas (pd.Series indexadas pelo ticker) ---
+    def _serie(self, valores):
+        return pd.Series(valores, index=self.tickers)
+
+    def media(self):
+        return self._serie(self.mean)
+
+    def ultima_data(self):
+        """Marca d'água por ticker (NaT = nenhuma data incorporada)."""
+        return self._serie(self.ultima.view("datetime64[ns]"))  # SEM_DATA é o próprio NaT
+
+    def variancia(self, ddof=1):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._serie(self.m2 / (self.n - ddof))
+
+    def skewness(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._serie(np.sqrt(self.n) * self.m3 / self.m2**1.5)
+
+    def kurtosis(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._serie(self.n * self.m4 / self.m2**2)
+
+    # --- Persistência no banco (SQLite) ---
+    def salvar(self, conn, nome="padrao"):
+        """Grava (upsert) o estado na tabela 'estado_momentos', uma linha por ticker (com a marca d'água)."""
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS estado_momentos ("
+                "nome TEXT NOT NULL, ticker TEXT NOT NULL, n REAL, mean REAL, m2 REAL, m3 REAL, m4 REAL, "
+                "ultima_data TEXT, PRIMARY KEY (nome, ticker))")
+            if "ultima_data" not in [c[1] for c in conn.execute("PRAGMA table_info(estado_momentos)")]:
+                conn.execute("ALTER TABLE estado_momentos ADD COLUMN ultima_data TEXT")  # Tabela antiga
+            conn.executemany(
+                "INSERT OR REPLACE INTO estado_momentos (nome, ticker, n, mean, m2, m3, m4, ultima_data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(nome, t, *map(float, linha), None if u == self.SEM_DATA else pd.Timestamp(int(u)).isoformat())
+                 for t, u, linha in zip(self.tickers, self.ultima,
+                                        zip(self.n, self.mean, self.m2, self.m3, self.m4))])
+
+    @classmethod
+    def carregar(cls, conn, nome="padrao"):
+        """Lê um estado salvo por salvar(). Se não existir, devolve um acumulador vazio."""
+        existe = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='estado_momentos'").fetchone()
+        colunas = [c[1] for c in conn.execute("PRAGMA table_info(estado_momentos)")] if existe else []
+        marca = "ultima_data" if "ultima_data" in colunas else "NULL"  # Estado salvo antes da marca d'água
+        linhas = conn.execute(
+            f"SELECT ticker, n, mean, m2, m3, m4, {marca} FROM estado_momentos WHERE nome = ? ORDER BY ticker",
+            (nome,)).fetchall() if existe else []
+        acc = cls([linha[0] for linha in linhas])
+        if linhas:
+            valores = np.array([linha[1:6] for linha in linhas], dtype=np.float64)
+            acc.n, acc.mean, acc.m2, acc.m3, acc.m4 = (valores[:, i].copy() for i in range(5))
+            acc.ultima = np.array([cls.SEM_DATA if linha[6] is None else pd.Timestamp(linha[6]).value
+                                   for linha in linhas], dtype=np.int64)
+        return acc
+
+
+# 3. MONTE CARLO (VaR / CVaR POR SIMULAÇÃO)
+
+_CACHE_CHOLESKY = OrderedDict()  # LRU pequeno: processos longos (serviço) não acumulam um fator N x N por matriz
+MAX_CACHE_CHOLESKY = 8
+_TRAVA_CHOLESKY = threading.Lock()
+RESERVA_MC = 256 * 1024  # Bytes do memoria_max que não dependem do lote (fora cauda e cenários)
+
+
+def _cholesky_cache(corr):
+    """Fator de Cholesky da matriz de correlação, calculado uma vez por matriz (LRU por hash)."""
+    chave = hashlib.sha1(np.ascontiguousarray(corr).tobytes()).hexdigest()
+    with _TRAVA_CHOLESKY:
+        fator = _CACHE_CHOLESKY.get(chave)
+        if fator is not None:
+            _CACHE_CHOLESKY.move_to_end(chave)
+            return fator
+    try:
+        fator = np.linalg.cholesky(corr)
+    except np.linalg.LinAlgError:
+        # Matriz não positiva-definida (ex: mais ativos que dias): corta autovalores negativos
+        vals, vecs = np.linalg.eigh(corr)
+        ajustada = (vecs * np.maximum(vals, 1e-10)) @ vecs.T
+        d = np.sqrt(np.diag(ajustada))
+        fator = np.linalg.cholesky(ajustada / np.outer(d, d))
+    with _TRAVA_CHOLESKY:
+        _CACHE_CHOLESKY[chave] = fator
+        while len(_CACHE_CHOLESKY) > MAX_CACHE_CHOLESKY:
+            _CACHE_CHOLESKY.popitem(last=False)
+    return fator
+
+
+class SimuladorMonteCarlo:
+    """
+    VaR/CVaR por simulação multivariada, ajustada à matriz de retornos (dias x ativos).
+    - copula: 'gaussiana' ou 't' (Student-t com 'graus_liberdade'), sobre a correlação histórica.
+    - marginais: 'normal' (média/desvio de cada ativo) ou 'empirica' (quantis históricos).
+    Os cenários são sorteados em lotes de tamanho fixo; só a cauda esquerda de cada série
+    fica em memória, então 1M+ cenários cabem no limite 'memoria_max'.
+    """
+
+    def __init__(self, retornos, copula="gaussiana", graus_liberdade=5, marginais="normal"):
+        if copula not in ("gaussiana", "t"):
+            raise ValueError("copula deve ser 'gaussiana' ou 't'")
+        if marginais not in ("normal", "empirica"):
+            raise ValueError("marginais deve ser 'normal' ou 'empirica'")
+        if isinstance(retornos, pd.Series):
+            retornos = retornos.to_frame()
+        self.tickers = list(retornos.columns)
+        x = retornos.dropna().to_numpy(dtype=np.float64)
+        self.copula = copula
+        self.graus_liberdade = graus_liberdade
+        self.marginais = marginais
+        self.media = x.mean(axis=0)
+        self.desvio = x.std(axis=0, ddof=1)
+        self.ordenados = np.ascontiguousarray(np.sort(x, axis=0))  # Para inverter as marginais empíricas
+        self.cholesky = _cholesky_cache(np.atleast_2d(np.corrcoef(x, rowvar=False)))
+
+    def _sortear_dia(self, rng, n):
+        """
+        Um dia de retornos simulados (n cenários x ativos). As contas são feitas no lugar
+        (out=): o pico é de 2 matrizes n x ativos (normal) ou 4 (marginal empírica).
+        """
+        import scipy.special  # Só a simulação precisa (CDFs vetorizadas); carregado no primeiro uso
+        z = rng.standard_normal((n, len(self.tickers))) @ self.cholesky.T
+        if self.copula == "t":
+            w = rng.chisquare(self.graus_liberdade, size=(n, 1))
+            w /= self.graus_liberdade
+            z /= np.sqrt(w, out=w)
+            u = scipy.special.stdtr(self.graus_liberdade, z, out=z)
+        elif self.marginais == "normal":
+            z *= self.desvio  # Cópula gaussiana + marginais normais = Normal multivariada
+            z += self.media
+            return z
+        else:
+            u = scipy.special.ndtr(z, out=z)
+        if self.marginais == "normal":
+            np.clip(u, 1e-16, 1 - 1e-16, out=u)
+            scipy.special.ndtri(u, out=u)
+            u *= self.desvio
+            u += self.media
+            return u
+        # Marginal empírica: quantil histórico com interpolação linear (como np.percentile)
+        T = self.ordenados.shape[0]
+        u *= T - 1                                                # Posição fracionária
+        baixo = u.astype(np.intp)
+        np.minimum(baixo, T - 2, out=baixo)
+        u -= baixo                                                # Fração entre os dois quantis vizinhos
+        N = len(self.tickers)
+        baixo *= N                                                # Índice plano em 'ordenados' (T x N, ordem C)
+        baixo += np.arange(N)
+        lo = self.ordenados.take(baixo)
+        baixo += N
+        hi = self.ordenados.take(baixo)
+        del baixo
+        hi -= lo
+        hi *= u
+        hi += lo
+        return hi
+
+    def simular_var(self, pesos=None, level=5, horizonte=1, n_cenarios=1_000_000, seed=42,
+                    memoria_max=256 * 1024**2, incluir_ativos=True):
+        """
+        Retorna um DataFrame (uma linha por ativo/carteira) com 'VaR_MC_<nível>' e 'CVaR_MC_<nível>'
+        para cada nível, no horizonte (dias úteis) pedido. Perdas positivas, como em var_historic.
+        - pesos: vetor (ativos) ou matriz (carteiras x ativos) ou DataFrame com colunas = tickers.
+        - level: um nível ou lista de níveis percentuais (ex: [1, 2.5, 5]).
+        - seed: mesma seed + mesmo memoria_max => mesmos números.
+        - memoria_max: teto (bytes) para tudo o que a simulação aloca: lote de cenários,
+          temporários do sorteio e buffer de cauda.
+        """
+        niveis = np.atleast_1d(np.asarray(level, dtype=np.float64))
+        nomes, W = [], None
+        if pesos is not None:
+            if isinstance(pesos, pd.DataFrame):
+                conhecidos = set(self.tickers)
+                fora = [c for c in pesos.columns if c not in conhecidos]
+                if fora:  # Como em risco_carteira: zerar o peso seria simular outra carteira
+                    raise ValueError(f"pesos em tickers fora dos retornos: {fora}")
+                nomes_carteiras = list(pesos.index)
+                pesos = pesos.reindex(columns=self.tickers, fill_value=0.0).to_numpy(dtype=np.float64)
+            else:
+                pesos = np.atleast_2d(np.asarray(pesos, dtype=np.float64))
+                nomes_carteiras = [f"Carteira {i + 1}" for i in range(pesos.shape[0])]
+            W = pesos.T
+            nomes += nomes_carteiras
+        if incluir_ativos:
+            nomes = self.tickers + nomes
+        if not nomes:
+            raise ValueError("Nada a simular: passe pesos ou use incluir_ativos=True")
+
+        # Buffer de cauda: os k menores resultados de cada série bastam para quantil e média da cauda.
+        # Um único buffer (k + lote linhas): a cauda fica nas primeiras linhas, o lote entra logo
+        # abaixo e a partição é feita no lugar, sem vstack nem cópia.
+        k = int(np.floor(niveis.max() / 100 * (n_cenarios - 1))) + 2
+        N, n_series = len(self.tickers), len(nomes)
+        n_carteiras = 0 if W is None else W.shape[1]
+        # Por cenário: linha do buffer (n_series) + riqueza (N) + pico do sorteio (4N na marginal
+        # empírica: z/u, baixo, lo, hi; 2N no produto pela Cholesky) + produto pelos pesos + w da cópula t
+        bytes_por_cenario = 8 * (n_series + 5 * N + n_carteiras + 2)
+        bytes_cauda = 8 * k * n_series + RESERVA_MC  # + objetos Python, resultados e índices pequenos
+        lote = int((memoria_max - bytes_cauda) // bytes_por_cenario)
+        if lote < 1:
+            raise ValueError(f"memoria_max insuficiente: só o buffer de cauda precisa de {bytes_cauda / 1024**2:.0f} MB")
+        lote = min(lote, n_cenarios)
+
+        buffer = np.empty((k + lote, n_series), order="F")  # Colunas contíguas: partição por série
+        m = 0  # Linhas válidas na cauda
+        raiz = np.random.SeedSequence(seed)
+        for i in range(-(-n_cenarios // lote)):
+            rng = np.random.default_rng(raiz.spawn(1)[0])  # Uma por lote (mesma sequência de spawn(n), sem a lista)
+            n = min(lote, n_cenarios - i * lote)
+            riqueza = np.ones((n, N))
+            for _ in range(horizonte):
+                dia = self._sortear_dia(rng, n)
+                dia += 1
+                riqueza *= dia
+                del dia
+            riqueza -= 1
+            if incluir_ativos:
+                buffer[m:m + n, :N] = riqueza
+            if W is not None:
+                buffer[m:m + n, n_series - n_carteiras:] = riqueza @ W
+            del riqueza
+            m += n
+            if m > k:
+                buffer[:m].partition(k - 1, axis=0)
+                m = k
+
+        cauda = buffer[:m]
+        cauda.sort(axis=0)  # No lugar: uma cópia ordenada da cauda passaria do teto
+        resultado = {}
+        for nivel in niveis:
+            pos = nivel / 100 * (n_cenarios - 1)
+            i0 = int(np.floor(pos))
+            q = cauda[i0] + (pos - i0) * (cauda[min(i0 + 1, m - 1)] - cauda[i0])
+            # Cauda ordenada: média das perdas até q, série a série (sem máscara k x séries)
+            n_cauda = [np.searchsorted(cauda[:, j], q[j], side="right") for j in range(n_series)]
+            resultado[f"VaR_MC_{nivel:g}"] = -q
+            resultado[f"CVaR_MC_{nivel:g}"] = -np.array([cauda[:c, j].mean() for j, c in enumerate(n_cauda)])
+        return pd.DataFrame(resultado, index=nomes)
+
+
+def var_monte_carlo(r, level=5, horizonte=1, n_cenarios=100_000, copula="gaussiana", seed=42, **kwargs):
+    """VaR por Monte Carlo de cada ativo (Series, mesma convenção de sinal de var_historic)."""
+    sim = SimuladorMonteCarlo(r, copula=copula, **kwargs)
+    return sim.simular_var(level=level, horizonte=horizonte, n_cenarios=n_cenarios, seed=seed)[f"VaR_MC_{level:g}"]
+
+
+def cvar_monte_carlo(r, level=5, horizonte=1, n_cenarios=100_000, copula="gaussiana", seed=42, **kwargs):
+    """CVaR por Monte Carlo de cada ativo (média das perdas além do VaR simulado)."""
+    sim = SimuladorMonteCarlo(r, copula=copula, **kwargs)
+    return sim.simular_var(level=level, horizonte=horizonte, n_cenarios=n_cenarios, seed=seed)[f"CVaR_MC_{level:g}"]
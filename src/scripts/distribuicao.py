@@ -0,0 +1,445 @@
+import os
+import json
+import time
+import queue
+import base64
+import random
+import socket
+import hashlib
+import smtplib
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from email.header import Header
+from email.utils import formatdate, make_msgid, encode_rfc2231
+import pandas as pd
+
+import instrumentacao as ins
+from coletor_precos import LimitadorTaxa
+
+# ==============================================================================
+# DISTRIBUIÇÃO POR SMTP (SEM INTERAÇÃO, EM LOTE)
+# Lê destinatários (e a carteira de cada um) do arquivo de configuração e envia
+# uma mensagem personalizada por destinatário. Um pool pequeno de threads mantém
+# cada uma a SUA conexão SMTP aberta e reaproveitada entre mensagens
+# (reconecta se cair ou a cada N mensagens). Falha temporária volta com backoff
+# exponencial + jitter; recusa permanente (5xx) não é retentada.
+#
+# O anexo é lido e codificado em base64 UMA vez (em memória se pequeno, num
+# arquivo temporário se grande) e cada mensagem o transmite em blocos direto no
+# socket do DATA: nada de reler o .xlsx nem montar a mensagem inteira por envio.
+# O status de cada destinatário vai para a tabela 'status_envio'; quem já recebeu
+# o mesmo anexo (mesmo conteúdo) não recebe de novo numa reexecução.
+# ==============================================================================
+
+DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, "..", ".."))
+CAMINHO_CONFIG = os.environ.get("LAB_RISCO_DISTRIBUICAO", os.path.join(RAIZ_PROJETO, "config", "distribuicao.json"))
+
+CONEXOES = 4                 # Threads = conexões SMTP simultâneas
+MENSAGENS_POR_CONEXAO = 100  # Muitos relays derrubam a sessão depois de ~100 mensagens
+TENTATIVAS = 3
+ESPERA_INICIAL = 1.0         # segundos antes da 2ª tentativa (dobra a cada nova falha)
+ESPERA_MAXIMA = 30.0
+TIMEOUT = 60
+LIMITE_ANEXO_MEMORIA = 8 * 1024 * 1024  # Acima disso o base64 do anexo fica em disco
+BLOCO = 57 * 1024                       # Múltiplo de 57 bytes = linhas base64 completas (76 colunas)
+
+ASSUNTO = "Relatório Risco de Mercado - {data}"
+CORPO = (
+    "Prezado(a) {nome},\n\n"
+    "Segue em anexo o relatório atualizado de monitoramento de risco e stress testing{da_carteira}.\n\n"
+    "Atenciosamente,\n"
+    "Lab Risco Quant | Automação Financeira"
+)
+
+COLUNAS_STATUS = ['Email', 'Nome', 'Carteira', 'Anexo', 'Status', 'Tentativas', 'Segundos', 'Erro']
+TABELA_STATUS = "status_envio"
+TIPO_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def carregar_config(caminho=None):
+    """
+    Lê o JSON de distribuição (ver config/distribuicao.exemplo.json):
+    - 'smtp': host, porta, ssl, starttls, usuario, senha_env (nome da variável de ambiente
+      com a senha), remetente e, opcionais, conexoes, mensagens_por_conexao,
+      mensagens_por_segundo, tentativas.
+    - 'destinatarios': lista de {email, nome, carteira (opcional), anexo (opcional)}.
+    - 'assunto' e 'corpo' (opcionais): modelos com {nome}, {carteira}, {data} e {da_carteira}.
+    """
+    caminho = caminho or CAMINHO_CONFIG
+    with open(caminho, encoding='utf-8') as f:
+        config = json.load(f)
+    destinatarios = config.get('destinatarios') or []
+    for d in destinatarios:
+        if not d.get('email'):
+            raise ValueError(f"destinatário sem 'email' em {caminho}: {d}")
+    return config
+
+
+# ==============================================================================
+# ANEXO CODIFICADO UMA VEZ
+# ==============================================================================
+
+class AnexoCodificado:
+    """Base64 (linhas CRLF) do arquivo, calculado uma vez; blocos() pode ser lido por várias threads."""
+
+    def __init__(self, caminho, limite_memoria=LIMITE_ANEXO_MEMORIA):
+        self.caminho = os.path.abspath(caminho)
+        self.nome = os.path.basename(caminho)
+        self.tamanho = os.path.getsize(caminho)
+        self._dados, self._spool = None, None
+        sha = hashlib.sha1()
+        destino = bytearray() if self.tamanho <= limite_memoria else \
+            tempfile.NamedTemporaryFile(prefix='anexo_', suffix='.b64', delete=False)
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(BLOCO), b''):
+                sha.update(bloco)
+                codificado = base64.encodebytes(bloco).replace(b"\n", b"\r\n")
+                if isinstance(destino, bytearray):
+                    destino += codificado
+                else:
+                    destino.write(codificado)
+        if isinstance(destino, bytearray):
+            self._dados = bytes(destino)
+        else:
+            destino.close()
+            self._spool = destino.name
+        self.chave = f"{self.nome}:{sha.hexdigest()[:16]}"  # Identifica o conteúdo, não só o nome
+
+    def blocos(self, tamanho=1 << 20):
+        if self._dados is not None:
+            visao = memoryview(self._dados)
+            for i in range(0, len(visao), tamanho):
+                yield visao[i:i + tamanho]
+        else:
+            with open(self._spool, 'rb') as f:  # Cada thread com o seu handle
+                yield from iter(lambda: f.read(tamanho), b'')
+
+    def fechar(self):
+        if self._spool and os.path.exists(self._spool):
+            os.remove(self._spool)
+
+
+def _cabecalho_anexo(anexo, fronteira):
+    nome = anexo.nome if anexo.nome.isascii() else None
+    parametro = f'filename="{nome}"' if nome else f"filename*={encode_rfc2231(anexo.nome, 'utf-8')}"
+    return (f"--{fronteira}\r\n"
+            f"Content-Type: {TIPO_XLSX}\r\n"
+            f"Content-Transfer-Encoding: base64\r\n"
+            f"Content-Disposition: attachment; {parametro}\r\n\r\n").encode('ascii')
+
+
+def _partes_mensagem(remetente, dest, assunto, corpo, anexo):
+    """Blocos de bytes da mensagem MIME (texto em base64: nenhuma linha começa com '.')."""
+    fronteira = f"=_lab_risco_{random.getrandbits(64):016x}"
+    # Assunto longo/acentuado é dobrado em várias linhas: com CRLF, nunca '\n' solto
+    # (Postfix/Exchange recusam LF sem CR no DATA, proteção contra SMTP smuggling)
+    assunto = Header(assunto, 'utf-8').encode(linesep='\r\n')
+    cabecalho = (
+        f"From: {remetente}\r\n"
+        f"To: {dest}\r\n"
+        f"Subject: {assunto}\r\n"
+        f"Date: {formatdate(localtime=True)}\r\n"
+        f"Message-ID: {make_msgid(domain='lab-risco.local')}\r\n"
+        f"MIME-Version: 1.0\r\n"
+        f'Content-Type: multipart/mixed; boundary="{fronteira}"\r\n\r\n'
+        f"--{fronteira}\r\n"
+        f'Content-Type: text/plain; charset="utf-8"\r\n'
+        f"Content-Transfer-Encoding: base64\r\n\r\n"
+    ).encode('ascii')
+    texto = base64.encodebytes(corpo.encode('utf-8')).replace(b"\n", b"\r\n")
+    yield cabecalho + texto
+    if anexo is not None:
+        yield _cabecalho_anexo(anexo, fronteira)
+        yield from anexo.blocos()
+    yield f"\r\n--{fronteira}--\r\n".encode('ascii')
+
+
+# ==============================================================================
+# ENVIO (UMA CONEXÃO POR THREAD)
+# ==============================================================================
+
+class _Conexao:
+    """Conexão SMTP preguiçosa: abre no primeiro envio e recicla a cada 'limite' mensagens."""
+
+    def __init__(self, smtp, limite):
+        self.cfg, self.limite = smtp, limite
+        self.cliente, self.enviadas, self.abertas = None, 0, 0
+
+    def obter(self):
+        if self.cliente is not None and self.enviadas >= self.limite:
+            self.fechar()
+        if self.cliente is None:
+            cfg = self.cfg
+            classe = smtplib.SMTP_SSL if cfg.get('ssl') else smtplib.SMTP
+            self.cliente = classe(cfg.get('host', 'localhost'), int(cfg.get('porta', 25)),
+                                  timeout=cfg.get('timeout', TIMEOUT))
+            # Sem Nagle: o '.' final sai num pacote pequeno e esperaria o ACK atrasado do servidor (~40 ms)
+            self.cliente.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if cfg.get('starttls'):
+                self.cliente.starttls()
+            if cfg.get('usuario'):
+                self.cliente.login(cfg['usuario'], os.environ.get(cfg.get('senha_env', ''), ''))
+            self.enviadas = 0
+            self.abertas += 1
+        return self.cliente
+
+    def fechar(self, educado=True):
+        if self.cliente is not None:
+            try:
+                if educado:
+                    self.cliente.quit()
+                else:
+                    self.cliente.close()
+            except (smtplib.SMTPException, OSError):
+                self.cliente.close()
+        self.cliente = None
+
+
+def _transmitir(cliente, remetente, dest, partes):
+    """MAIL/RCPT/DATA com o conteúdo enviado em blocos (o smtplib.sendmail exigiria a mensagem inteira)."""
+    codigo, resposta = cliente.mail(remetente)
+    if codigo != 250:
+        raise smtplib.SMTPSenderRefused(codigo, resposta, remetente)
+    codigo, resposta = cliente.rcpt(dest)
+    if codigo not in (250, 251):
+        raise smtplib.SMTPRecipientsRefused({dest: (codigo, resposta)})
+    cliente.putcmd("data")
+    codigo, resposta = cliente.getreply()
+    if codigo != 354:
+        raise smtplib.SMTPDataError(codigo, resposta)
+    for bloco in partes:
+        cliente.send(bloco)
+    cliente.send(b".\r\n")
+    codigo, resposta = cliente.getreply()
+    if codigo != 250:
+        raise smtplib.SMTPDataError(codigo, resposta)
+
+
+def _permanente(erro):
+    """Recusas 5xx não melhoram com retentativa."""
+    if isinstance(erro, smtplib.SMTPRecipientsRefused):
+        return all(codigo >= 500 for codigo, _ in erro.recipients.values())
+    if isinstance(erro, smtplib.SMTPResponseException):
+        return erro.smtp_code >= 500
+    return False
+
+
+class Distribuidor:
+    """
+    Envia um lote de mensagens com 'conexoes' threads, cada uma com a sua conexão SMTP.
+    - smtp: dicionário 'smtp' da configuração.
+    - dormir: função de espera (injetável para testes; padrão time.sleep).
+    """
+
+    def __init__(self, smtp, conexoes=None, tentativas=None, espera_inicial=ESPERA_INICIAL,
+                 espera_maxima=ESPERA_MAXIMA, dormir=time.sleep):
+        self.smtp = smtp
+        self.remetente = smtp.get('remetente') or smtp.get('usuario') or 'lab-risco@localhost'
+        self.conexoes = conexoes or smtp.get('conexoes', CONEXOES)
+        self.tentativas = max(1, tentativas or smtp.get('tentativas', TENTATIVAS))
+        self.por_conexao = smtp.get('mensagens_por_conexao', MENSAGENS_POR_CONEXAO)
+        self.espera_inicial, self.espera_maxima = espera_inicial, espera_maxima
+        self.limitador = LimitadorTaxa(smtp.get('mensagens_por_segundo'))
+        self.dormir = dormir
+
+    def _enviar(self, conexao, msg):
+        """Tenta entregar uma mensagem; devolve a linha de status."""
+        t0 = time.perf_counter()
+        erro, status = None, 'erro'
+        for k in range(self.tentativas):
+            if k:
+                espera = min(self.espera_maxima, self.espera_inicial * 2 ** (k - 1))
+                self.dormir(espera * random.uniform(0.5, 1.0))
+            self.limitador.esperar()
+            try:
+                cliente = conexao.obter()
+                _transmitir(cliente, self.remetente, msg['email'],
+                            _partes_mensagem(self.remetente, msg['email'], msg['assunto'], msg['corpo'], msg['anexo']))
+                conexao.enviadas += 1
+                erro, status = None, 'enviado'
+                break
+            except (smtplib.SMTPException, OSError) as e:
+                erro = f"{type(e).__name__}: {e}"
+                if _permanente(e):
+                    status = 'recusado'
+                    try:
+                        conexao.cliente.rset()
+                    except (smtplib.SMTPException, OSError, AttributeError):
+                        conexao.fechar(educado=False)
+                    break
+                conexao.fechar(educado=False)  # Estado da sessão incerto: reconecta na próxima tentativa
+        anexo = msg['anexo'].nome if msg['anexo'] is not None else None
+        return [msg['email'], msg.get('nome'), msg.get('carteira'), anexo, status, k + 1,
+                round(time.perf_counter() - t0, 3), erro]
+
+    def _trabalhador(self, fila, linhas, conexoes):
+        conexao = _Conexao(self.smtp, self.por_conexao)
+        conexoes.append(conexao)
+        try:
+            while True:
+                try:
+                    msg = fila.get_nowait()
+                except queue.Empty:
+                    return
+                linhas.append(self._enviar(conexao, msg))
+        finally:
+            conexao.fechar()
+
+    def enviar(self, mensagens):
+        """
+        mensagens: dicts com email, assunto, corpo, anexo (AnexoCodificado ou None) e,
+        opcionais, nome e carteira. Devolve o DataFrame de status (uma linha por mensagem).
+        """
+        fila = queue.Queue()
+        for m in mensagens:
+            fila.put(m)
+        linhas, conexoes = [], []
+        threads = [threading.Thread(target=self._trabalhador, args=(fila, linhas, conexoes), name=f"smtp_{i}")
+                   for i in range(min(self.conexoes, fila.qsize()))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        ins.contar('conexoes_smtp', sum(c.abertas for c in conexoes))  # Contadores só na thread principal
+        return tabela_status(linhas)
+
+
+# ==============================================================================
+# LOTE A PARTIR DA CONFIGURAÇÃO
+# ==============================================================================
+
+def _ja_enviados(caminho_db, chaves):
+    """(email, chave do anexo) que já constam como enviados em execuções anteriores."""
+    if not caminho_db or not os.path.exists(caminho_db):
+        return set()
+    conn = sqlite3.connect(caminho_db, timeout=30)
+    try:
+        existe = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (TABELA_STATUS,)).fetchone()
+        if not existe:
+            return set()
+        marcas = ",".join("?" * len(chaves))
+        return set(conn.execute(f"SELECT email, chave FROM {TABELA_STATUS} WHERE status = 'enviado' "
+                                f"AND chave IN ({marcas})", list(chaves)).fetchall())
+    finally:
+        conn.close()
+
+
+def pendentes(caminho_db, emails):
+    """
+    Dos 'emails', os que não têm como último status 'enviado' ou 'ja_enviado' (nunca
+    tentados, recusados ou com erro), em ordem. Entra na impressão da etapa de e-mail do pipeline.
+    """
+    emails = sorted(set(emails))
+    if not caminho_db or not os.path.exists(caminho_db):
+        return emails
+    conn = sqlite3.connect(caminho_db, timeout=30)
+    try:
+        existe = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (TABELA_STATUS,)).fetchone()
+        if not existe:
+            return emails
+        ultimo = dict(conn.execute(f"SELECT email, status FROM {TABELA_STATUS} WHERE rowid IN "
+                                   f"(SELECT MAX(rowid) FROM {TABELA_STATUS} GROUP BY email)").fetchall())
+    finally:
+        conn.close()
+    return [e for e in emails if ultimo.get(e) not in ('enviado', 'ja_enviado')]
+
+
+def distribuir(config, arquivo, anexos=None, caminho_db=None, reenviar=False, distribuidor=None):
+    """
+    Monta e envia as mensagens de todos os destinatários da configuração.
+    - arquivo: relatório padrão (anexo de quem não tem outro).
+    - anexos: {carteira: caminho} para relatórios por carteira (tem prioridade sobre 'arquivo').
+    - caminho_db: onde ler/gravar a tabela 'status_envio'. Sem reenviar=True, quem já recebeu
+      o mesmo conteúdo é marcado como 'ja_enviado' e pulado.
+    Devolve o DataFrame de status.
+    """
+    anexos = anexos or {}
+    data = datetime.now().strftime('%d/%m/%Y')
+    modelo_assunto = config.get('assunto', ASSUNTO)
+    modelo_corpo = config.get('corpo', CORPO)
+    codificados = {}  # Cada arquivo distinto é codificado uma única vez
+
+    def anexo_de(d):
+        caminho = d.get('anexo') or anexos.get(d.get('carteira')) or arquivo
+        if not caminho:
+            return None
+        caminho = os.path.abspath(caminho)
+        if caminho not in codificados:
+            codificados[caminho] = AnexoCodificado(caminho)
+        return codificados[caminho]
+
+    try:
+        mensagens = []
+        for d in config.get('destinatarios', []):
+            carteira = d.get('carteira')
+            campos = {'nome': d.get('nome') or d['email'], 'carteira': carteira or '', 'data': data,
+                      'da_carteira': f" da carteira {carteira}" if carteira else ''}
+            mensagens.append({'email': d['email'], 'nome': d.get('nome'), 'carteira': carteira,
+                              'assunto': modelo_assunto.format(**campos), 'corpo': modelo_corpo.format(**campos),
+                              'anexo': anexo_de(d)})
+        ins.contar('bytes_anexo', sum(a.tamanho for a in codificados.values()))
+
+        pulados = []
+        if not reenviar and mensagens:
+            chaves = {m['anexo'].chave for m in mensagens if m['anexo'] is not None}
+            feitos = _ja_enviados(caminho_db, chaves) if chaves else set()
+            pendentes = []
+            for m in mensagens:
+                if m['anexo'] is not None and (m['email'], m['anexo'].chave) in feitos:
+                    pulados.append([m['email'], m['nome'], m['carteira'], m['anexo'].nome, 'ja_enviado', 0, 0.0, None])
+                else:
+                    pendentes.append(m)
+            mensagens = pendentes
+
+        distribuidor = distribuidor or Distribuidor(config.get('smtp', {}))
+        with ins.etapa('envio_smtp') as e:
+            e.linhas = len(mensagens)
+            status = distribuidor.enviar(mensagens) if mensagens else tabela_status([])
+        if pulados:
+            status = pd.concat([status, tabela_status(pulados)], ignore_index=True)
+        if caminho_db:
+            chave_por_email = {(m['email'], m['anexo'].nome): m['anexo'].chave for m in mensagens if m['anexo'] is not None}
+            conn = sqlite3.connect(caminho_db, timeout=30)
+            try:
+                with conn:
+                    gravar_status(conn, status[status['Status'] != 'ja_enviado'], chave_por_email)
+            finally:
+                conn.close()
+        for situacao in ('enviado', 'erro', 'recusado', 'ja_enviado'):
+            ins.contar(f"envio_{situacao}", int((status['Status'] == situacao).sum()))
+        return status
+    finally:
+        for anexo in codificados.values():
+            anexo.fechar()
+
+
+def tabela_status(linhas):
+    return pd.DataFrame(linhas, columns=COLUNAS_STATUS)
+
+
+def resumo(status, max_linhas=20):
+    """Imprime o placar do envio e os destinatários com problema."""
+    contagem = status['Status'].value_counts()
+    print(f"📤 Envio: {contagem.get('enviado', 0)} enviados / {contagem.get('ja_enviado', 0)} já tinham recebido / "
+          f"{contagem.get('erro', 0)} com erro / {contagem.get('recusado', 0)} recusados ({len(status)} destinatários)")
+    problemas = status[status['Status'].isin(['erro', 'recusado'])]
+    for row in problemas.head(max_linhas).itertuples(index=False):
+        print(f"   ⚠️ {row.Email}: {row.Erro} ({row.Tentativas} tentativas)")
+    if len(problemas) > max_linhas:
+        print(f"   ... e mais {len(problemas) - max_linhas} destinatários com problema (ver tabela '{TABELA_STATUS}')")
+
+
+def gravar_status(conn, status, chaves=None):
+    """Registra o status por destinatário desta execução na tabela 'status_envio' (não abre transação)."""
+    conn.execute(f"""CREATE TABLE IF NOT EXISTS {TABELA_STATUS} (
+        executado_em TEXT, email TEXT, nome TEXT, carteira TEXT, anexo TEXT, chave TEXT,
+        status TEXT, tentativas INTEGER, segundos REAL, erro TEXT)""")
+    chaves = chaves or {}
+    agora = datetime.now().isoformat(timespec="seconds")
+    conn.executemany(f"INSERT INTO {TABELA_STATUS} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     [(agora, r.Email, r.Nome, r.Carteira, r.Anexo, chaves.get((r.Email, r.Anexo)),
+                       r.Status, int(r.Tentativas), float(r.Segundos), r.Erro)
+                      for r in status.itertuples(index=False)])
@@ -3,6 +3,9 @@ import glob
 import sys
 from datetime import datetime
 
+import instrumentacao as ins
+import distribuicao as dist
+
 # Tenta importar a biblioteca de automação do Windows
 try:
     import win32com.client as win32
@@ -17,6 +20,7 @@ DIRETORIO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
 # Sobe 2 níveis: scripts -> src -> RAIZ
 RAIZ_PROJETO = os.path.abspath(os.path.join(DIRETORIO_SCRIPT, "..", "..")) 
 PASTA_REPORTS = os.path.join(RAIZ_PROJETO, "reports")
+CAMINHO_DB = os.path.join(RAIZ_PROJETO, "dados", "mercado.db")  # Só para o histórico de execuções
 # ==============================================================================
 
 def validar_ambiente_bancario():
@@ -27,59 +31,99 @@ def validar_ambiente_bancario():
         print("Este sistema exige ambiente Windows com Outlook Desktop instalado.")
         sys.exit(1)
 
-def main():
+def _destinatarios_outlook(config):
+    """Destinatários da configuração; sem ela, pergunta (só com terminal interativo)."""
+    if config is not None:
+        return [d['email'] for d in config.get('destinatarios', [])]
+    if not sys.stdin.isatty():
+        print(f"❌ Sem destinatários: crie {dist.CAMINHO_CONFIG} (ver config/distribuicao.exemplo.json).")
+        return []
+    print("\n👥 Digite os e-mails corporativos (separados por vírgula).")
+    input_usuario = input("Destinatários: ")
+    return [email.strip() for email in input_usuario.split(',') if email.strip()]
+
+def main(arquivo=None, caminho_config=None, anexos=None):
+    """
+    Envia o relatório e retorna True se o e-mail saiu (no SMTP: nenhum destinatário com erro pendente).
+    - arquivo: caminho do .xlsx (o pipeline passa o que acabou de gerar); sem ele, o mais recente de reports/.
+    - caminho_config: JSON de distribuição (padrão: config/distribuicao.json). Com a seção 'smtp',
+      o envio é feito por SMTP (sem Outlook, roda no agendador Linux); sem ela, pelo Outlook.
+    - anexos: {carteira: caminho} com relatórios por carteira (só no envio por SMTP).
+    """
     print(f"\n📧 --- MÓDULO DE DISTRIBUIÇÃO CORPORATIVA (STRICT MODE) ---")
-    validar_ambiente_bancario()
+    caminho_config = caminho_config or dist.CAMINHO_CONFIG
+    config = dist.carregar_config(caminho_config) if os.path.exists(caminho_config) else None
+    if config is None or not config.get('smtp'):
+        validar_ambiente_bancario()
 
     # 1. Validação de Arquivos
-    if not os.path.exists(PASTA_REPORTS):
-        print(f"❌ ERRO: Pasta 'reports' não encontrada em: {PASTA_REPORTS}")
-        return
+    if arquivo is not None:
+        if not os.path.exists(arquivo):
+            print(f"❌ ERRO: Relatório não encontrado: {arquivo}")
+            return
+        arquivo_recente = os.path.abspath(arquivo)
+    else:
+        if not os.path.exists(PASTA_REPORTS):
+            print(f"❌ ERRO: Pasta 'reports' não encontrada em: {PASTA_REPORTS}")
+            return
 
-    arquivos = glob.glob(os.path.join(PASTA_REPORTS, "*.xlsx"))
-    if not arquivos:
-        print(f"❌ Nenhum relatório (.xlsx) disponível para envio.")
-        return
+        arquivos = glob.glob(os.path.join(PASTA_REPORTS, "*.xlsx"))
+        if not arquivos:
+            print(f"❌ Nenhum relatório (.xlsx) disponível para envio.")
+            return
 
-    # Pega o arquivo mais recente
-    arquivo_recente = os.path.abspath(max(arquivos, key=os.path.getmtime))
+        # Pega o arquivo mais recente
+        arquivo_recente = os.path.abspath(max(arquivos, key=os.path.getmtime))
     nome_arquivo = os.path.basename(arquivo_recente)
     print(f"📎 Arquivo em anexo: {nome_arquivo}")
 
-    # 2. Input de Destinatários
-    print("\n👥 Digite os e-mails corporativos (separados por vírgula).")
-    input_usuario = input("Destinatários: ")
-    if not input_usuario: return
+    # 2. Envio por SMTP (destinatários e carteiras da configuração)
+    if config is not None and config.get('smtp'):
+        try:
+            status = dist.distribuir(config, arquivo_recente, anexos=anexos, caminho_db=CAMINHO_DB)
+        except Exception as e:
+            print(f"❌ Falha na distribuição por SMTP: {e}")
+            ins.falha(e)
+            return
+        dist.resumo(status)
+        # Recusa permanente (endereço inválido) fica no resumo/tabela, mas não trava o pipeline
+        return not (status['Status'] == 'erro').any()
 
-    # Tratamento para ponto e vírgula (Padrão Outlook)
-    lista_limpa = [email.strip() for email in input_usuario.split(',')]
+    # Destinatários do Outlook (Tratamento para ponto e vírgula, Padrão Outlook)
+    lista_limpa = _destinatarios_outlook(config)
+    if not lista_limpa: return
     destinatarios_outlook = "; ".join(lista_limpa)
 
     # 3. ROTINA DE ENVIO (SOMENTE OUTLOOK)
     print("\n🔄 Conectando ao Servidor Exchange/Outlook...")
 
     try:
-        # Tenta instanciar o Outlook Desktop
-        outlook = win32.Dispatch('outlook.application')
-        mail = outlook.CreateItem(0)
-        
-        # Configuração da Mensagem
-        mail.To = destinatarios_outlook
-        mail.Subject = f"Relatório Risco de Mercado - {datetime.now().strftime('%d/%m/%Y')}"
-        mail.Body = (
-            "Prezados,\n\n"
-            "Segue em anexo o relatório atualizado de monitoramento de risco e stress testing.\n\n"
-            "Atenciosamente,\n"
-            "Lab Risco Quant | Automação Financeira"
-        )
-        
-        # Anexo Obrigatório
-        mail.Attachments.Add(arquivo_recente)
-        
-        # Disparo
-        mail.Send()
+        with ins.etapa('envio') as etapa:
+            # Tenta instanciar o Outlook Desktop
+            outlook = win32.Dispatch('outlook.application')
+            mail = outlook.CreateItem(0)
+            
+            # Configuração da Mensagem
+            mail.To = destinatarios_outlook
+            mail.Subject = f"Relatório Risco de Mercado - {datetime.now().strftime('%d/%m/%Y')}"
+            mail.Body = (
+                "Prezados,\n\n"
+                "Segue em anexo o relatório atualizado de monitoramento de risco e stress testing.\n\n"
+                "Atenciosamente,\n"
+                "Lab Risco Quant | Automação Financeira"
+            )
+            
+            # Anexo Obrigatório
+            mail.Attachments.Add(arquivo_recente)
+            
+            # Disparo
+            mail.Send()
+            etapa.linhas = len(lista_limpa)
+        ins.contar('destinatarios', len(lista_limpa))
+        ins.contar('bytes_anexo', os.path.getsize(arquivo_recente))
         print(f"✅ SUCESSO! Relatório enviado via Protocolo Corporativo.")
         print(f"📤 Destino: {destinatarios_outlook}")
+        return True
 
     except Exception as e:
         # MENSAGEM DE ERRO PERSONALIZADA (PEDIDO DO USUÁRIO)
@@ -95,6 +139,8 @@ def main():
         print("é PROIBIDO nesta estação de trabalho. O sistema foi encerrado.")
         print("="*60)
         print(f"Erro técnico original: {e}")
+        ins.falha(e)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with ins.execucao('distribuicao', CAMINHO_DB):
+        main()
\ No newline at end of file
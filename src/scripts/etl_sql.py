@@ -1,7 +1,15 @@
-import yfinance as yf
 import pandas as pd
-import sqlite3
 import os
+import time
+import random
+import threading
+from datetime import datetime, timedelta
+
+import base_precos as bp
+import snapshot_precos as sp
+import carga_arquivos as ca
+import coletor_precos as cp
+import instrumentacao as ins
 
 # Configuração de Caminhos
 DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
@@ -13,33 +21,202 @@ TICKERS = [
     'MGLU3.SA', 'LREN3.SA', 'WEGE3.SA', 'TAEE11.SA'
 ]
 
-def atualizar_banco():
-    # Cria a pasta dados se não existir
-    if not os.path.exists(os.path.dirname(CAMINHO_DB)):
-        os.makedirs(os.path.dirname(CAMINHO_DB))
+# Janela de histórico usada na primeira carga (ou no backfill de um ticker novo)
+ANOS_HISTORICO = 2
+
+# ==============================================================================
+# PROVEDORES DE PREÇO (PLUGÁVEIS)
+# Qualquer objeto com .baixar(tickers, inicio) -> DataFrame longo
+# (ticker, date, adj_close, close, volume) serve. Ver base_precos.para_formato_longo.
+# ==============================================================================
+
+def _extrair_campo(df, campo, tickers):
+    dados = df[campo]
+    if isinstance(dados, pd.Series):
+        dados = dados.to_frame(tickers[0])
+    return dados
+
+
+class ProvedorYahoo:
+    """
+    Baixa preços do Yahoo Finance (yfinance).
+    O yf.download guarda resultados em estado global do módulo, então as chamadas são
+    serializadas por uma trava; o paralelismo por ticker fica a cargo do próprio yfinance.
+    """
+    tamanho_lote = 50
+    chamadas_por_segundo = 2
+    _trava = threading.Lock()
+
+    def baixar(self, tickers, inicio):
+        import yfinance as yf
+        tickers = list(tickers)
+        with self._trava:
+            # CORREÇÃO: auto_adjust=False garante que as colunas venham no formato padrão
+            df = yf.download(tickers, start=inicio.strftime("%Y-%m-%d"), progress=False, auto_adjust=False)
 
-    print(f"🔄 Baixando dados para: {len(TICKERS)} ativos...")
-    try:
-        # CORREÇÃO: auto_adjust=False garante que as colunas venham no formato padrão
-        df = yf.download(TICKERS, period="2y", progress=False, auto_adjust=False)
-        
         # Tratamento seguro da coluna de preços
         if 'Adj Close' in df.columns:
-            dados = df['Adj Close']
+            adj = _extrair_campo(df, 'Adj Close', tickers)
         elif 'Close' in df.columns:
-            dados = df['Close']
+            adj = _extrair_campo(df, 'Close', tickers)
         else:
-            print("❌ Erro: Coluna de preço não encontrada no retorno do Yahoo.")
-            return
+            raise KeyError("Coluna de preço não encontrada no retorno do Yahoo.")
+        close = _extrair_campo(df, 'Close', tickers) if 'Close' in df.columns else None
+        volume = _extrair_campo(df, 'Volume', tickers) if 'Volume' in df.columns else None
+        return bp.para_formato_longo(adj, close, volume)
+
+
+class ProvedorArquivo:
+    """
+    Lê preços de um CSV local (ou de um CSV dentro de um .zip), lido uma vez em blocos
+    (ver carga_arquivos) e servido da memória. Substituto offline do Yahoo: testes e
+    reconstrução da base sem rede. Para arquivos enormes use carga_arquivos direto.
+    - mapa_nomes: renomeia colunas do arquivo para tickers (padrão: carga_arquivos.MAPA_NOMES,
+      o mesmo do notebook, ex: {'Itau': 'ITUB4.SA'}).
+    - latencia: segundos de espera por chamada (simula a ida à rede).
+    - taxa_falha: probabilidade de uma chamada falhar com erro transitório.
+    - tickers_com_erro: tickers que sempre derrubam a chamada do lote em que estiverem.
+    """
+
+    def __init__(self, caminho, mapa_nomes=None, latencia=0.0, taxa_falha=0.0, tickers_com_erro=(), seed=None):
+        self.caminho = caminho
+        self.mapa_nomes = mapa_nomes
+        self.latencia = latencia
+        self.taxa_falha = taxa_falha
+        self.tickers_com_erro = set(tickers_com_erro)
+        self.chamadas = 0
+        self._rng = random.Random(seed)
+        self._dados = None
+        self._trava = threading.Lock()
+
+    def _carregar(self):
+        with self._trava:
+            if self._dados is None:
+                self._dados = pd.concat(ca.ler_em_blocos(self.caminho, self.mapa_nomes), ignore_index=True)
+            return self._dados
+
+    def baixar(self, tickers, inicio):
+        dados = self._carregar()
+        with self._trava:
+            self.chamadas += 1
+            falhou = self._rng.random() < self.taxa_falha
+        if self.latencia:
+            time.sleep(self.latencia)
+        if falhou:
+            raise ConnectionError("falha transitória simulada")
+        ruins = self.tickers_com_erro.intersection(tickers)
+        if ruins:
+            raise ValueError(f"ticker rejeitado pelo provedor: {sorted(ruins)}")
+        inicio = pd.Timestamp(inicio).strftime(bp.FORMATO_DATA)
+        return dados[dados["ticker"].isin(set(tickers)) & (dados["date"] >= inicio)].reset_index(drop=True)
+
+# ==============================================================================
+# ETL
+# ==============================================================================
+
+def _agrupar_por_inicio(marcas, hoje):
+    """Agrupa tickers que começam na mesma data, para baixar cada grupo numa chamada só."""
+    grupos = {}
+    for t, marca in marcas.items():
+        inicio = marca + timedelta(days=1) if marca is not None else hoje - timedelta(days=365 * ANOS_HISTORICO)
+        if inicio.date() > hoje.date():
+            continue  # Já está em dia
+        grupos.setdefault(inicio.normalize(), []).append(t)
+    return grupos
+
+
+def _contar_status(status):
+    """Placar da coleta como contadores da execução (ver instrumentacao)."""
+    for situacao, n in status['Status'].value_counts().items():
+        ins.contar(f'tickers_{situacao}', int(n))
+    ins.contar('tentativas', int(status['Tentativas'].sum()))
+
+
+def atualizar_banco(provedor=None, tickers=None, caminho_db=None, incremental=True, coletor=None):
+    """
+    Atualiza a base de preços (tabela longa 'precos', ver base_precos).
+    - incremental=True (padrão): lê a última data de cada ticker, baixa só o que falta
+      e faz upsert das linhas novas. Ticker novo recebe backfill sem mexer nos outros.
+    - incremental=False: baixa a janela completa e troca a tabela atomicamente (útil
+      para recalcular ajustes de proventos em todo o histórico).
+    A coleta é feita em lotes concorrentes (ver coletor_precos); um ticker que falha
+    não derruba os outros e continua atrasado, então volta na próxima execução.
+    O status por ticker fica na tabela 'status_coleta'.
+    """
+    provedor = provedor or ProvedorYahoo()
+    tickers = tickers or TICKERS
+    caminho_db = caminho_db or CAMINHO_DB
+    coletor = coletor or cp.Coletor(provedor)
+
+    # Cria a pasta dados se não existir
+    if not os.path.exists(os.path.dirname(caminho_db)):
+        os.makedirs(os.path.dirname(caminho_db))
+
+    conn = bp.conectar(caminho_db)
+    try:
+        hoje = pd.Timestamp(datetime.now()).normalize()
+        if not incremental:
+            print(f"🔄 Carga completa para: {len(tickers)} ativos...")
+            partes, linhas = [], []
+            with ins.etapa('coleta') as e:
+                for longo, st in coletor.coletar({hoje - timedelta(days=365 * ANOS_HISTORICO): list(tickers)}):
+                    if longo is not None:
+                        partes.append(longo)
+                    linhas += st
+                e.linhas = sum(len(p) for p in partes)
+            status = cp.tabela_status(linhas)
+            _contar_status(status)
+            cp.resumo(status)
+            with conn:
+                cp.gravar_status(conn, status)
+            if (status['Status'] != 'ok').any():
+                # Trocar a tabela agora apagaria o histórico de quem falhou
+                print("❌ Carga completa cancelada: há ativos sem dados. A tabela atual foi mantida.")
+                return 0
+            with ins.etapa('gravacao') as e:
+                gravados = e.linhas = bp.substituir(conn, pd.concat(partes, ignore_index=True))
+            print(f"✅ Banco de Dados atualizado com sucesso! ({gravados} cotações)")
+            with ins.etapa('snapshot'):
+                sp.republicar(conn, caminho_db)
+            return gravados
+
+        with ins.etapa('ultimas_datas'):
+            salvas = bp.ultimas_datas(conn)
+        grupos = _agrupar_por_inicio({t: salvas.get(t) for t in tickers}, hoje)
+        if not grupos:
+            print("✅ Banco de Dados já está em dia. Nada a baixar.")
+            if not sp.atual(caminho_db):
+                with ins.etapa('snapshot'):
+                    sp.republicar(conn, caminho_db)
+            return 0
+
+        for inicio, grupo in sorted(grupos.items()):
+            print(f"🔄 Baixando {len(grupo)} ativos a partir de {inicio:%d/%m/%Y}...")
+        # Uma transação: grava tudo o que chegou (lotes gravados pela thread principal).
+        # A etapa inclui a espera pelos lotes: o download e o upsert se sobrepõem.
+        with ins.etapa('coleta_gravacao') as e, conn:
+            gravados, linhas = 0, []
+            for longo, st in coletor.coletar(grupos):
+                if longo is not None:
+                    gravados += bp.gravar(conn, longo)
+                linhas += st
+            status = cp.tabela_status(linhas)
+            cp.gravar_status(conn, status)
+            e.linhas = gravados
+        _contar_status(status)
+        cp.resumo(status)
+        print(f"✅ Banco de Dados atualizado com sucesso! ({gravados} cotações novas)")
+        if gravados or not sp.atual(caminho_db):
+            with ins.etapa('snapshot'):
+                sp.republicar(conn, caminho_db)
+        return gravados
 
-        # Salva no SQL
-        conn = sqlite3.connect(CAMINHO_DB)
-        dados.to_sql("cotacoes", conn, if_exists="replace", index=True)
-        conn.close()
-        print("✅ Banco de Dados atualizado com sucesso!")
-        
     except Exception as e:
         print(f"❌ Erro Crítico no ETL: {e}")
+        ins.falha(e)
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
-    atualizar_banco()
\ No newline at end of file
+    with ins.execucao('etl', CAMINHO_DB):
+        atualizar_banco()
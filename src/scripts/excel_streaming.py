@@ -0,0 +1,290 @@
+from datetime import datetime
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.chart import ScatterChart, BarChart, Series, Reference
+from openpyxl.formatting.rule import DataBarRule
+from openpyxl.utils import get_column_letter
+
+import instrumentacao as ins
+
+# ==============================================================================
+# EXCEL BUILDER STREAMING (write_only=True)
+# Mesmo layout do relatório padrão, mas as linhas vão direto para o disco e
+# TODOS os estilos são NamedStyles criados uma única vez por workbook (nenhum
+# Font/Alignment novo por célula). Acima de LIMITE_GRAFICO_DETALHADO ativos os
+# gráficos mudam para: dispersão com uma série por SETOR e Escada de Risco Top-N.
+# ==============================================================================
+
+LIMITE_GRAFICO_DETALHADO = 50  # Até aqui: uma série por ativo (igual ao builder padrão)
+TOP_N_ESCADA = 20              # Acima: Escada de Risco só com os N maiores CVaR
+LINHA_ALERTA = 45              # Posição do alerta no layout padrão (empurrada se a tabela for maior)
+
+AZUL_ESCURO = "003366"; VERMELHO_ALERTA = "C00000"; CINZA_CLARO = "F2F2F2"; LARANJA = "FFC000"
+_BORDA = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+_CENTRO = Alignment(horizontal='center', vertical='center')
+
+
+def _solido(cor):
+    return PatternFill(start_color=cor, end_color=cor, fill_type="solid")
+
+
+def _estilos_nomeados():
+    """Todos os estilos do relatório, como NamedStyles (compartilhados por todas as células)."""
+    definicoes = {
+        'titulo_azul': dict(font=Font(size=16, bold=True, color=AZUL_ESCURO)),
+        'titulo_vermelho': dict(font=Font(size=16, bold=True, color=VERMELHO_ALERTA)),
+        'subtitulo_azul': dict(font=Font(bold=True, color=AZUL_ESCURO)),
+        'cabecalho': dict(font=Font(color="FFFFFF", bold=True, size=10), fill=_solido(AZUL_ESCURO), alignment=_CENTRO),
+        'cabecalho_alerta': dict(font=Font(color="FFFFFF", bold=True, size=10), fill=_solido("B30000"), alignment=_CENTRO),
+        'ativo': dict(font=Font(bold=True), border=_BORDA,
+                      alignment=Alignment(horizontal='left', vertical='center', indent=1)),
+        'texto': dict(border=_BORDA, alignment=_CENTRO),
+        'texto_borda': dict(border=_BORDA),
+        'termo': dict(font=Font(bold=True), border=_BORDA, fill=_solido(CINZA_CLARO)),
+        'critico': dict(font=Font(color="FF0000", bold=True), border=_BORDA, fill=_solido("FFCCCC"), alignment=_CENTRO),
+        'ret_pos': dict(font=Font(color="006100", bold=True), border=_BORDA, number_format='0.0%'),
+        'ret_neg': dict(font=Font(color="9C0006", bold=True), border=_BORDA, number_format='0.0%'),
+        'pnl_pos': dict(font=Font(color="006100", bold=True), border=_BORDA, alignment=_CENTRO, number_format='0.0%'),
+        'pnl_neg': dict(font=Font(color="9C0006", bold=True), border=_BORDA, alignment=_CENTRO, number_format='0.0%'),
+        'ativo_centro': dict(font=Font(bold=True), border=_BORDA, alignment=_CENTRO),
+        'pct1': dict(border=_BORDA, alignment=_CENTRO, number_format='0.0%'),
+        'pct2': dict(border=_BORDA, alignment=_CENTRO, number_format='0.00%'),
+        'num2': dict(border=_BORDA, alignment=_CENTRO, number_format='0.00'),
+        'num3': dict(border=_BORDA, alignment=_CENTRO, number_format='0.000'),
+        'num1': dict(border=_BORDA, alignment=_CENTRO, number_format='0.0'),
+        'inteiro': dict(border=_BORDA, alignment=_CENTRO, number_format='0'),
+        'data': dict(border=_BORDA, alignment=_CENTRO, number_format='DD/MM/YYYY'),
+        'nivel': dict(border=_BORDA, alignment=_CENTRO, number_format='0.0"%"'),
+        'cvar': dict(font=Font(bold=True, color=VERMELHO_ALERTA), border=_BORDA, alignment=_CENTRO, number_format='0.00%'),
+        'kurt_alta': dict(font=Font(bold=True, color=LARANJA), border=_BORDA, alignment=_CENTRO, number_format='0.00'),
+        'pior_dia': dict(font=Font(italic=True), border=_BORDA, alignment=_CENTRO, number_format='0.00%'),
+        'zona_Verde': dict(border=_BORDA, alignment=_CENTRO, fill=_solido("C6EFCE")),
+        'zona_Amarela': dict(border=_BORDA, alignment=_CENTRO, fill=_solido("FFEB9C")),
+        'zona_Vermelha': dict(border=_BORDA, alignment=_CENTRO, fill=_solido("FFC7CE")),
+        'auxiliar': dict(font=Font(color="808080", size=8), number_format='0.00%'),
+    }
+    return [NamedStyle(name=f"rel_{nome}", **attrs) for nome, attrs in definicoes.items()]
+
+
+class _Folha:
+    """
+    Atalho para escrever linhas em uma aba write_only com células estilizadas.
+    Em escrever(), um item (valor, estilo) reaproveita UMA célula por (coluna, estilo):
+    no modo write_only a linha é serializada no append, então a célula pode ser reciclada.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.linha = 0  # Última linha escrita
+        self._modelos = {}
+
+    def celula(self, valor, estilo=None):
+        c = WriteOnlyCell(self.ws, value=valor)
+        if estilo:
+            c.style = f"rel_{estilo}"
+        return c
+
+    def _reciclada(self, coluna, valor, estilo):
+        c = self._modelos.get((coluna, estilo))
+        if c is None:
+            c = self._modelos[(coluna, estilo)] = self.celula(None, estilo)
+        c.value = valor
+        return c
+
+    def escrever(self, valores):
+        self.ws.append([self._reciclada(i, *v) if isinstance(v, tuple) else v for i, v in enumerate(valores)])
+        self.linha += 1
+
+    def pular_ate(self, linha):
+        while self.linha < linha - 1:
+            self.escrever([])
+
+
+def _aba_monitor(wb, df, risk_free, data_ref=None):
+    ws = wb.create_sheet("Monitor Geral")
+    f = _Folha(ws)
+    n = len(df)
+    larguras = {'B': 12, 'C': 12, 'D': 13, 'E': 13, 'F': 10, 'G': 10, 'H': 9, 'I': 13, 'J': 12}
+    for col, w in larguras.items(): ws.column_dimensions[col].width = w
+    ws.freeze_panes = "B7"
+
+    f.escrever([])
+    f.escrever([None, f.celula("MONITOR DE PERFORMANCE", 'titulo_azul')])
+    f.escrever([None, f"Ref: {(data_ref or datetime.now()).strftime('%d/%m/%Y')} | RF: {risk_free:.2%}"])
+    f.pular_ate(6)
+    cols = ['Ativo', 'Setor', 'Retorno Total', 'Volatilidade', 'Sharpe', 'Sortino', 'Beta', 'Max Drawdown', 'Duração DD']
+    f.escrever([None] + [f.celula(c, 'cabecalho') for c in cols])
+
+    campos = ['Ativo', 'Setor', 'Retorno', 'Volatilidade', 'Sharpe', 'Sortino', 'Beta', 'Max DD', 'Duração DD']
+    for row in df[campos].itertuples(index=False):
+        ativo, setor, ret, vol, sharpe, sortino, beta, max_dd, duracao = row
+        f.escrever([None, (ativo, 'ativo'), (setor, 'texto'), (ret, 'ret_pos' if ret > 0 else 'ret_neg'),
+                    (vol, 'pct1'), (sharpe, 'num2'), (sortino, 'num2'), (beta, 'num2'), (max_dd, 'pct1'),
+                    (duracao, 'inteiro')])
+
+    ultima = 6 + n
+    ws.conditional_formatting.add(f'F7:F{ultima}', DataBarRule(start_type='min', end_type='max', color="638EC6"))
+    ws.conditional_formatting.add(f'E7:E{ultima}', DataBarRule(start_type='min', end_type='max', color="FF99CC"))
+
+    chart = ScatterChart()
+    chart.style = 2; chart.height = 14; chart.width = 24
+    chart.x_axis.title = "Volatilidade"; chart.y_axis.title = "Retorno Total"
+    chart.legend.position = 'r'
+    if n <= LIMITE_GRAFICO_DETALHADO:
+        chart.title = "Risco x Retorno (Dispersão)"
+        blocos = [(df['Ativo'].iloc[i], 7 + i, 7 + i) for i in range(n)]
+    else:
+        # Uma série por setor: o DataFrame chega ordenado por setor, então cada setor é um bloco contínuo
+        chart.title = "Risco x Retorno por Setor (Dispersão)"
+        setores = df['Setor'].fillna('Outros').tolist()
+        blocos, inicio = [], 0
+        for i in range(1, n + 1):
+            if i == n or setores[i] != setores[inicio]:
+                blocos.append((setores[inicio], 7 + inicio, 6 + i))
+                inicio = i
+    for titulo, r0, r1 in blocos:
+        series = Series(values=Reference(ws, min_col=4, min_row=r0, max_row=r1),
+                        xvalues=Reference(ws, min_col=5, min_row=r0, max_row=r1),
+                        title_from_data=False, title=str(titulo))
+        series.marker.symbol = "circle"; series.marker.size = 7
+        series.graphicalProperties.line.noFill = True  # SEM LINHA! (Evita o rabisco)
+        chart.series.append(series)
+    ws.add_chart(chart, "B18" if n <= LIMITE_GRAFICO_DETALHADO else "K6")
+
+
+def _aba_beyond_var(wb, df):
+    ws = wb.create_sheet("BeyondVaR Analysis")
+    f = _Folha(ws)
+    n = len(df)
+    detalhado = n <= LIMITE_GRAFICO_DETALHADO
+    ws.column_dimensions['B'].width = 12
+    for i in range(2, 9): ws.column_dimensions[get_column_letter(i+1)].width = 18
+    ws.freeze_panes = "B7"
+
+    # Top-N por CVaR: tabela auxiliar à direita (colunas AA:AE), escrita junto com as linhas
+    col_aux = 27
+    top = df.nlargest(TOP_N_ESCADA, 'CVaR') if not detalhado else None
+
+    f.escrever([])
+    f.escrever([None, f.celula("STRESS TEST (ANÁLISE DE CRISE)", 'titulo_vermelho')])
+    f.pular_ate(6)
+    cols = ['Ativo', 'VaR Normal', 'VaR Histórico', 'VaR CF (Fat Tail)', 'CVaR (Extreme)', 'Kurtosis', 'Worst Day']
+    cab = [None] + [f.celula(c, 'cabecalho') for c in cols]
+    if top is not None:
+        cab += [None] * (col_aux - len(cab)) + ['Top CVaR', 'VaR Normal', 'VaR Histórico', 'VaR CF (Fat Tail)', 'CVaR (Extreme)']
+    f.escrever(cab)
+
+    auxiliares = list(top[['Ativo', 'VaR_Normal', 'VaR_Hist', 'VaR_CF', 'CVaR']].itertuples(index=False)) if top is not None else []
+    for i, row in enumerate(df[['Ativo', 'VaR_Normal', 'VaR_Hist', 'VaR_CF', 'CVaR', 'Kurt', 'Worst Day']].itertuples(index=False)):
+        ativo, v_n, v_h, v_cf, cvar, kurt, pior = row
+        linha = [None, (ativo, 'ativo'), (v_n, 'pct2'), (v_h, 'pct2'), (v_cf, 'pct2'),
+                 (cvar, 'cvar'), (kurt, 'kurt_alta' if kurt > 3 else 'num2'), (pior, 'pior_dia')]
+        if i < len(auxiliares):
+            linha += [None] * (col_aux - len(linha)) + [auxiliares[i][0]] + [(v, 'auxiliar') for v in auxiliares[i][1:]]
+        f.escrever(linha)
+    ultima = 6 + n
+
+    chart = BarChart(); chart.type = "col"; chart.style = 10
+    chart.y_axis.title = "% Perda Estimada"; chart.height = 14; chart.width = 30
+    if detalhado:
+        chart.title = "Escada de Risco"
+        data = Reference(ws, min_col=3, min_row=6, max_row=ultima, max_col=6)
+        cats = Reference(ws, min_col=2, min_row=7, max_row=ultima)
+    else:
+        chart.title = f"Escada de Risco (Top {len(auxiliares)} CVaR)"
+        data = Reference(ws, min_col=col_aux + 1, min_row=6, max_row=6 + len(auxiliares), max_col=col_aux + 4)
+        cats = Reference(ws, min_col=col_aux, min_row=7, max_row=6 + len(auxiliares))
+    chart.add_data(data, titles_from_data=True); chart.set_categories(cats)
+    ws.add_chart(chart, "B18" if detalhado else "J6")
+
+    # Alerta (mesma linha 45 do layout padrão, ou logo após a tabela se ela for maior)
+    row_alert = max(LINHA_ALERTA, ultima + 3)
+    f.pular_ate(row_alert)
+    ws.merged_cells.add(f"B{row_alert}:D{row_alert}")
+    f.escrever([None, f.celula("ALERTA DE RISCO (TOP 3)", 'cabecalho_alerta')])
+    for row in df.sort_values(by='Kurt', ascending=False).head(3).itertuples(index=False):
+        f.escrever([None, f.celula(row.Ativo, 'texto_borda'), f.celula(f"Kurt: {row.Kurt:.2f}", 'texto_borda'),
+                    f.celula("CRÍTICO", 'critico')])
+
+    # Glossário
+    row_gloss = row_alert + 6
+    f.pular_ate(row_gloss)
+    f.escrever([None, f.celula("GLOSSÁRIO TÉCNICO", 'subtitulo_azul')])
+    termos = [
+        ("VaR Normal", "Cenário Otimista. Subestima riscos de cauda (Gaussiano)."),
+        ("VaR Cornish-Fisher", "Cenário Realista. Ajustado para assimetria e curtose do ativo."),
+        ("CVaR (Extreme)", "Cenário de Crise. Média das perdas quando o VaR é rompido."),
+        ("Calmar Ratio", "Retorno Anual / Max Drawdown. Eficiência na dor."),
+        ("Duração DD", "Maior sequência de pregões abaixo do pico anterior. Tempo na dor.")
+    ]
+    for t, d in termos:
+        l = f.linha + 1
+        ws.merged_cells.add(f"C{l}:G{l}")
+        f.escrever([None, f.celula(t, 'termo'), f.celula(d, 'texto_borda')] + [f.celula(None, 'texto_borda') for _ in range(4)])
+
+
+def _aba_backtest(wb, df_bt, janela):
+    ws = wb.create_sheet("Backtest VaR")
+    f = _Folha(ws)
+    larguras = [12, 16, 8, 8, 10, 11, 9, 11, 17, 11]
+    for i, w in enumerate(larguras): ws.column_dimensions[get_column_letter(i+2)].width = w
+    ws.freeze_panes = "B7"
+
+    f.escrever([])
+    f.escrever([None, f.celula("BACKTEST DO VaR (FORA DA AMOSTRA)", 'titulo_azul')])
+    f.escrever([None, f"Janela: {janela} dias | Kupiec (POF), Christoffersen (independência) e Semáforo de Basileia"])
+    f.pular_ate(6)
+    cols = ['Ativo', 'Modelo', 'Nível', 'Dias', 'Exceções', 'Esperadas', 'Taxa', 'p Kupiec', 'p Christoffersen', 'Zona']
+    f.escrever([None] + [f.celula(c, 'cabecalho') for c in cols])
+    campos = [('Ativo', 'ativo'), ('Modelo', 'texto'), ('Nível', 'nivel'), ('Observações', 'inteiro'),
+              ('Exceções', 'inteiro'), ('Esperadas', 'num1'), ('Taxa', 'pct2'), ('p_Kupiec', 'num3'),
+              ('p_Christoffersen', 'num3')]
+    nomes = [c for c, _ in campos] + ['Zona']
+    for row in df_bt[nomes].itertuples(index=False):
+        f.escrever([None] + list(zip(row, (e for _, e in campos))) + [(row[-1], f"zona_{row[-1]}")])
+
+
+def _aba_cenarios(wb, df_stress):
+    ws = wb.create_sheet("Cenários Históricos")
+    f = _Folha(ws)
+    larguras = [24, 11, 11, 9, 12, 10, 10, 10]
+    for i, w in enumerate(larguras): ws.column_dimensions[get_column_letter(i+2)].width = w
+    ws.freeze_panes = "B7"
+
+    f.escrever([])
+    f.escrever([None, f.celula("CENÁRIOS HISTÓRICOS (REPLAY DE CRISES)", 'titulo_vermelho')])
+    f.escrever([None, "P&L acumulado, maior drawdown e pior dia de cada ativo dentro da janela de cada crise"])
+    f.pular_ate(6)
+    cols = ['Cenário', 'Início', 'Fim', 'Pregões', 'Ativo', 'P&L', 'Max DD', 'Pior Dia']
+    f.escrever([None] + [f.celula(c, 'cabecalho') for c in cols])
+    for row in df_stress[cols].itertuples(index=False):
+        cenario, inicio, fim, pregoes, ativo, pnl, max_dd, pior = row
+        f.escrever([None, (cenario, 'texto'), (inicio, 'data'), (fim, 'data'), (pregoes, 'inteiro'),
+                    (ativo, 'ativo_centro'), (pnl, 'pnl_pos' if pnl > 0 else 'pnl_neg'), (max_dd, 'pct1'), (pior, 'pct2')])
+
+
+def construir_excel_streaming(df, df_bt, caminho, risk_free, janela_backtest=252, df_stress=None, data_ref=None):
+    """
+    Gera o relatório com openpyxl write_only=True (memória constante por linha).
+    Mesmas abas do builder padrão: 'Monitor Geral', 'BeyondVaR Analysis' e, se houver,
+    'Backtest VaR' e 'Cenários Históricos'. data_ref: data do cabeçalho (padrão: hoje).
+    """
+    wb = Workbook(write_only=True)
+    for estilo in _estilos_nomeados():
+        wb.add_named_style(estilo)
+    if len(df) > LIMITE_GRAFICO_DETALHADO:
+        # Setores em blocos contínuos (necessário para a dispersão por setor)
+        df = df.sort_values('Setor', kind='stable', na_position='last').reset_index(drop=True)
+    ins.marco('Monitor Geral')
+    _aba_monitor(wb, df, risk_free, data_ref)
+    ins.marco('BeyondVaR Analysis')
+    _aba_beyond_var(wb, df)
+    if df_bt is not None and not df_bt.empty:
+        ins.marco('Backtest VaR')
+        _aba_backtest(wb, df_bt, janela_backtest)
+    if df_stress is not None and not df_stress.empty:
+        ins.marco('Cenários Históricos')
+        _aba_cenarios(wb, df_stress)
+    ins.marco('salvar')  # write_only: o XML de cada aba é finalizado e comprimido aqui
+    wb.save(caminho)
@@ -0,0 +1,331 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import cProfile
+import pstats
+import platform
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource  # Só em Unix; no Windows o pico de RSS fica de fora do registro
+except ImportError:
+    resource = None
+
+# ==============================================================================
+# INSTRUMENTAÇÃO DO PIPELINE (ETAPAS, CONTADORES, HISTÓRICO DE EXECUÇÕES)
+# Uma execução (execucao) agrupa etapas cronometradas (etapa), marcos dentro de
+# uma etapa (marco: fatias sequenciais, ex. uma por família de métrica ou aba do
+# Excel) e contadores (contar). Ao final, um registro JSON (durações, linhas,
+# picos de memória, hits de cache) é anexado à tabela 'historico_execucoes'
+# do mercado.db. Fora de uma execução tudo vira no-op barato, então os módulos
+# de cálculo podem ser instrumentados sem custo quando chamados avulsos.
+# Opcional (custa tempo): MEMORIA liga o tracemalloc (pico por etapa) e PERFIL
+# liga o cProfile (top funções no registro + arquivo .prof ao lado da base).
+# Uso só na thread principal (as threads do coletor não abrem etapas).
+# ==============================================================================
+
+TABELA_HISTORICO = "historico_execucoes"
+PASTA_PERFIS = "perfis"
+TOP_PERFIL = 25  # Funções (por tempo cumulativo) guardadas no registro
+
+# Ligáveis sem editar código: set LAB_RISCO_PERFIL=1 / LAB_RISCO_MEMORIA=1
+PERFIL = os.environ.get("LAB_RISCO_PERFIL") == "1"
+MEMORIA = os.environ.get("LAB_RISCO_MEMORIA") == "1"
+
+_EXECUCAO = None  # Execução ativa (uma por processo)
+
+
+def _pico_rss_mb():
+    """Pico de memória residente do processo (MB), ou None se a plataforma não informa."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 1024**2 if sys.platform == "darwin" else pico / 1024  # macOS: bytes; Linux: KB
+
+
+class _Quadro:
+    """Etapa aberta: nome completo, início, linhas e o marco corrente."""
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.t0 = time.perf_counter()
+        self.linhas = None
+        self.pico = 0
+        self.marco = None  # (nome, início)
+
+
+class Execucao:
+    """
+    Estado de uma execução: etapas agregadas por nome (chamadas repetidas somam),
+    contadores e, se ligados, tracemalloc/cProfile.
+    """
+
+    def __init__(self, pipeline, memoria=None, perfil=None):
+        self.pipeline = pipeline
+        self.memoria = MEMORIA if memoria is None else memoria
+        self.perfil = PERFIL if perfil is None else perfil
+        self.iniciado_em = datetime.now().isoformat(timespec="seconds")
+        self.t0 = time.perf_counter()
+        self.etapas = {}
+        self.contadores = {}
+        self.pilha = []
+        self._profiler = None
+        self._tracemalloc_proprio = False
+        self.pico_tracemalloc = None
+        self.erro = None  # Falha tratada pelo próprio script (que não propaga a exceção)
+
+    # --- Ciclo de vida ---
+    def iniciar(self):
+        if self.memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracemalloc_proprio = True
+        if self.perfil:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def encerrar(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._tracemalloc_proprio:
+            self.pico_tracemalloc = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    # --- Etapas ---
+    def _acumular(self, nome, segundos, linhas=None, pico=None):
+        e = self.etapas.setdefault(nome, {"segundos": 0.0, "chamadas": 0})
+        e["segundos"] += segundos
+        e["chamadas"] += 1
+        if linhas is not None:
+            e["linhas"] = e.get("linhas", 0) + int(linhas)
+        if pico is not None:
+            e["pico_mb"] = max(e.get("pico_mb", 0.0), pico / 1024**2)
+
+    def abrir(self, nome):
+        nome = f"{self.pilha[-1].nome}/{nome}" if self.pilha else nome
+        if self.memoria and tracemalloc.is_tracing():
+            # O pico da etapa de fora até aqui fica guardado antes de zerar para a de dentro
+            if self.pilha:
+                self.pilha[-1].pico = max(self.pilha[-1].pico, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        quadro = _Quadro(nome)
+        self.pilha.append(quadro)
+        return quadro
+
+    def fechar(self, quadro):
+        agora = time.perf_counter()
+        self._fechar_marco(quadro, agora)
+        pico = None
+        if self.memoria and tracemalloc.is_tracing():
+            pico = max(quadro.pico, tracemalloc.get_traced_memory()[1])
+        self.pilha.remove(quadro)
+        if pico is not None and self.pilha:
+            self.pilha[-1].pico = max(self.pilha[-1].pico, pico)
+        self._acumular(quadro.nome, agora - quadro.t0, quadro.linhas, pico)
+
+    def _fechar_marco(self, quadro, agora):
+        if quadro.marco is not None:
+            nome, t0 = quadro.marco
+            self._acumular(f"{quadro.nome}/{nome}", agora - t0)
+            quadro.marco = None
+
+    def marcar(self, nome):
+        if not self.pilha:
+            return
+        quadro = self.pilha[-1]
+        agora = time.perf_counter()
+        self._fechar_marco(quadro, agora)
+        quadro.marco = (nome, agora)
+
+    def contar(self, nome, n=1):
+        self.contadores[nome] = self.contadores.get(nome, 0) + n
+
+    # --- Registro ---
+    def _top_perfil(self):
+        estatisticas = pstats.Stats(self._profiler)
+        linhas = sorted(estatisticas.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:TOP_PERFIL]
+        return [{"funcao": f"{os.path.basename(arq)}:{linha}({func})", "chamadas": st[1],
+                 "segundos_proprios": round(st[2], 4), "segundos_cumulativos": round(st[3], 4)}
+                for (arq, linha, func), st in linhas]
+
+    def registro(self, status="ok", erro=None):
+        """Dicionário JSON-serializável com tudo o que a execução mediu."""
+        reg = {
+            "pipeline": self.pipeline,
+            "iniciado_em": self.iniciado_em,
+            "segundos": round(time.perf_counter() - self.t0, 4),
+            "status": status,
+            "erro": erro,
+            "etapas": {nome: {k: (round(v, 4) if isinstance(v, float) else v) for k, v in e.items()}
+                       for nome, e in self.etapas.items()},
+            "contadores": self.contadores,
+            "pico_rss_mb": _pico_rss_mb(),
+            "python": platform.python_version(),
+            "pid": os.getpid(),
+        }
+        if self.pico_tracemalloc is not None:
+            reg["pico_tracemalloc_mb"] = round(self.pico_tracemalloc / 1024**2, 2)
+        if self._profiler is not None:
+            reg["perfil"] = self._top_perfil()
+        return reg
+
+    def salvar_perfil(self, caminho_db):
+        """Grava o .prof completo (abrir com snakeviz / pstats) ao lado da base."""
+        pasta = os.path.join(os.path.dirname(os.path.abspath(caminho_db)), PASTA_PERFIS)
+        os.makedirs(pasta, exist_ok=True)
+        caminho = os.path.join(pasta, f"{self.pipeline}_{datetime.now():%Y%m%d_%H%M%S}.prof")
+        self._profiler.dump_stats(caminho)
+        return caminho
+
+
+# ==============================================================================
+# API DO MÓDULO (USADA PELOS SCRIPTS)
+# ==============================================================================
+
+def ativa():
+    """Execução em andamento neste processo (ou None)."""
+    return _EXECUCAO
+
+
+@contextmanager
+def etapa(nome):
+    """
+    Cronometra um bloco como etapa da execução ativa (aninhável: 'relatorio/excel').
+    O objeto devolvido aceita .linhas = n para registrar o volume processado.
+    Sem execução ativa, não mede nada.
+    """
+    ex = _EXECUCAO
+    if ex is None:
+        yield _Quadro(nome)
+        return
+    quadro = ex.abrir(nome)
+    try:
+        yield quadro
+    finally:
+        ex.fechar(quadro)
+
+
+def marco(nome):
+    """Começa uma fatia 'nome' dentro da etapa aberta; termina no próximo marco ou no fim da etapa."""
+    if _EXECUCAO is not None:
+        _EXECUCAO.marcar(nome)
+
+
+def contar(nome, n=1):
+    """Soma n ao contador 'nome' da execução ativa."""
+    if _EXECUCAO is not None:
+        _EXECUCAO.contar(nome, n)
+
+
+def falha(erro):
+    """Marca a execução ativa como 'erro' quando o script trata a exceção e segue (ex.: ETL)."""
+    if _EXECUCAO is not None and _EXECUCAO.erro is None:
+        _EXECUCAO.erro = erro if isinstance(erro, str) else f"{type(erro).__name__}: {erro}"
+
+
+@contextmanager
+def execucao(pipeline, caminho_db, memoria=None, perfil=None, exibir=True):
+    """
+    Abre uma execução; ao sair (com ou sem erro) anexa o registro ao histórico.
+    Se já houver uma execução ativa (ex.: orquestrador chamando os scripts), vira
+    apenas uma etapa dela e o registro fica a cargo de quem abriu primeiro.
+    """
+    global _EXECUCAO
+    if _EXECUCAO is not None:
+        with etapa(pipeline) as quadro:
+            yield quadro
+        return
+    ex = Execucao(pipeline, memoria, perfil)
+    _EXECUCAO = ex
+    ex.iniciar()
+    status, erro = "ok", None
+    try:
+        yield ex
+    except BaseException as e:
+        status, erro = "erro", f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        while ex.pilha:  # Etapas deixadas abertas por uma exceção
+            ex.fechar(ex.pilha[-1])
+        ex.encerrar()
+        _EXECUCAO = None
+        if ex.erro is not None and status == "ok":
+            status, erro = "erro", ex.erro
+        reg = ex.registro(status, erro)
+        if ex._profiler is not None:
+            try:
+                reg["arquivo_perfil"] = ex.salvar_perfil(caminho_db)
+            except OSError as e:
+                print(f"⚠️ Perfil não salvo: {e}")
+        gravar(caminho_db, reg)
+        if exibir:
+            print(resumo(reg))
+
+
+def gravar(caminho_db, reg):
+    """Anexa o registro à tabela 'historico_execucoes'. Falhas só avisam: telemetria não derruba o pipeline."""
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(caminho_db)), exist_ok=True)
+        conn = sqlite3.connect(caminho_db, timeout=30)
+        try:
+            with conn:
+                conn.execute(f"""CREATE TABLE IF NOT EXISTS {TABELA_HISTORICO} (
+                    iniciado_em TEXT, pipeline TEXT, segundos REAL, status TEXT, registro TEXT)""")
+                conn.execute(f"INSERT INTO {TABELA_HISTORICO} VALUES (?, ?, ?, ?, ?)",
+                             (reg["iniciado_em"], reg["pipeline"], reg["segundos"], reg["status"],
+                              json.dumps(reg, ensure_ascii=False)))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"⚠️ Histórico de execução não gravado: {e}")
+
+
+def historico(caminho_db, pipeline=None, limite=20):
+    """Últimos registros (mais recentes primeiro) como lista de dicionários."""
+    if not os.path.exists(caminho_db):
+        return []
+    conn = sqlite3.connect(caminho_db, timeout=30)
+    try:
+        sql = f"SELECT registro FROM {TABELA_HISTORICO}"
+        params = []
+        if pipeline:
+            sql += " WHERE pipeline = ?"
+            params.append(pipeline)
+        sql += " ORDER BY rowid DESC LIMIT ?"
+        params.append(limite)
+        return [json.loads(r) for (r,) in conn.execute(sql, params)]
+    except sqlite3.OperationalError:
+        return []  # Base sem a tabela (nenhuma execução registrada)
+    finally:
+        conn.close()
+
+
+def resumo(reg, max_etapas=12):
+    """Texto com a duração total e as etapas mais lentas do registro."""
+    linhas = [f"⏱️  {reg['pipeline']} ({reg['status']}): {reg['segundos']:.2f}s"
+              + (f" | pico RSS {reg['pico_rss_mb']:.0f} MB" if reg.get("pico_rss_mb") else "")]
+    etapas = sorted(reg["etapas"].items(), key=lambda kv: kv[1]["segundos"], reverse=True)
+    for nome, e in etapas[:max_etapas]:
+        extra = f" | {e['linhas']:,} linhas" if "linhas" in e else ""
+        extra += f" | pico {e['pico_mb']:.1f} MB" if "pico_mb" in e else ""
+        extra += f" | {e['chamadas']}x" if e["chamadas"] > 1 else ""
+        linhas.append(f"   {nome:<40} {e['segundos']:>8.3f}s{extra}")
+    if reg["contadores"]:
+        linhas.append("   " + " | ".join(f"{k}: {v:,}" for k, v in reg["contadores"].items()))
+    return "\n".join(linhas)
+
+
+if __name__ == "__main__":
+    # Uso: python instrumentacao.py [n_execucoes] [pipeline]
+    DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+    CAMINHO_DB = os.path.join(os.path.dirname(os.path.dirname(DIRETORIO_ATUAL)), "dados", "mercado.db")
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    regs = historico(CAMINHO_DB, sys.argv[2] if len(sys.argv) > 2 else None, n)
+    if not regs:
+        print("Nenhuma execução registrada.")
+    for reg in regs:
+        print(f"\n[{reg['iniciado_em']}]")
+        print(resumo(reg))
@@ -0,0 +1,73 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+import motor_metricas as mm
+
+# ==============================================================================
+# EXECUÇÃO PARALELA (SHARDS DE COLUNAS + MEMÓRIA COMPARTILHADA)
+# Para universos de 10k+ séries: a matriz de retornos vai uma única vez para
+# 'multiprocessing.shared_memory'; cada processo lê o seu bloco de colunas direto
+# da memória compartilhada (sem pickle dos dados) e roda o motor vetorizado.
+# ==============================================================================
+
+TAMANHO_SHARD = 512  # Colunas por tarefa
+
+_matriz = None  # View da memória compartilhada dentro de cada processo filho
+_shm = None
+
+
+def _anexar(nome, forma):
+    """Initializer dos processos: anexa o bloco compartilhado uma vez por processo."""
+    global _matriz, _shm
+    # Quem cria e libera o bloco é o processo pai (filhos do pool usam o mesmo resource tracker)
+    if sys.version_info >= (3, 13):
+        _shm = shared_memory.SharedMemory(name=nome, track=False)
+    else:
+        _shm = shared_memory.SharedMemory(name=nome)
+    _matriz = np.ndarray(forma, dtype=np.float64, buffer=_shm.buf, order="F")
+
+
+def _calcular_shard(inicio, fim, riskfree_rate, periods_per_year, level):
+    """Tarefa: métricas das colunas [inicio, fim). A última coluna da matriz é o benchmark."""
+    bench = _matriz[:, -1]
+    tabela = mm.tabela_metricas(_matriz[:, inicio:fim], bench, riskfree_rate, periods_per_year, level)
+    return inicio, tabela.to_numpy()
+
+
+def tabela_metricas_paralela(retornos, bench_ret=None, riskfree_rate=0.0, periods_per_year=252, level=5,
+                             n_processos=None, tamanho_shard=TAMANHO_SHARD):
+    """
+    Mesmo resultado de motor_metricas.tabela_metricas, calculado em paralelo.
+    - n_processos: número de processos (padrão: os.cpu_count()).
+    - tamanho_shard: colunas por tarefa.
+    """
+    matriz, nomes = mm._como_matriz(retornos)
+    T, N = matriz.shape
+    bench = np.zeros(T) if bench_ret is None else np.asarray(bench_ret, dtype=np.float64).reshape(-1)
+    n_processos = n_processos or os.cpu_count() or 1
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, T * (N + 1) * 8))
+    try:
+        compartilhada = np.ndarray((T, N + 1), dtype=np.float64, buffer=shm.buf, order="F")
+        compartilhada[:, :N] = matriz
+        compartilhada[:, N] = bench
+
+        resultado = np.empty((N, len(mm.COLUNAS_METRICAS)))
+        shards = [(i, min(i + tamanho_shard, N)) for i in range(0, N, tamanho_shard)]
+        with ProcessPoolExecutor(max_workers=n_processos, initializer=_anexar,
+                                 initargs=(shm.name, (T, N + 1))) as pool:
+            futuros = [pool.submit(_calcular_shard, i, f, riskfree_rate, periods_per_year, level)
+                       for i, f in shards]
+            for futuro in futuros:
+                inicio, valores = futuro.result()
+                resultado[inicio:inicio + len(valores)] = valores
+        del compartilhada
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return pd.DataFrame(resultado, index=pd.Index(nomes, name='Ativo'), columns=mm.COLUNAS_METRICAS)
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+
+import dados_mercado as dm
+import instrumentacao as ins
+
+# ==============================================================================
+# MOTOR VETORIZADO DE MÉTRICAS (CROSS-SECTIONAL)
+# Calcula a tabela de risco de TODOS os ativos de uma vez, em poucas passadas
+# NumPy sobre a matriz de retornos (linhas = dias, colunas = ativos).
+# Reproduz os mesmos números das funções de 'dados_mercado' chamadas ativo a ativo.
+# ==============================================================================
+
+COLUNAS_METRICAS = [
+    'Retorno', 'Retorno Anual', 'Volatilidade', 'Sharpe', 'Sortino', 'Beta', 'Max DD', 'Duração DD',
+    'VaR_Normal', 'VaR_Hist', 'VaR_CF', 'CVaR', 'Worst Day', 'Skew', 'Kurt', 'Calmar'
+]
+
+
+def _como_matriz(retornos):
+    """Converte DataFrame/ndarray em (matriz float64 2-D, lista de nomes das colunas)."""
+    if isinstance(retornos, pd.DataFrame):
+        return retornos.to_numpy(dtype=np.float64), list(retornos.columns)
+    if isinstance(retornos, pd.Series):
+        return retornos.to_numpy(dtype=np.float64)[:, None], [retornos.name]
+    matriz = np.asarray(retornos, dtype=np.float64)
+    if matriz.ndim == 1:
+        matriz = matriz[:, None]
+    if matriz.ndim != 2:
+        raise TypeError("Expected r to be a 2-D array, Series or DataFrame")
+    return matriz, list(range(matriz.shape[1]))
+
+
+def _momentos(r):
+    """Média, desvio amostral (ddof=1), desvio populacional (ddof=0), skew e curtose por coluna."""
+    n = r.shape[0]
+    media = r.mean(axis=0)
+    demeaned = r - media
+    d2 = demeaned * demeaned
+    m2 = d2.mean(axis=0)
+    m3 = (d2 * demeaned).mean(axis=0)
+    m4 = (d2 * d2).mean(axis=0)
+    sigma0 = np.sqrt(m2)
+    sigma1 = np.sqrt(m2 * n / (n - 1)) if n > 1 else np.full_like(m2, np.nan)
+    return media, sigma1, sigma0, m3 / sigma0**3, m4 / sigma0**4
+
+
+# ==============================================================================
+# DRAWDOWN (MATRIZ INTEIRA, SEM SÉRIE POR ATIVO)
+# Mesma conta de dm.drawdown (riqueza, pico anterior, queda relativa), mas só a
+# curva de drawdown (dias x ativos) existe como matriz; riqueza e picos são
+# descartados logo depois. Datas e durações saem de índices de linha:
+#   - último pico até cada dia = acumulado máximo do índice dos dias sem queda;
+#   - dias sob a água = índice do dia - índice do último pico.
+# ==============================================================================
+
+COLUNAS_DRAWDOWN = ['Max DD', 'DD Médio', 'Ulcer', 'Duração DD', 'Dias p/ Recuperação',
+                    'Pico', 'Vale', 'Recuperação']
+
+
+def drawdown_matriz(r, completo=True, curva=False):
+    """
+    Estatísticas de drawdown de cada coluna de r (ndarray dias x ativos, sem NaN).
+    Retorna um dict de arrays (um valor por coluna):
+    - max_dd: maior queda (negativa) e duracao_max: maior sequência de dias abaixo do pico.
+    - completo=True: pico / vale / recuperacao (índices de linha do Max DD; -1 = sem
+      drawdown ou ainda não recuperado), dd_medio (média da curva) e ulcer (raiz da média dos quadrados).
+    - curva=True: 'curva' = a matriz de drawdown inteira (underwater), senão ela é descartada.
+    """
+    T, N = r.shape
+    riqueza = 1000 * np.cumprod(1 + r, axis=0)
+    picos = np.maximum.accumulate(riqueza, axis=0)
+    dd = riqueza - picos
+    del riqueza
+    dd /= picos  # Mesmos bits de (riqueza - picos) / picos, sem uma terceira matriz
+    del picos
+
+    linhas = np.arange(T, dtype=np.int32)[:, None]  # int32: metade da banda de memória das matrizes de índice
+    colunas = np.arange(N)
+    vale = dd.argmin(axis=0)
+    max_dd = dd[vale, colunas]
+    sob = dd < 0
+    ultimo_pico = np.maximum.accumulate(np.where(sob, -1, linhas), axis=0)
+    pico = ultimo_pico[vale, colunas]
+    np.subtract(linhas, ultimo_pico, out=ultimo_pico)  # Agora: dias sob a água em cada dia
+    saida = {'max_dd': max_dd, 'duracao_max': ultimo_pico.max(axis=0)}
+    del ultimo_pico
+
+    if completo:
+        houve = max_dd < 0
+        depois = ~sob & (linhas > vale)  # Volta ao pico depois do vale
+        recuperou = houve & depois.any(axis=0)
+        saida.update(
+            pico=np.where(houve, pico, -1),
+            vale=np.where(houve, vale, -1),
+            recuperacao=np.where(recuperou, depois.argmax(axis=0), -1),
+            dd_medio=dd.mean(axis=0),
+            ulcer=np.sqrt(np.einsum('ij,ij->j', dd, dd) / T),
+        )
+    if curva:
+        saida['curva'] = dd
+    return saida
+
+
+def max_drawdown(r):
+    """Máximo Drawdown de cada coluna (mesma conta de dm.drawdown(...)['Drawdown'].min())."""
+    riqueza = 1000 * np.cumprod(1 + r, axis=0)
+    picos = np.maximum.accumulate(riqueza, axis=0)
+    riqueza -= picos
+    riqueza /= picos
+    return riqueza.min(axis=0)
+
+
+def tabela_drawdown(retornos, curva=False):
+    """
+    Tabela de drawdown (um ativo por linha, colunas COLUNAS_DRAWDOWN):
+    Max DD, DD Médio, Ulcer, Duração DD (maior sequência de períodos abaixo do pico),
+    Dias p/ Recuperação (do vale do Max DD até voltar ao pico; NaN se não voltou)
+    e as datas Pico / Vale / Recuperação do Max DD (NaT quando não se aplica).
+    - curva=True: retorna (tabela, curva underwater dias x ativos).
+    """
+    r, nomes = _como_matriz(retornos)
+    datas = retornos.index if isinstance(retornos, (pd.DataFrame, pd.Series)) else pd.RangeIndex(r.shape[0])
+    res = drawdown_matriz(r, completo=True, curva=curva)
+
+    def _data(idx):
+        return pd.Series(datas.take(np.maximum(idx, 0))).where(idx >= 0).to_numpy()
+
+    recuperou = res['recuperacao'] >= 0
+    tabela = pd.DataFrame({
+        'Max DD': res['max_dd'], 'DD Médio': res['dd_medio'], 'Ulcer': res['ulcer'],
+        'Duração DD': res['duracao_max'],
+        'Dias p/ Recuperação': np.where(recuperou, res['recuperacao'] - res['vale'], np.nan),
+        'Pico': _data(res['pico']), 'Vale': _data(res['vale']), 'Recuperação': _data(res['recuperacao']),
+    }, index=pd.Index(nomes, name='Ativo'))
+    if curva:
+        return tabela, pd.DataFrame(res['curva'], index=datas, columns=nomes)
+    return tabela
+
+
+def tabela_metricas(retornos, bench_ret=None, riskfree_rate=0.0, periods_per_year=252, level=5):
+    """
+    Retorna a tabela completa de métricas (um ativo por linha) para a matriz de retornos.
+
+    Parâmetros:
+    - retornos: DataFrame (dias x ativos) ou ndarray 2-D, já sem NaN.
+    - bench_ret: retornos do benchmark (Series/array com o mesmo número de linhas).
+      Se None, o Beta segue a convenção do relatório (benchmark zerado -> NaN).
+    - level: nível percentual dos VaRs e do CVaR (5 = 95% de confiança).
+    """
+    r, nomes = _como_matriz(retornos)
+    n = r.shape[0]
+    raiz_ano = np.sqrt(periods_per_year)
+
+    # Retorno (uma única passada de produtório)
+    ins.marco('retorno')
+    crescimento = np.prod(1 + r, axis=0)
+    ret_total = crescimento - 1
+    ann_ret = crescimento**(periods_per_year / n) - 1
+
+    # Momentos (média, desvios, skew, curtose)
+    ins.marco('momentos')
+    media, sigma1, sigma0, skew, kurt = _momentos(r)
+    vol = sigma1 * raiz_ano
+    sharpe = (ann_ret - riskfree_rate) / vol
+
+    # Sortino: desvio populacional só dos dias negativos
+    ins.marco('sortino')
+    negativos = r < 0
+    n_neg = negativos.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media_neg = np.where(negativos, r, 0.0).sum(axis=0) / n_neg
+        desvio_neg = np.where(negativos, r - media_neg, 0.0)
+        downside_dev = np.sqrt((desvio_neg**2).sum(axis=0) / n_neg) * raiz_ano
+        sortino = np.where(downside_dev != 0, (ann_ret - riskfree_rate) / downside_dev, 0.0)
+
+    # Beta: cov(r, bench) / var(bench), sem montar uma matriz 2x2 por ativo
+    ins.marco('beta')
+    b = np.zeros(n) if bench_ret is None else np.asarray(bench_ret, dtype=np.float64).reshape(-1)
+    b_dm = b - b.mean()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        beta = (b_dm @ (r - media)) / (b_dm @ b_dm)
+
+    ins.marco('drawdown')
+    dd = drawdown_matriz(r, completo=False)
+    max_dd = dd['max_dd']
+
+    # VaRs (Normal, Histórico e Cornish-Fisher) e CVaR
+    ins.marco('var_cvar')
+    z = dm.norm_ppf(level / 100)
+    z_cf = (z +
+            (z**2 - 1) * skew / 6 +
+            (z**3 - 3 * z) * (kurt - 3) / 24 -
+            (2 * z**3 - 5 * z) * (skew**2) / 36)
+    var_normal = -(media + z * sigma0)
+    var_cf = -(media + z_cf * sigma0)
+    var_hist, cvar = (v[0] for v in dm.tail_historic(r, [level]))  # Uma ordenação parcial por coluna
+
+    ins.marco('tabela')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        calmar = np.where(max_dd != 0, ann_ret / np.abs(max_dd), 0.0)
+
+    return pd.DataFrame({
+        'Retorno': ret_total, 'Retorno Anual': ann_ret, 'Volatilidade': vol,
+        'Sharpe': sharpe, 'Sortino': sortino, 'Beta': beta, 'Max DD': max_dd,
+        'Duração DD': dd['duracao_max'].astype(np.float64),
+        'VaR_Normal': var_normal, 'VaR_Hist': var_hist, 'VaR_CF': var_cf,
+        'CVaR': cvar, 'Worst Day': r.min(axis=0), 'Skew': skew, 'Kurt': kurt, 'Calmar': calmar
+    }, index=pd.Index(nomes, name='Ativo'))
@@ -0,0 +1,348 @@
+import os
+import sys
+import json
+import hashlib
+import sqlite3
+import argparse
+import time
+from datetime import datetime
+
+import base_precos as bp
+import instrumentacao as ins
+import etl_sql
+import relatorio_excel as rel
+import relatorios_carteiras as rcar
+import backtest_var as bt
+import cenarios_stress as cs
+import dados_mercado as dm
+import enviar_email
+import distribuicao as dist
+
+# ==============================================================================
+# PIPELINE (ETL -> MÉTRICAS -> EXCEL -> E-MAIL NUM SÓ PROCESSO)
+# Substitui as três chamadas de 'python' do EXECUTAR_SISTEMA.bat: as bibliotecas
+# são importadas uma vez e os resultados passam em memória de uma etapa para a
+# outra (o ETL publica o snapshot colunar e a leitura dos retornos é um memmap;
+# o e-mail recebe o caminho do Excel que acabou de ser gerado, sem glob).
+# Com config/carteiras.json, a etapa 'carteiras' gera também um relatório por
+# carteira (relatorios_carteiras) e o e-mail anexa a de cada destinatário.
+#
+# As etapas formam um DAG pequeno. Cada uma tem uma impressão digital das suas
+# entradas (parâmetros + impressões das dependências); se a impressão for igual
+# à da última execução bem-sucedida (tabela 'pipeline_estado' do mercado.db), a
+# etapa é pulada. Etapas intermediárias puladas só são calculadas se alguma
+# etapa posterior precisar do valor delas.
+# Uso:
+#   python pipeline.py                        # tudo (pula o que não mudou)
+#   python pipeline.py --etapas excel email   # só essas (dependências sob demanda)
+#   python pipeline.py --pular email --forcar # tudo menos o e-mail, ignorando as impressões
+#   python pipeline.py --listar               # DAG e estado da última execução
+# ==============================================================================
+
+CAMINHO_DB = etl_sql.CAMINHO_DB
+TABELA_ESTADO = "pipeline_estado"
+
+ETAPAS = {}  # Ordem de registro = ordem topológica
+
+
+class EtapaFalhou(Exception):
+    """Valor pedido de uma etapa que falhou nesta execução."""
+
+
+def etapa(nome, depende=(), apos=(), impressao=None, valida=None, persistir=False):
+    """
+    Registra uma etapa do pipeline. A função recebe (ctx, *valores das dependências).
+    - depende: etapas cujo valor é usado (calculadas sob demanda se não foram executadas).
+    - apos: só ordem (ex.: 'retornos' depois do 'etl'; o efeito do ETL entra pela geração da base).
+    - impressao(ctx) -> lista JSON-serializável com as entradas próprias da etapa,
+      ou None se ela deve rodar sempre (ex.: o ETL, que consulta o provedor).
+    - valida(ctx, resultado) -> False se o artefato da última execução sumiu.
+    - persistir: o resultado (JSON) é guardado e reaproveitado quando a etapa é pulada.
+    """
+    def registrar(func):
+        faltando = [d for d in (*depende, *apos) if d not in ETAPAS]
+        if faltando:
+            raise ValueError(f"Etapa '{nome}' depende de etapas não registradas: {faltando}")
+        ETAPAS[nome] = dict(executar=func, depende=tuple(depende), apos=tuple(apos), impressao=impressao,
+                            valida=valida, persistir=persistir)
+        return func
+    return registrar
+
+
+# ==============================================================================
+# ESTADO (ÚLTIMA EXECUÇÃO BEM-SUCEDIDA DE CADA ETAPA)
+# ==============================================================================
+
+def _conectar_estado(caminho_db):
+    os.makedirs(os.path.dirname(os.path.abspath(caminho_db)), exist_ok=True)
+    conn = sqlite3.connect(caminho_db, timeout=30)
+    conn.execute(f"""CREATE TABLE IF NOT EXISTS {TABELA_ESTADO} (
+        etapa TEXT PRIMARY KEY, impressao TEXT, resultado TEXT, segundos REAL, concluido_em TEXT)""")
+    return conn
+
+
+def ler_estado(caminho_db):
+    """{etapa: {'impressao', 'resultado', 'segundos', 'concluido_em'}}"""
+    conn = _conectar_estado(caminho_db)
+    try:
+        return {e: {'impressao': imp, 'resultado': json.loads(res) if res else None,
+                    'segundos': seg, 'concluido_em': quando}
+                for e, imp, res, seg, quando in conn.execute(f"SELECT * FROM {TABELA_ESTADO}")}
+    finally:
+        conn.close()
+
+
+def _gravar_estado(caminho_db, nome, impressao, resultado, segundos):
+    conn = _conectar_estado(caminho_db)
+    try:
+        with conn:
+            conn.execute(f"INSERT OR REPLACE INTO {TABELA_ESTADO} VALUES (?, ?, ?, ?, ?)",
+                         (nome, impressao, json.dumps(resultado, default=str), segundos,
+                          datetime.now().isoformat(timespec="seconds")))
+    finally:
+        conn.close()
+
+
+# ==============================================================================
+# EXECUÇÃO
+# ==============================================================================
+
+class Contexto:
+    """Valores e impressões calculados nesta execução (memoizados por etapa)."""
+
+    def __init__(self, caminho_db=None, modo_excel=None, forcar=()):
+        self.caminho_db = caminho_db or CAMINHO_DB
+        self.modo_excel = modo_excel or rel.MODO_EXCEL
+        self.caminho_excel = rel.CAMINHO_FINAL
+        self.forcar = set(forcar)
+        self.estado = ler_estado(self.caminho_db)
+        self.valores = {}
+        self.impressoes = {}
+        self.puladas = set()
+        self.falhas = {}
+
+    def impressao(self, nome):
+        """Hash das entradas próprias + impressões das dependências (None = sempre executar)."""
+        if nome not in self.impressoes:
+            info = ETAPAS[nome]
+            proprias = info['impressao'](self) if info['impressao'] else None
+            if proprias is None:
+                self.impressoes[nome] = None
+            else:
+                deps = [self.impressao(d) for d in info['depende']]
+                conteudo = json.dumps([nome, proprias, [d for d in deps if d is not None]], default=str)
+                self.impressoes[nome] = hashlib.sha256(conteudo.encode()).hexdigest()[:16]
+        return self.impressoes[nome]
+
+    def inalterada(self, nome):
+        """True se a etapa pode ser pulada: mesma impressão da última execução e artefato válido."""
+        if nome in self.forcar:
+            return False
+        imp = self.impressao(nome)
+        salvo = self.estado.get(nome)
+        if imp is None or salvo is None or salvo['impressao'] != imp:
+            return False
+        valida = ETAPAS[nome]['valida']
+        return valida is None or bool(valida(self, salvo['resultado']))
+
+    def valor(self, nome, sob_demanda=True):
+        """
+        Resultado da etapa. Dependência pulada (ou não selecionada) com resultado guardado
+        e entradas inalteradas reaproveita o resultado; senão é calculada agora (sob demanda).
+        """
+        if nome in self.valores:
+            return self.valores[nome]
+        if nome in self.falhas:
+            raise EtapaFalhou(nome)
+        info = ETAPAS[nome]
+        if info['persistir'] and (nome in self.puladas or (sob_demanda and self.inalterada(nome))):
+            self.valores[nome] = self.estado[nome]['resultado']
+            return self.valores[nome]
+        if sob_demanda:
+            print(f"   ↪️  {nome}: calculada sob demanda")
+        args = [self.valor(d) for d in info['depende']]
+        t0 = time.perf_counter()
+        try:
+            with ins.etapa(nome):
+                resultado = info['executar'](self, *args)
+        except (Exception, SystemExit) as e:
+            self.falhas[nome] = f"{type(e).__name__}: {e}"
+            raise
+        self.valores[nome] = resultado
+        imp = self.impressao(nome)
+        if imp is not None:
+            _gravar_estado(self.caminho_db, nome, imp, resultado if info['persistir'] else None,
+                           round(time.perf_counter() - t0, 3))
+        return resultado
+
+
+def executar(etapas=None, pular=(), forcar=False, caminho_db=None, modo_excel=None):
+    """
+    Roda as etapas selecionadas (padrão: todas) em ordem topológica.
+    - forcar: True ignora as impressões das etapas selecionadas (ou uma lista de nomes).
+    Retorna o Contexto (valores, puladas, falhas).
+    """
+    selecionadas = [n for n in ETAPAS if (etapas is None or n in etapas) and n not in pular]
+    forcadas = selecionadas if forcar is True else (forcar or ())
+    ctx = Contexto(caminho_db, modo_excel, forcadas)
+    for nome in selecionadas:
+        bloqueio = [d for d in ETAPAS[nome]['depende'] if d in ctx.falhas]
+        if bloqueio:
+            print(f"⏭️  {nome}: não executada (depende de {', '.join(bloqueio)}, que falhou)")
+            ctx.falhas[nome] = f"dependência falhou: {bloqueio}"
+            continue
+        if ctx.inalterada(nome):
+            salvo = ctx.estado[nome]
+            print(f"⏭️  {nome}: entradas inalteradas desde {salvo['concluido_em']} (pulada)")
+            ctx.puladas.add(nome)
+            ins.contar('etapas_puladas')
+            continue
+        print(f"\n▶️  Etapa: {nome}")
+        try:
+            ctx.valor(nome, sob_demanda=False)
+            ins.contar('etapas_executadas')
+        except EtapaFalhou as e:
+            print(f"⏭️  {nome}: não executada (depende de {e}, que falhou)")
+            ctx.falhas[nome] = f"dependência falhou: {e}"
+        except (Exception, SystemExit) as e:  # SystemExit: scripts que encerram o processo (ex.: sem Outlook)
+            print(f"❌ Etapa {nome} falhou: {type(e).__name__}: {e}")
+            ctx.falhas.setdefault(nome, f"{type(e).__name__}: {e}")
+            ins.falha(f"{nome}: {type(e).__name__}: {e}")
+    return ctx
+
+
+# ==============================================================================
+# ETAPAS
+# ==============================================================================
+
+def _geracao_base(ctx):
+    if not os.path.exists(ctx.caminho_db):
+        return 0
+    conn = bp.conectar(ctx.caminho_db, migrar=False)
+    try:
+        return bp.geracao(conn)
+    finally:
+        conn.close()
+
+
+@etapa('etl')
+def _(ctx):
+    gravados = etl_sql.atualizar_banco(caminho_db=ctx.caminho_db)
+    if gravados is None:
+        # Mesmo comportamento do .bat: segue com a base que já existe
+        print("⚠️ ETL falhou; as próximas etapas usam a base atual.")
+    return gravados
+
+
+@etapa('retornos', apos=('etl',),
+       impressao=lambda ctx: [_geracao_base(ctx), sorted(rel.MAPA_SETORES)])
+def _(ctx):
+    retornos = rel.carregar_retornos(ctx.caminho_db)
+    if retornos.empty:
+        raise RuntimeError(f"Sem retornos na base {ctx.caminho_db}")
+    return retornos
+
+
+@etapa('metricas', depende=('retornos',),
+       impressao=lambda ctx: [rel.RISK_FREE, rel.COLUNAS_RELATORIO, rel.MAPA_SETORES, dm.__version__])
+def _(ctx, retornos):
+    df = rel.calcular_metricas_sql(retornos)
+    if df.empty:
+        raise RuntimeError("Tabela de métricas vazia")
+    return df
+
+
+@etapa('backtest', depende=('retornos',), impressao=lambda ctx: [bt.JANELA, dm.__version__])
+def _(ctx, retornos):
+    return rel.calcular_backtest(retornos)
+
+
+@etapa('stress', depende=('retornos',), impressao=lambda ctx: [cs.CENARIOS])
+def _(ctx, retornos):
+    return rel.calcular_stress(retornos)
+
+
+@etapa('excel', depende=('metricas', 'backtest', 'stress'), persistir=True,
+       impressao=lambda ctx: [ctx.caminho_excel, ctx.modo_excel],
+       valida=lambda ctx, caminho: bool(caminho) and os.path.exists(caminho))
+def _(ctx, df, df_bt, df_stress):
+    return rel.escrever_excel(df, df_bt, ctx.caminho_excel, ctx.modo_excel, df_stress)
+
+
+def _config_carteiras(ctx):
+    return rcar.carregar_config() if os.path.exists(rcar.CAMINHO_CONFIG) else []
+
+
+@etapa('carteiras', apos=('etl',), persistir=True,
+       impressao=lambda ctx: [_geracao_base(ctx), _config_carteiras(ctx), rel.RISK_FREE, bt.JANELA,
+                              cs.CENARIOS, dm.__version__],
+       valida=lambda ctx, caminhos: all(os.path.exists(c) for c in (caminhos or {}).values()))
+def _(ctx):
+    carteiras = _config_carteiras(ctx)
+    if not carteiras:
+        return {}  # Sem configuração: só o relatório geral
+    return rcar.gerar_relatorios(carteiras, ctx.caminho_db)
+
+
+def _impressao_email(ctx):
+    """
+    Configuração de distribuição (hash do JSON) + destinatários ainda pendentes na 'status_envio'.
+    Destinatário novo ou endereço corrigido dispara a etapa mesmo com os relatórios iguais;
+    o distribuir pula quem já recebeu o mesmo conteúdo, então reexecutar é barato.
+    """
+    caminho = dist.CAMINHO_CONFIG
+    if not os.path.exists(caminho):
+        return [None, []]
+    with open(caminho, 'rb') as f:
+        hash_config = hashlib.sha256(f.read()).hexdigest()
+    config = dist.carregar_config(caminho)
+    emails = [d['email'] for d in config.get('destinatarios', [])]
+    return [hash_config, dist.pendentes(enviar_email.CAMINHO_DB, emails)]
+
+
+@etapa('email', depende=('excel', 'carteiras'), impressao=_impressao_email)
+def _(ctx, caminho, anexos):
+    # Impressão = a dos relatórios + distribuição: o mesmo conteúdo não é reenviado; um envio que falhou volta na próxima
+    if not enviar_email.main(caminho, anexos=anexos or None):
+        raise RuntimeError("relatório não enviado")
+    return caminho
+
+
+# ==============================================================================
+# CLI
+# ==============================================================================
+
+def listar(caminho_db=None):
+    estado = ler_estado(caminho_db or CAMINHO_DB)
+    print(f"{'Etapa':<10} {'Depende de':<26} {'Última conclusão':<20} {'Segundos':>9}  Impressão")
+    for nome, info in ETAPAS.items():
+        salvo = estado.get(nome, {})
+        seg = salvo.get('segundos')
+        print(f"{nome:<10} {', '.join(info['depende'] + info['apos']) or '-':<26} {salvo.get('concluido_em') or '-':<20} "
+              f"{(f'{seg:.2f}' if seg is not None else '-'):>9}  {salvo.get('impressao') or '-'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline do Lab Risco Quant (ETL -> métricas -> Excel -> e-mail)")
+    parser.add_argument("--etapas", nargs="+", choices=list(ETAPAS), help="executa só estas etapas")
+    parser.add_argument("--pular", nargs="+", choices=list(ETAPAS), default=(), help="etapas a não executar")
+    parser.add_argument("--forcar", action="store_true", help="executa mesmo com as entradas inalteradas")
+    parser.add_argument("--modo-excel", choices=['auto', 'padrao', 'streaming'])
+    parser.add_argument("--db", default=CAMINHO_DB, help="caminho do mercado.db")
+    parser.add_argument("--listar", action="store_true", help="mostra as etapas e o estado salvo")
+    args = parser.parse_args(argv)
+
+    if args.listar:
+        listar(args.db)
+        return 0
+    with ins.execucao('pipeline', args.db):
+        ctx = executar(args.etapas, args.pular, args.forcar, args.db, args.modo_excel)
+    if ctx.falhas:
+        print(f"\n❌ Etapas com falha: {', '.join(ctx.falhas)}")
+        return 1
+    print("\n✅ CICLO COMPLETO FINALIZADO!")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
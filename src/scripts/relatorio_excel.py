@@ -1,11 +1,4 @@
 import pandas as pd
-import numpy as np
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.chart import ScatterChart, BarChart, Series, Reference
-from openpyxl.formatting.rule import DataBarRule
-from openpyxl.utils import get_column_letter
-import sqlite3
 import os
 import sys
 from datetime import datetime
@@ -15,6 +8,14 @@ from datetime import datetime
 # ==============================================================================
 try:
     import dados_mercado as dm
+    import motor_metricas as mm
+    import base_precos as bp
+    import snapshot_precos as sp
+    import cache_metricas as cm
+    import metricas_paralelas as mp
+    import backtest_var as bt
+    import cenarios_stress as cs
+    import instrumentacao as ins
     print("✅ Biblioteca 'dados_mercado' carregada com sucesso!")
 except ImportError:
     print("❌ ERRO CRÍTICO: 'dados_mercado.py' não encontrado na pasta.")
@@ -35,70 +36,107 @@ CAMINHO_FINAL = os.path.join(PASTA_SAIDA, NOME_ARQUIVO)
 
 MAPA_SETORES = {'^BVSP': 'Benchmark', 'VALE3.SA': 'Commodity', 'PETR4.SA': 'Commodity', 'ITUB4.SA': 'Financeiro', 'BPAC11.SA': 'Financeiro', 'MGLU3.SA': 'Varejo', 'LREN3.SA': 'Varejo', 'WEGE3.SA': 'Defensiva', 'TAEE11.SA': 'Defensiva'}
 RISK_FREE = 0.1075
+# Universos grandes: shards de colunas em processos (memória compartilhada)
+MIN_ATIVOS_PARALELO = 5000
+N_PROCESSOS = None        # None = todos os núcleos
+TAMANHO_SHARD = 512
+# Excel: 'auto' usa o builder streaming (write_only) acima de LIMITE_STREAMING ativos
+MODO_EXCEL = 'auto'
+LIMITE_STREAMING = 200
+USAR_CACHE = True  # Reaproveita métricas de ativos cujos preços não mudaram desde a última execução
+COLUNAS_RELATORIO = ['Ativo', 'Setor', 'Retorno', 'Volatilidade', 'Sharpe', 'Sortino', 'Beta', 'Max DD',
+                     'Duração DD', 'VaR_Normal', 'VaR_Hist', 'VaR_CF', 'CVaR', 'Worst Day', 'Kurt', 'Calmar']
 
 if not os.path.exists(PASTA_SAIDA): os.makedirs(PASTA_SAIDA)
 
 # ==============================================================================
 # 3. MOTOR DE CÁLCULO
 # ==============================================================================
-def calcular_metricas_sql():
-    if not os.path.exists(CAMINHO_DB): return pd.DataFrame()
-    conn = sqlite3.connect(CAMINHO_DB)
+def carregar_retornos(caminho_db=None, tickers=None):
+    """Lê os preços dos tickers do relatório (ou dos 'tickers' pedidos) na base e devolve a matriz de retornos diários."""
+    caminho_db = caminho_db or CAMINHO_DB
+    if not os.path.exists(caminho_db): return pd.DataFrame()
+    # Snapshot colunar mapeado em memória (publicado pelo ETL); cai para o SQLite se estiver velho
+    with ins.etapa('leitura_db') as e:
+        precos = sp.ler_precos(caminho_db)
+        e.linhas = precos.size
+    return retornos_de(precos, tickers or MAPA_SETORES)
+
+def retornos_de(precos, tickers):
+    """Retornos diários só dos 'tickers' (os ausentes da base são ignorados), já alinhados (Date x Ticker)."""
+    tickers = [t for t in tickers if t in precos.columns]
+    return precos[tickers].dropna(how='all').pct_change().dropna()
+
+def calcular_metricas_sql(retornos=None, mapa_setores=None):
+    """Tabela do relatório (COLUNAS_RELATORIO) para os ativos de 'mapa_setores' (padrão: MAPA_SETORES)."""
+    mapa_setores = mapa_setores or MAPA_SETORES
     try:
-        df_precos = pd.read_sql("SELECT * FROM cotacoes", conn, index_col='Date')
-        df_precos.index = pd.to_datetime(df_precos.index)
-        retornos = df_precos.pct_change().dropna()
+        if retornos is None: retornos = carregar_retornos()
+        if retornos.empty: return pd.DataFrame()
         bench_ret = retornos['^BVSP'] if '^BVSP' in retornos.columns else pd.Series(0, index=retornos.index)
 
-        lista = []
-        for ticker in retornos.columns:
-            if ticker not in MAPA_SETORES: continue
-            r = retornos[ticker]
-            
-            # Cálculos
-            ret_total = dm.total_return(r)
-            vol = dm.annualize_vol(r, 252)
-            sharpe = dm.sharpe_ratio(r, RISK_FREE, 252)
-            dd_df = dm.drawdown(r)
-            max_dd = dd_df["Drawdown"].min()
-            
-            downside_r = r[r < 0]
-            downside_dev = downside_r.std(ddof=0) * np.sqrt(252)
-            ann_ret = dm.annualize_rets(r, 252)
-            sortino = (ann_ret - RISK_FREE) / downside_dev if downside_dev != 0 else 0
-            
-            matrix = np.cov(r, bench_ret)
-            beta = matrix[0,1] / matrix[1,1]
-
-            skew = dm.skewness(r)
-            kurt = dm.kurtosis(r)
-            var_95_normal = dm.var_gaussian(r, level=5, modified=False)
-            var_95_hist = dm.var_historic(r, level=5)
-            var_95_cf = dm.var_gaussian(r, level=5, modified=True)
-            cvar_95 = dm.cvar_historic(r, level=5)
-            worst_day = r.min()
-            calmar = ann_ret / abs(max_dd) if max_dd != 0 else 0
-
-            lista.append({
-                'Ativo': ticker, 'Setor': MAPA_SETORES.get(ticker),
-                'Retorno': ret_total, 'Volatilidade': vol,
-                'Sharpe': sharpe, 'Sortino': sortino, 'Beta': beta, 'Max DD': max_dd,
-                'VaR_Normal': var_95_normal, 'VaR_Hist': var_95_hist, 'VaR_CF': var_95_cf,
-                'CVaR': cvar_95, 'Worst Day': worst_day, 'Kurt': kurt, 'Calmar': calmar
-            })
-        return pd.DataFrame(lista)
+        # Motor vetorizado: todos os ativos em poucas passadas NumPy (sem loop por ticker)
+        ativos = [t for t in retornos.columns if t in mapa_setores]
+        def calcular(sub):
+            # Só roda para os ativos fora do cache; as famílias de métrica viram marcos desta etapa
+            with ins.etapa('motor') as e:
+                e.linhas = sub.shape[1]
+                if sub.shape[1] >= MIN_ATIVOS_PARALELO:
+                    return mp.tabela_metricas_paralela(sub, bench_ret, RISK_FREE, 252, level=5,
+                                                       n_processos=N_PROCESSOS, tamanho_shard=TAMANHO_SHARD)
+                return mm.tabela_metricas(sub, bench_ret, RISK_FREE, 252, level=5)
+        with ins.etapa('tabela_metricas') as e:
+            e.linhas = len(ativos)
+            if USAR_CACHE:
+                cache = cm.CacheMetricas()
+                try:
+                    parametros = {'RISK_FREE': RISK_FREE, 'level': 5, 'periods_per_year': 252}
+                    tabela = cache.obter_ou_calcular(retornos[ativos], calcular, bench_ret, parametros, dm.__version__)
+                    cache.despejar()
+                    print(cache.resumo())
+                    ins.contar('cache_hits', cache.hits)
+                    ins.contar('cache_misses', cache.misses)
+                finally:
+                    cache.fechar()
+            else:
+                tabela = calcular(retornos[ativos])
+        tabela.insert(0, 'Setor', [mapa_setores.get(t) for t in tabela.index])
+        return tabela.reset_index()[COLUNAS_RELATORIO]
     except Exception as e:
         print(f"Erro: {e}")
+        ins.falha(e)
+        return pd.DataFrame()
+
+def calcular_backtest(retornos):
+    """Backtest fora da amostra do VaR (Kupiec/Christoffersen/Basileia) dos ativos do relatório."""
+    if len(retornos) <= bt.JANELA:
+        print(f"⚠️ Histórico curto para o backtest (precisa de mais de {bt.JANELA} dias).")
         return pd.DataFrame()
-    finally: conn.close()
+    with ins.etapa('backtest_var') as e:
+        e.linhas = retornos.shape[1]
+        return bt.backtest_var(retornos)
+
+def calcular_stress(retornos):
+    """Replay das crises históricas (cenarios_stress.CENARIOS) cobertas por inteiro pela base."""
+    with ins.etapa('cenarios_stress') as e:
+        e.linhas = retornos.shape[1]
+        tabela = cs.tabela_longa(cs.replay_cenarios(retornos))
+    if tabela.empty:
+        print("⚠️ Nenhuma crise histórica coberta pela base (aba de cenários omitida).")
+    return tabela
 
 # ==============================================================================
 # 4. EXCEL BUILDER (VISUAL CORRIGIDO)
 # ==============================================================================
-def gerar_relatorio_final():
-    df = calcular_metricas_sql()
-    if df.empty: sys.exit(1)
-    print(f"📊 Gerando Relatório Final: {CAMINHO_FINAL}")
+def construir_excel_padrao(df, df_bt, caminho, df_stress=None, data_ref=None):
+    """Builder em memória (Workbook padrão): layout completo, um gráfico com um ponto por ativo. data_ref: data do cabeçalho (padrão: hoje)."""
+    # openpyxl só quando há Excel a gerar: quem usa o módulo só para as métricas não paga o import
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    from openpyxl.chart import ScatterChart, BarChart, Series, Reference
+    from openpyxl.formatting.rule import DataBarRule
+    from openpyxl.utils import get_column_letter
+
     wb = Workbook()
     
     # Estilos
@@ -112,12 +150,13 @@ def gerar_relatorio_final():
     borda = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
 
     # === ABA 1: MONITOR ===
+    ins.marco('Monitor Geral')
     ws1 = wb.active; ws1.title = "Monitor Geral"
     ws1['B2'] = "MONITOR DE PERFORMANCE"; ws1['B2'].font = Font(size=16, bold=True, color=azul_escuro)
-    ws1['B3'] = f"Ref: {datetime.now().strftime('%d/%m/%Y')} | RF: {RISK_FREE:.2%}"
+    ws1['B3'] = f"Ref: {(data_ref or datetime.now()).strftime('%d/%m/%Y')} | RF: {RISK_FREE:.2%}"
 
-    cols1 = ['Ativo', 'Setor', 'Retorno Total', 'Volatilidade', 'Sharpe', 'Sortino', 'Beta', 'Max Drawdown']
-    larguras1 = {'B': 12, 'C': 12, 'D': 13, 'E': 13, 'F': 10, 'G': 10, 'H': 9, 'I': 13}
+    cols1 = ['Ativo', 'Setor', 'Retorno Total', 'Volatilidade', 'Sharpe', 'Sortino', 'Beta', 'Max Drawdown', 'Duração DD']
+    larguras1 = {'B': 12, 'C': 12, 'D': 13, 'E': 13, 'F': 10, 'G': 10, 'H': 9, 'I': 13, 'J': 12}
     for col, w in larguras1.items(): ws1.column_dimensions[col].width = w
 
     for i, c in enumerate(cols1):
@@ -137,10 +176,11 @@ def gerar_relatorio_final():
         ws1.cell(row=r_idx, column=7, value=row['Sortino']).number_format = '0.00'
         ws1.cell(row=r_idx, column=8, value=row['Beta']).number_format = '0.00'
         ws1.cell(row=r_idx, column=9, value=row['Max DD']).number_format = '0.0%'
+        ws1.cell(row=r_idx, column=10, value=row['Duração DD']).number_format = '0'  # Pregões abaixo do pico
         
-        for c in range(3, 10): ws1.cell(row=r_idx, column=c).border = borda; 
+        for c in range(3, 11): ws1.cell(row=r_idx, column=c).border = borda; 
         if r_idx > 6: 
-             for c in range(5,10): ws1.cell(row=r_idx, column=c).alignment = center
+             for c in range(5,11): ws1.cell(row=r_idx, column=c).alignment = center
 
     ws1.freeze_panes = "B7"
     ultima_linha = 6 + len(df)
@@ -167,6 +207,7 @@ def gerar_relatorio_final():
     ws1.add_chart(chart1, "B18")
 
     # === ABA 2: BEYOND VAR ===
+    ins.marco('BeyondVaR Analysis')
     ws2 = wb.create_sheet("BeyondVaR Analysis")
     ws2['B2'] = "STRESS TEST (ANÁLISE DE CRISE)"; ws2['B2'].font = Font(size=16, bold=True, color=vermelho_alerta)
 
@@ -221,7 +262,8 @@ def gerar_relatorio_final():
         ("VaR Normal", "Cenário Otimista. Subestima riscos de cauda (Gaussiano)."),
         ("VaR Cornish-Fisher", "Cenário Realista. Ajustado para assimetria e curtose do ativo."),
         ("CVaR (Extreme)", "Cenário de Crise. Média das perdas quando o VaR é rompido."),
-        ("Calmar Ratio", "Retorno Anual / Max Drawdown. Eficiência na dor.")
+        ("Calmar Ratio", "Retorno Anual / Max Drawdown. Eficiência na dor."),
+        ("Duração DD", "Maior sequência de pregões abaixo do pico anterior. Tempo na dor.")
     ]
     for i, (t, d) in enumerate(termos):
         l = row_gloss + 1 + i
@@ -230,8 +272,90 @@ def gerar_relatorio_final():
         c_d = ws2.cell(row=l, column=3, value=d); c_d.border = borda
         for c in range(3, 8): ws2.cell(row=l, column=c).border = borda
 
-    wb.save(CAMINHO_FINAL)
-    print(f"✅ Relatório Final Gerado: {CAMINHO_FINAL}")
+    # === ABA 3: BACKTEST DO VaR ===
+    if not df_bt.empty:
+        ins.marco('Backtest VaR')
+        ws3 = wb.create_sheet("Backtest VaR")
+        ws3['B2'] = "BACKTEST DO VaR (FORA DA AMOSTRA)"; ws3['B2'].font = Font(size=16, bold=True, color=azul_escuro)
+        ws3['B3'] = f"Janela: {bt.JANELA} dias | Kupiec (POF), Christoffersen (independência) e Semáforo de Basileia"
+
+        cols3 = ['Ativo', 'Modelo', 'Nível', 'Dias', 'Exceções', 'Esperadas', 'Taxa', 'p Kupiec', 'p Christoffersen', 'Zona']
+        larguras3 = [12, 16, 8, 8, 10, 11, 9, 11, 17, 11]
+        for i, w in enumerate(larguras3): ws3.column_dimensions[get_column_letter(i+2)].width = w
+        for i, c in enumerate(cols3):
+            cell = ws3.cell(row=6, column=i+2, value=c)
+            cell.fill = fill_azul; cell.font = header_font; cell.alignment = center
+
+        fills_zona = {z: PatternFill(start_color=cor, end_color=cor, fill_type="solid")
+                      for z, cor in [('Verde', "C6EFCE"), ('Amarela', "FFEB9C"), ('Vermelha', "FFC7CE")]}
+        campos3 = [('Ativo', None), ('Modelo', None), ('Nível', '0.0"%"'), ('Observações', '0'), ('Exceções', '0'),
+                   ('Esperadas', '0.0'), ('Taxa', '0.00%'), ('p_Kupiec', '0.000'), ('p_Christoffersen', '0.000'), ('Zona', None)]
+        for r_idx, row in enumerate(df_bt.to_dict('records'), 7):
+            for c_idx, (campo, formato) in enumerate(campos3, 2):
+                cell = ws3.cell(row=r_idx, column=c_idx, value=row[campo])
+                cell.border = borda; cell.alignment = center
+                if formato: cell.number_format = formato
+            ws3.cell(row=r_idx, column=2).font = Font(bold=True)
+            ws3.cell(row=r_idx, column=11).fill = fills_zona[row['Zona']]
+        ws3.freeze_panes = "B7"
+
+    # === ABA 4: CENÁRIOS HISTÓRICOS ===
+    if df_stress is not None and not df_stress.empty:
+        ins.marco('Cenários Históricos')
+        ws4 = wb.create_sheet("Cenários Históricos")
+        ws4['B2'] = "CENÁRIOS HISTÓRICOS (REPLAY DE CRISES)"; ws4['B2'].font = Font(size=16, bold=True, color=vermelho_alerta)
+        ws4['B3'] = "P&L acumulado, maior drawdown e pior dia de cada ativo dentro da janela de cada crise"
+
+        cols4 = ['Cenário', 'Início', 'Fim', 'Pregões', 'Ativo', 'P&L', 'Max DD', 'Pior Dia']
+        larguras4 = [24, 11, 11, 9, 12, 10, 10, 10]
+        for i, w in enumerate(larguras4): ws4.column_dimensions[get_column_letter(i+2)].width = w
+        for i, c in enumerate(cols4):
+            cell = ws4.cell(row=6, column=i+2, value=c)
+            cell.fill = fill_azul; cell.font = header_font; cell.alignment = center
+
+        campos4 = [('Cenário', None), ('Início', 'DD/MM/YYYY'), ('Fim', 'DD/MM/YYYY'), ('Pregões', '0'), ('Ativo', None),
+                   ('P&L', '0.0%'), ('Max DD', '0.0%'), ('Pior Dia', '0.00%')]
+        for r_idx, row in enumerate(df_stress.to_dict('records'), 7):
+            for c_idx, (campo, formato) in enumerate(campos4, 2):
+                cell = ws4.cell(row=r_idx, column=c_idx, value=row[campo])
+                cell.border = borda; cell.alignment = center
+                if formato: cell.number_format = formato
+            ws4.cell(row=r_idx, column=6).font = Font(bold=True)
+            ws4.cell(row=r_idx, column=7).font = Font(color="006100" if row['P&L'] > 0 else "9C0006", bold=True)
+        ws4.freeze_panes = "B7"
+
+    ins.marco('salvar')
+    wb.save(caminho)
+
+def gerar_relatorio_final(modo=None):
+    """
+    Calcula as métricas e gera o Excel.
+    - modo: 'padrao' (Workbook em memória), 'streaming' (write_only, ver excel_streaming)
+      ou 'auto' (streaming acima de LIMITE_STREAMING ativos). Padrão: MODO_EXCEL.
+    """
+    retornos = carregar_retornos()
+    df = calcular_metricas_sql(retornos)
+    if df.empty: sys.exit(1)
+    df_bt = calcular_backtest(retornos)
+    df_stress = calcular_stress(retornos)
+    return escrever_excel(df, df_bt, CAMINHO_FINAL, modo, df_stress)
+
+def escrever_excel(df, df_bt, caminho=None, modo=None, df_stress=None, data_ref=None):
+    """Grava o Excel a partir das tabelas já calculadas (usado também pelo pipeline e por carteira). Retorna o caminho."""
+    caminho = caminho or CAMINHO_FINAL
+    modo = modo or MODO_EXCEL
+    print(f"📊 Gerando Relatório Final: {caminho}")
+    streaming = modo == 'streaming' or (modo == 'auto' and len(df) > LIMITE_STREAMING)
+    with ins.etapa('excel_streaming' if streaming else 'excel_padrao') as e:
+        e.linhas = len(df)
+        if streaming:
+            import excel_streaming as xs
+            xs.construir_excel_streaming(df, df_bt, caminho, RISK_FREE, bt.JANELA, df_stress, data_ref)
+        else:
+            construir_excel_padrao(df, df_bt, caminho, df_stress, data_ref)
+    print(f"✅ Relatório Final Gerado: {caminho}")
+    return caminho
 
 if __name__ == "__main__":
-    gerar_relatorio_final()
\ No newline at end of file
+    with ins.execucao('relatorio', CAMINHO_DB):
+        gerar_relatorio_final()
\ No newline at end of file
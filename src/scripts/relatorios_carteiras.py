@@ -0,0 +1,297 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import zipfile
+import tempfile
+import argparse
+import unicodedata
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+import relatorio_excel as rel
+import motor_metricas as mm
+import risco_carteira as rc
+import snapshot_precos as sp
+import instrumentacao as ins
+
+# ==============================================================================
+# RELATÓRIOS POR CARTEIRA (FAN-OUT EM PROCESSOS)
+# Um workbook por mesa/carteira, cada uma com o seu mapa de setores (os tickers
+# dela), pesos, filtros e nome de arquivo. Os preços são lidos UMA vez; os
+# retornos de cada carteira saem só das colunas dela (o relatório de uma mesa
+# não depende de quais outras estão configuradas). Carteiras com a mesma janela
+# de dados dividem um único cálculo de métricas (com o cache de métricas),
+# backtest do VaR e replay das crises. As carteiras com pesos entram como
+# séries extras (retornos @ pesos) nas mesmas passadas.
+# Cada carteira recebe só as fatias dela e os workbooks são escritos num pool
+# de processos (o openpyxl é a parte cara e não libera o GIL).
+#
+# Saída determinística: mesma base + mesma configuração = mesmos bytes. A data
+# do cabeçalho e os carimbos do .xlsx (entradas do zip e docProps/core.xml)
+# passam a ser a do último pregão, não a da execução. Ao final, 'manifesto.json'
+# lista os arquivos gerados (ativos, bytes, sha256, segundos) e o tempo das
+# etapas comuns.
+# Uso: python relatorios_carteiras.py [config.json] [--processos N] [--pasta DIR]
+# ==============================================================================
+
+CAMINHO_CONFIG = os.environ.get("LAB_RISCO_CARTEIRAS", os.path.join(rel.RAIZ_PROJETO, "config", "carteiras.json"))
+PASTA_CARTEIRAS = os.path.join(rel.PASTA_SAIDA, "carteiras")
+NOME_MANIFESTO = "manifesto.json"
+N_PROCESSOS = None  # None = um processo por carteira, até o número de núcleos
+SETOR_CARTEIRA = 'Carteira'
+
+
+def carregar_config(caminho=None):
+    """
+    Lê o JSON das carteiras (ver config/carteiras.exemplo.json): lista 'carteiras' com
+    - nome: identifica a carteira (e casa com a 'carteira' dos destinatários da distribuição).
+    - mapa_setores: {ticker: setor}, no formato do MAPA_SETORES (a ordem vira a ordem das linhas).
+    - pesos (opcional): {ticker: peso}; com eles a carteira entra como uma linha a mais.
+    - setores / excluir (opcionais): só esses setores / tirar esses tickers.
+    - arquivo (opcional): nome do .xlsx. Padrão: Relatorio_<nome>_<AAAAMMDD do último pregão>.xlsx.
+    - modo_excel (opcional): como em relatorio_excel.MODO_EXCEL.
+    """
+    caminho = caminho or CAMINHO_CONFIG
+    with open(caminho, encoding='utf-8') as f:
+        config = json.load(f)
+    carteiras = config.get('carteiras') or []
+    nomes = set()
+    for c in carteiras:
+        if not c.get('nome') or not c.get('mapa_setores'):
+            raise ValueError(f"carteira sem 'nome' ou 'mapa_setores' em {caminho}: {c}")
+        if c['nome'] in nomes:
+            raise ValueError(f"carteira repetida em {caminho}: {c['nome']}")
+        nomes.add(c['nome'])
+        fora = [t for t in (c.get('pesos') or {}) if t not in _mapa(c)]
+        if fora:
+            # Peso em ticker fora do mapa (ou filtrado por setores/excluir) viraria zero sem aviso
+            raise ValueError(f"carteira '{c['nome']}' em {caminho}: pesos em tickers fora do mapa_setores "
+                             f"(depois dos filtros): {fora}")
+    return carteiras
+
+
+def _slug(nome):
+    """'Ações Brasil' -> 'Acoes_Brasil' (nome de arquivo portátil)."""
+    ascii_ = unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^A-Za-z0-9]+', '_', ascii_).strip('_') or 'Carteira'
+
+
+def _mapa(carteira):
+    """Mapa de setores da carteira já com os filtros aplicados (ordem do arquivo de configuração)."""
+    setores, excluir = carteira.get('setores'), set(carteira.get('excluir') or ())
+    return {t: s for t, s in carteira['mapa_setores'].items()
+            if t not in excluir and (not setores or s in setores)}
+
+
+def _nome_serie(carteira):
+    return f"Carteira {carteira['nome']}"
+
+
+# ==============================================================================
+# ETAPAS COMUNS (CALCULADAS UMA VEZ POR JANELA DE DADOS)
+# ==============================================================================
+
+def _agrupar(precos, carteiras):
+    """
+    Retornos de cada carteira a partir das colunas DELA (mais o ^BVSP do Beta), com o
+    dropna dela: um IPO recente numa mesa não encurta o histórico das outras.
+    Carteiras cujas séries coincidem (mesmas datas e, nos tickers em comum, mesmos
+    valores) caem no mesmo grupo e dividem o cálculo. Retorna (grupos, grupo de cada carteira).
+    """
+    grupos, de_carteira = [], {}
+    for c in carteiras:
+        mapa = _mapa(c)
+        retornos = rel.retornos_de(precos, list(dict.fromkeys([*mapa, '^BVSP'])))
+        if retornos.empty:
+            raise RuntimeError(f"carteira '{c['nome']}': sem retornos na base")
+        for i, grupo in enumerate(grupos):
+            comuns = grupo.columns.intersection(retornos.columns)
+            if grupo.index.equals(retornos.index) and grupo[comuns].equals(retornos[comuns]):
+                grupos[i] = pd.concat([grupo, retornos[retornos.columns.difference(grupo.columns, sort=False)]], axis=1)
+                break
+        else:
+            i = len(grupos)
+            grupos.append(retornos)
+        de_carteira[c['nome']] = i
+    return grupos, de_carteira
+
+
+def _calcular_grupo(retornos, carteiras):
+    """Métricas, backtest e cenários dos ativos de um grupo e das carteiras com pesos dele."""
+    df = rel.calcular_metricas_sql(retornos, dict.fromkeys(retornos.columns))  # Setor vem do mapa de cada carteira
+    if df.empty:
+        raise RuntimeError("Tabela de métricas vazia")
+    # Carteiras com pesos: séries extras retornos @ pesos, métricas numa chamada só do motor
+    com_pesos = [c for c in carteiras if c.get('pesos')]
+    series = pd.DataFrame(index=retornos.index)
+    if com_pesos:
+        pesos = pd.DataFrame([c['pesos'] for c in com_pesos], index=[_nome_serie(c) for c in com_pesos])
+        W, nomes = rc._como_pesos(pesos.fillna(0.0), list(retornos.columns))
+        series = pd.DataFrame(retornos.to_numpy() @ W.T, index=retornos.index, columns=nomes)
+        bench = retornos['^BVSP'] if '^BVSP' in retornos.columns else pd.Series(0, index=retornos.index)
+        tabela = mm.tabela_metricas(series, bench, rel.RISK_FREE, 252, level=5)
+        tabela.insert(0, 'Setor', SETOR_CARTEIRA)
+        df = pd.concat([df, tabela.reset_index()[rel.COLUNAS_RELATORIO]], ignore_index=True)
+    todas = pd.concat([retornos, series], axis=1)
+    return df, rel.calcular_backtest(todas), rel.calcular_stress(todas)
+
+
+def preparar(carteiras, caminho_db=None):
+    """
+    Lê os preços uma vez e calcula o que as carteiras usam, uma vez por grupo de
+    carteiras com a mesma janela de dados (ver _agrupar).
+    Retorna {'data_base', 'grupos', 'de_carteira', 'tempos'}; cada grupo é um dicionário
+    com 'metricas' (ativos + linhas 'Carteira <nome>'), 'backtest' e 'stress'.
+    """
+    tempos = {}
+    caminho_db = caminho_db or rel.CAMINHO_DB
+    if not os.path.exists(caminho_db):
+        raise RuntimeError(f"Base não encontrada: {caminho_db}")
+
+    t0 = time.perf_counter()
+    with ins.etapa('leitura_db') as e:
+        precos = sp.ler_precos(caminho_db)
+        e.linhas = precos.size
+    grupos, de_carteira = _agrupar(precos, carteiras)
+    tempos['retornos'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    calculados = []
+    for i, retornos in enumerate(grupos):
+        membros = [c for c in carteiras if de_carteira[c['nome']] == i]
+        df, df_bt, df_stress = _calcular_grupo(retornos, membros)
+        calculados.append({'metricas': df, 'backtest': df_bt, 'stress': df_stress})
+    tempos['metricas_backtest_stress'] = time.perf_counter() - t0
+
+    return {'data_base': max(g.index[-1] for g in grupos), 'grupos': calculados, 'de_carteira': de_carteira,
+            'tempos': {k: round(v, 3) for k, v in tempos.items()}}
+
+
+def fatiar(comum, carteira):
+    """(df, df_bt, df_stress) da carteira: só os ativos dela, na ordem e com os setores do mapa dela."""
+    grupo = comum['grupos'][comum['de_carteira'][carteira['nome']]]
+    mapa = _mapa(carteira)
+    ativos = [t for t in mapa if t in set(grupo['metricas']['Ativo'])]
+    if carteira.get('pesos'):
+        ativos.append(_nome_serie(carteira))
+    df = grupo['metricas'].set_index('Ativo').loc[ativos].reset_index()
+    df['Setor'] = [mapa.get(t, SETOR_CARTEIRA) for t in df['Ativo']]
+    df_bt, df_stress = grupo['backtest'], grupo['stress']
+    if not df_bt.empty:
+        df_bt = df_bt[df_bt['Ativo'].isin(ativos)].reset_index(drop=True)
+    if not df_stress.empty:
+        df_stress = df_stress[df_stress['Ativo'].isin(ativos)].reset_index(drop=True)
+    return df[rel.COLUNAS_RELATORIO], df_bt, df_stress
+
+
+# ==============================================================================
+# ESCRITA (UM WORKBOOK POR TAREFA DO POOL)
+# ==============================================================================
+
+def normalizar_xlsx(caminho, data):
+    """
+    Reescreve o .xlsx com carimbos fixos: data/hora de todas as entradas do zip e
+    created/modified do docProps/core.xml passam a ser 'data' (os bytes deixam de
+    depender da hora em que o arquivo foi gerado).
+    """
+    carimbo = pd.Timestamp(data).strftime('%Y-%m-%dT00:00:00Z')
+    data_zip = tuple(pd.Timestamp(data).timetuple())[:3] + (0, 0, 0)
+    padrao = re.compile(rb'(<dcterms:(?:created|modified)[^>]*>)[^<]*(</dcterms:)')
+    fd, temporario = tempfile.mkstemp(suffix='.xlsx', dir=os.path.dirname(os.path.abspath(caminho)))
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(caminho) as origem, zipfile.ZipFile(temporario, 'w') as destino:
+            for info in origem.infolist():
+                conteudo = origem.read(info.filename)
+                if info.filename == 'docProps/core.xml':
+                    conteudo = padrao.sub(rb'\g<1>' + carimbo.encode() + rb'\g<2>', conteudo)
+                novo = zipfile.ZipInfo(info.filename, date_time=data_zip)
+                novo.compress_type = info.compress_type
+                novo.external_attr = info.external_attr
+                destino.writestr(novo, conteudo)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def _renderizar(tarefa):
+    """Tarefa do pool: escreve e normaliza um workbook. Retorna (segundos, bytes, sha256)."""
+    df, df_bt, df_stress, caminho, modo, data = tarefa
+    t0 = time.perf_counter()
+    rel.escrever_excel(df, df_bt, caminho, modo, df_stress, data)
+    normalizar_xlsx(caminho, data)
+    segundos = time.perf_counter() - t0
+    with open(caminho, 'rb') as f:
+        conteudo = f.read()
+    return round(segundos, 3), len(conteudo), hashlib.sha256(conteudo).hexdigest()
+
+
+def gerar_relatorios(carteiras, caminho_db=None, pasta=None, n_processos=None):
+    """
+    Gera um workbook por carteira e o manifesto. Retorna {carteira: caminho} na ordem da configuração.
+    - carteiras: lista de dicionários (ver carregar_config).
+    - n_processos: tamanho do pool (padrão: N_PROCESSOS; 1 = sem pool, tudo no processo atual).
+    """
+    pasta = pasta or PASTA_CARTEIRAS
+    os.makedirs(pasta, exist_ok=True)
+    t_total = time.perf_counter()
+    with ins.etapa('carteiras_comum') as e:
+        e.linhas = len(carteiras)
+        comum = preparar(carteiras, caminho_db)
+    data_base = comum['data_base']
+
+    tarefas, entradas = [], []
+    for c in carteiras:
+        df, df_bt, df_stress = fatiar(comum, c)
+        arquivo = c.get('arquivo') or f"Relatorio_{_slug(c['nome'])}_{data_base.strftime('%Y%m%d')}.xlsx"
+        caminho = os.path.join(pasta, arquivo)
+        tarefas.append((df, df_bt, df_stress, caminho, c.get('modo_excel'), data_base))
+        entradas.append({'carteira': c['nome'], 'arquivo': arquivo, 'ativos': len(df)})
+
+    n = min(n_processos or N_PROCESSOS or os.cpu_count() or 1, len(tarefas)) or 1
+    with ins.etapa('carteiras_excel') as e:
+        e.linhas = len(tarefas)
+        if n == 1:
+            resultados = [_renderizar(t) for t in tarefas]
+        else:
+            with ProcessPoolExecutor(max_workers=n) as pool:
+                resultados = list(pool.map(_renderizar, tarefas))
+    for entrada, (segundos, tamanho, sha) in zip(entradas, resultados):
+        entrada.update(segundos=segundos, bytes=tamanho, sha256=sha)
+
+    manifesto = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'data_base': data_base.strftime('%Y-%m-%d'),
+        'processos': n,
+        'etapas_comuns': comum['tempos'],
+        'segundos_total': round(time.perf_counter() - t_total, 3),
+        'relatorios': entradas,
+    }
+    with open(os.path.join(pasta, NOME_MANIFESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    print(f"✅ {len(entradas)} relatórios por carteira em {pasta} ({manifesto['segundos_total']:.1f}s, {n} processos)")
+    return {e['carteira']: os.path.join(pasta, e['arquivo']) for e in entradas}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Um relatório de risco por carteira (fan-out em processos)")
+    parser.add_argument("config", nargs="?", default=CAMINHO_CONFIG, help="JSON das carteiras")
+    parser.add_argument("--processos", type=int, help="tamanho do pool (1 = sem pool)")
+    parser.add_argument("--pasta", default=PASTA_CARTEIRAS, help="pasta de saída")
+    parser.add_argument("--db", default=rel.CAMINHO_DB, help="caminho do mercado.db")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.config):
+        print(f"❌ Configuração de carteiras não encontrada: {args.config}")
+        return 1
+    with ins.execucao('carteiras', args.db):
+        gerar_relatorios(carregar_config(args.config), args.db, args.pasta, args.processos)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
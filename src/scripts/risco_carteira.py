@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+import dados_mercado as dm
+import motor_metricas as mm
+
+# ==============================================================================
+# RISCO DE CARTEIRA (EM LOTE)
+# Recebe MUITAS carteiras de uma vez (matriz carteiras x ativos) e devolve VaR
+# Histórico, Normal e Cornish-Fisher, CVaR, e o VaR Marginal / por Componente
+# de cada posição. Tudo sai de dois produtos matriciais:
+#   retornos @ pesos.T  (séries das carteiras)   e   pesos @ Σ  (covariâncias).
+# ==============================================================================
+
+
+def _como_pesos(pesos, tickers):
+    """
+    Converte pesos (vetor, matriz ou DataFrame carteiras x tickers) em (matriz P x N, nomes).
+    Ticker do DataFrame fora de 'tickers' é erro: zerar o peso seria medir outra carteira.
+    """
+    if isinstance(pesos, pd.Series):
+        pesos = pesos.to_frame().T
+    if isinstance(pesos, pd.DataFrame):
+        conhecidos = set(tickers)
+        fora = [c for c in pesos.columns if c not in conhecidos]
+        if fora:
+            raise ValueError(f"pesos em tickers fora dos retornos: {fora}")
+        nomes = list(pesos.index)
+        return pesos.reindex(columns=tickers, fill_value=0.0).to_numpy(dtype=np.float64), nomes
+    W = np.atleast_2d(np.asarray(pesos, dtype=np.float64))
+    if W.shape[1] != len(tickers):
+        raise ValueError(f"pesos tem {W.shape[1]} colunas, mas há {len(tickers)} ativos")
+    return W, [f"Carteira {i + 1}" for i in range(W.shape[0])]
+
+
+def _como_cov(cov, tickers):
+    """Σ informada (MatrizCovariancia, DataFrame ou ndarray) -> ndarray N x N na ordem de tickers."""
+    if hasattr(cov, 'alinhada'):
+        return cov.alinhada(tickers, ewma=True)
+    if isinstance(cov, pd.DataFrame):
+        return cov.loc[tickers, tickers].to_numpy(dtype=np.float64)
+    cov = np.asarray(cov, dtype=np.float64)
+    if cov.shape != (len(tickers), len(tickers)):
+        raise ValueError(f"cov tem forma {cov.shape}, mas há {len(tickers)} ativos")
+    return cov
+
+
+def risco_carteiras(retornos, pesos, level=5, cov=None):
+    """
+    Risco de cada carteira e atribuição por posição.
+
+    Retorna um dicionário de DataFrames:
+    - 'resumo': carteiras x ['Retorno Médio', 'Desvio Diário', 'VaR_Hist', 'VaR_Normal', 'VaR_CF', 'CVaR']
+      (valores diários, perdas positivas, mesmas convenções de dados_mercado).
+    - 'marginal': carteiras x ativos, derivada do VaR Normal em relação ao peso de cada ativo.
+    - 'componente': carteiras x ativos, peso * VaR marginal. Soma da linha = VaR Normal (Euler).
+
+    cov: Σ a usar no VaR Normal, no marginal e no componente (ex.: o EWMA de uma
+    covariancia.MatrizCovariancia já calculada, ou um DataFrame N x N). Se None, usa a
+    amostral populacional dos próprios retornos. O Cornish-Fisher segue com o desvio das séries.
+    """
+    R, tickers = mm._como_matriz(retornos)
+    W, nomes = _como_pesos(pesos, tickers)
+    T = R.shape[0]
+
+    # 1) Séries das carteiras: um único produto (dias x carteiras)
+    Rp = R @ W.T
+    media_p, _, sigma_p, skew_p, kurt_p = mm._momentos(Rp)
+
+    # 2) VaR/CVaR Histórico de todas as carteiras de uma vez
+    var_hist, cvar = (v[0] for v in dm.tail_historic(Rp, [level]))
+
+    # 3) Paramétrico e Cornish-Fisher (mesma fórmula de dm.var_gaussian)
+    z = dm.norm_ppf(level / 100)
+    z_cf = (z +
+            (z**2 - 1) * skew_p / 6 +
+            (z**3 - 3 * z) * (kurt_p - 3) / 24 -
+            (2 * z**3 - 5 * z) * (skew_p**2) / 36)
+
+    # 4) Marginal e Componente: Σ populacional (ddof=0), coerente com sigma_p acima
+    media = R.mean(axis=0)
+    sigma_cov = sigma_p
+    if cov is None:
+        demeaned = R - media
+        cov = demeaned.T @ demeaned / T
+        WS = W @ cov  # (carteiras x ativos): Σw de cada carteira
+    else:
+        cov = _como_cov(cov, tickers)
+        WS = W @ cov
+        sigma_cov = np.sqrt(np.einsum('ij,ij->i', WS, W))  # √(wᵀΣw) de cada carteira
+    with np.errstate(invalid='ignore', divide='ignore'):
+        marginal = -(media + z * WS / sigma_cov[:, None])
+    componente = W * marginal
+
+    resumo = pd.DataFrame({
+        'Retorno Médio': media_p, 'Desvio Diário': sigma_cov,
+        'VaR_Hist': var_hist, 'VaR_Normal': -(media_p + z * sigma_cov),
+        'VaR_CF': -(media_p + z_cf * sigma_p), 'CVaR': cvar
+    }, index=nomes)
+    return {
+        'resumo': resumo,
+        'marginal': pd.DataFrame(marginal, index=nomes, columns=tickers),
+        'componente': pd.DataFrame(componente, index=nomes, columns=tickers),
+    }
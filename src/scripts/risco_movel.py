@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+import dados_mercado as dm
+
+# ==============================================================================
+# MOTOR DE RISCO EM JANELA MÓVEL (ROLLING)
+# Séries temporais de Vol, Skew, Curtose, VaR (Histórico, Normal, Cornish-Fisher),
+# CVaR e Beta para TODOS os ativos de uma vez.
+# - Estatísticas paramétricas: somas acumuladas dos momentos (custo O(1) por janela).
+# - VaR/CVaR Histórico: só os k menores valores de cada janela importam. Eles saem de
+#   uma estrutura de prefixos/sufixos por bloco (van Herk/Gil-Werman), com custo
+#   O(k log k) por janela, independente do tamanho da janela.
+# Resultado idêntico a rolling(janela).apply(dm.var_historic) & cia.
+# ==============================================================================
+
+MEMORIA_BLOCO = 64 * 1024**2  # Limite (bytes) das estruturas de ordem por lote de ativos
+
+
+def _somas_moveis(x, janela):
+    """Soma de cada janela (linhas janela-1..T-1) via diferença de somas acumuladas."""
+    c = np.cumsum(x, axis=0)
+    out = c[janela - 1:].copy()
+    out[1:] -= c[:-janela]
+    return out
+
+
+def _momentos_moveis(x, janela):
+    """Média, m2, m3 e m4 centrais (populacionais) de cada janela."""
+    centro = np.nanmean(x, axis=0)  # Centraliza antes de somar potências (estabilidade numérica)
+    d = np.nan_to_num(x - centro)
+    d2 = d * d
+    e1, e2, e3, e4 = (_somas_moveis(p, janela) / janela for p in (d, d2, d2 * d, d2 * d2))
+    m2 = np.maximum(e2 - e1**2, 0.0)
+    m3 = e3 - 3 * e1 * e2 + 2 * e1**3
+    m4 = e4 - 4 * e1 * e3 + 6 * e1**2 * e2 - 3 * e1**4
+    return e1 + centro, m2, m3, m4
+
+
+def _k_menores_moveis(x, janela, k):
+    """
+    Para cada janela, os k menores valores em ordem crescente: array (T-janela+1, N, k).
+    Cada janela = sufixo de um bloco de tamanho 'janela' + prefixo do bloco seguinte.
+    """
+    T, N = x.shape
+    infinito = np.full((N, k), np.inf)
+    pref = np.empty((T, N, k))
+    suf = np.empty((T, N, k))
+    atual = infinito
+    for t in range(T):
+        if t % janela == 0:
+            atual = infinito
+        atual = np.sort(np.concatenate([atual, x[t][:, None]], axis=1), axis=1)[:, :k]
+        pref[t] = atual
+    for t in range(T - 1, -1, -1):
+        if t % janela == janela - 1 or t == T - 1:
+            atual = infinito
+        atual = np.sort(np.concatenate([atual, x[t][:, None]], axis=1), axis=1)[:, :k]
+        suf[t] = atual
+
+    fins = np.arange(janela - 1, T)
+    inicios = fins - janela + 1
+    out = np.empty((len(fins), N, k))
+    alinhada = inicios % janela == 0  # Janela coincide com um bloco inteiro
+    out[alinhada] = suf[inicios[alinhada]]
+    partida = ~alinhada
+    candidatos = np.concatenate([suf[inicios[partida]], pref[fins[partida]]], axis=2)
+    out[partida] = np.sort(candidatos, axis=2)[:, :, :k]
+    return out
+
+
+def _cauda_movel(x, janela, niveis):
+    """
+    VaR e CVaR Históricos móveis (mesma interpolação linear de np.percentile) para vários
+    níveis a partir da MESMA estrutura de ordem: arrays (níveis, T-janela+1, N).
+    """
+    T, N = x.shape
+    niveis = list(np.atleast_1d(niveis))
+    posicoes = [nivel / 100 * (janela - 1) for nivel in niveis]
+    k = min(int(np.floor(max(posicoes))) + 2, janela)
+    base = np.where(np.isnan(x), np.inf, x)  # NaN nunca entra na cauda; a janela é anulada depois
+
+    var = np.empty((len(niveis), T - janela + 1, N))
+    cvar = np.empty((len(niveis), T - janela + 1, N))
+    lote = max(1, int(MEMORIA_BLOCO // (3 * T * k * 8)))
+    for j in range(0, N, lote):
+        menores = _k_menores_moveis(base[:, j:j + lote], janela, k)
+        for n_idx, pos in enumerate(posicoes):
+            k0 = int(np.floor(pos))
+            frac = pos - k0
+            baixo = menores[:, :, k0]
+            cima = menores[:, :, min(k0 + 1, k - 1)]
+            with np.errstate(invalid='ignore'):
+                q = baixo + frac * (cima - baixo) if frac else baixo
+                na_cauda = menores <= q[:, :, None]
+                n_cauda = na_cauda.sum(axis=2)
+                cvar_lote = np.where(na_cauda, menores, 0.0).sum(axis=2) / n_cauda
+            # Empates no quantil podem ter deixado valores iguais fora dos k guardados: refaz exato
+            for t, i in zip(*np.nonzero(n_cauda == k)):
+                w = x[t:t + janela, j + i]
+                cvar_lote[t, i] = w[w <= q[t, i]].mean()
+            var[n_idx, :, j:j + lote] = -q
+            cvar[n_idx, :, j:j + lote] = -cvar_lote
+    return var, cvar
+
+
+def _var_parametrico(media, m2, m3, m4, level):
+    """VaR Normal e Cornish-Fisher (mesmas fórmulas de dm.var_gaussian) a partir dos momentos."""
+    sigma0 = np.sqrt(m2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        skew = m3 / sigma0**3
+        kurt = m4 / sigma0**4
+    z = dm.norm_ppf(level / 100)
+    z_cf = (z +
+            (z**2 - 1) * skew / 6 +
+            (z**3 - 3 * z) * (kurt - 3) / 24 -
+            (2 * z**3 - 5 * z) * (skew**2) / 36)
+    return -(media + z * sigma0), -(media + z_cf * sigma0), skew, kurt
+
+
+def vars_moveis(retornos, janela=252, niveis=(1, 2.5, 5)):
+    """
+    VaR móvel dos três modelos em vários níveis, de uma vez: {(modelo, nível): ndarray (datas x ativos)}.
+    Modelos: 'Histórico', 'Normal' e 'Cornish-Fisher'. Linhas alinhadas a 'retornos' (NaN no aquecimento).
+    """
+    x = retornos.to_numpy(dtype=np.float64)
+    T, N = x.shape
+    if T < janela:
+        raise ValueError(f"São necessárias ao menos {janela} observações (recebidas: {T})")
+    incompleta = _somas_moveis(np.isnan(x).astype(np.float64), janela) > 0
+    momentos = _momentos_moveis(x, janela)
+    var_hist, _ = _cauda_movel(x, janela, niveis)
+    aquecimento = np.full((janela - 1, N), np.nan)
+    resultado = {}
+    for i, nivel in enumerate(niveis):
+        var_normal, var_cf, _, _ = _var_parametrico(*momentos, nivel)
+        for modelo, valores in [('Histórico', var_hist[i]), ('Normal', var_normal), ('Cornish-Fisher', var_cf)]:
+            resultado[(modelo, nivel)] = np.vstack([aquecimento, np.where(incompleta, np.nan, valores)])
+    return resultado
+
+
+def metricas_moveis(retornos, janela=252, bench_ret=None, level=5, periods_per_year=252):
+    """
+    Retorna um dicionário {métrica: DataFrame (datas x ativos)} com as séries móveis:
+    'Volatilidade', 'Skew', 'Kurt', 'VaR_Normal', 'VaR_Hist', 'VaR_CF', 'CVaR' e 'Beta'.
+    As primeiras janela-1 linhas (e qualquer janela com NaN) ficam NaN, como no pandas.rolling.
+
+    Parâmetros:
+    - retornos: DataFrame (dias x ativos).
+    - bench_ret: retornos do benchmark (Series alinhada) ou nome de uma coluna de 'retornos'.
+    """
+    if isinstance(bench_ret, str):
+        bench_ret = retornos[bench_ret]
+    x = retornos.to_numpy(dtype=np.float64)
+    T, N = x.shape
+    if T < janela:
+        raise ValueError(f"São necessárias ao menos {janela} observações (recebidas: {T})")
+
+    incompleta = _somas_moveis(np.isnan(x).astype(np.float64), janela) > 0
+    media, m2, m3, m4 = _momentos_moveis(x, janela)
+    vol = np.sqrt(m2 * janela / (janela - 1)) * np.sqrt(periods_per_year)
+    var_normal, var_cf, skew, kurt = _var_parametrico(media, m2, m3, m4, level)
+    var_hist, cvar = (a[0] for a in _cauda_movel(x, janela, [level]))
+
+    if bench_ret is None:
+        beta = np.full_like(media, np.nan)
+    else:
+        b = np.asarray(bench_ret, dtype=np.float64).reshape(-1)
+        # NaN do benchmark zerado antes das somas (senão contamina o cumsum de todas as janelas seguintes)
+        bench_incompleta = _somas_moveis(np.isnan(b)[:, None].astype(np.float64), janela) > 0
+        b = np.nan_to_num(b - np.nanmean(b))
+        d = np.nan_to_num(x - np.nanmean(x, axis=0))
+        e_b = _somas_moveis(b[:, None], janela) / janela
+        e_bb = _somas_moveis((b * b)[:, None], janela) / janela
+        e_xb = _somas_moveis(d * b[:, None], janela) / janela
+        e_x = _somas_moveis(d, janela) / janela
+        with np.errstate(invalid='ignore', divide='ignore'):
+            beta = (e_xb - e_x * e_b) / (e_bb - e_b**2)
+        beta = np.where(bench_incompleta, np.nan, beta)  # Janela com NaN no benchmark: sem Beta, como no pandas
+
+    indice = retornos.index[janela - 1:]
+    resultado = {}
+    for nome, valores in [('Volatilidade', vol), ('Skew', skew), ('Kurt', kurt),
+                          ('VaR_Normal', var_normal), ('VaR_Hist', var_hist),
+                          ('VaR_CF', var_cf), ('CVaR', cvar), ('Beta', beta)]:
+        valores = np.where(incompleta, np.nan, valores)
+        df = pd.DataFrame(valores, index=indice, columns=retornos.columns)
+        resultado[nome] = df.reindex(retornos.index)
+    return resultado
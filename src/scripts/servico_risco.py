@@ -0,0 +1,511 @@
+import sys
+import copy
+import json
+import math
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import pandas as pd
+
+import dados_mercado as dm
+import motor_metricas as mm
+import risco_carteira as rc
+import covariancia as cv
+import cenarios_stress as cs
+import snapshot_precos as sp
+import relatorio_excel as rel
+import instrumentacao as ins
+
+# ==============================================================================
+# SERVIÇO DE RISCO RESIDENTE (ESTADO QUENTE + API JSON LOCAL)
+# Carrega a base uma vez e mantém em memória a matriz de retornos, os
+# acumuladores de momentos (dm.AcumuladorMomentos), a covariância amostral e
+# EWMA (covariancia.MatrizCovariancia) e a tabela de métricas. As perguntas
+# ("VaR CF de 1% da PETR4?", risco de uma carteira, replay de uma crise) são
+# respondidas por HTTP em 127.0.0.1, em milissegundos, sem reimportar nada.
+#
+# Atualização: uma thread confere a geração da base (bp.geracao, a mesma que
+# invalida o snapshot) a cada INTERVALO_VERIFICACAO segundos; POST /atualizar
+# força a conferência (ex.: logo depois do ETL). Se só entraram dias novos no
+# fim, acumuladores e covariâncias recebem apenas esses dias; ticker novo ou
+# histórico revisto = recarga completa.
+#
+# Leituras concorrentes: o estado é um objeto que não muda depois de publicado.
+# A atualização monta o próximo ao lado e troca a referência de uma vez; cada
+# requisição pega a referência no início e responde inteira com ela, então
+# nunca vê metade de uma atualização e não espera por ela.
+#
+# Rotas (JSON):
+#   GET  /saude                                  geração, data, ativos, dias, atualizações
+#   GET  /metricas?tickers=PETR4.SA,VALE3.SA&level=1
+#   GET  /momentos?tickers=...                   média, variância, skew e curtose (acumuladores)
+#   GET  /covariancia?tickers=...&ewma=1&correlacao=0
+#   GET  /betas?bench=^BVSP&ewma=0
+#   GET  /cenarios?tickers=...                   replay das crises (cenarios_stress.CENARIOS)
+#   POST /carteira  {"pesos": {...}, "level": 5, "ewma": true}   resumo + VaR componente
+#   POST /cenarios  {"pesos": {...}}                              replay com as carteiras
+#   POST /choques   {"pesos": {...}, "choques": {...}}            P&L instantâneo
+#   POST /atualizar                                               confere a base agora
+# "pesos" = {ticker: peso} (uma carteira) ou {nome: {ticker: peso}} (várias).
+# Uso: python servico_risco.py [--porta 8765] [--db mercado.db] [--intervalo 30]
+# ==============================================================================
+
+PORTA = 8765
+INTERVALO_VERIFICACAO = 30  # segundos entre conferências da geração da base (0 = só POST /atualizar)
+LEVEL = 5                   # Nível da tabela de métricas calculada a cada atualização
+LIMITE_CORPO = 1 << 20      # Maior corpo aceito num POST (bytes)
+MAX_NIVEIS_CACHE = 4        # Níveis além do LEVEL com a tabela de métricas guardada (os mais recentes)
+TENTATIVAS_LEITURA = 3      # Releituras se a base mudar durante a carga dos retornos
+
+
+class ErroConsulta(ValueError):
+    """Parâmetro inválido na requisição (vira HTTP 400)."""
+
+
+def carregar_retornos(caminho_db, tickers=None):
+    """Retornos diários de todos os tickers da base (ou dos pedidos), como no relatório."""
+    precos = sp.ler_precos(caminho_db)
+    tickers = [t for t in (tickers or precos.columns) if t in precos.columns]
+    return precos[tickers].dropna(how='all').pct_change().dropna()
+
+
+# ==============================================================================
+# ESTADO (IMUTÁVEL DEPOIS DE PUBLICADO)
+# ==============================================================================
+
+class EstadoRisco:
+    """
+    Uma fotografia da base: retornos, acumuladores, covariâncias e métricas.
+    Não é alterada depois de criada; o que é calculado sob demanda (métricas em
+    outro nível, replay das crises) fica num cache próprio desta fotografia. As
+    métricas do LEVEL ficam sempre; dos outros níveis, só os MAX_NIVEIS_CACHE últimos.
+    """
+
+    def __init__(self, geracao, retornos, acumulador, matriz, modo, t0):
+        self.geracao = geracao
+        self.retornos = retornos
+        self.tickers = list(retornos.columns)
+        self.acumulador = acumulador
+        self.matriz = matriz
+        self.modo = modo
+        self.carregado_em = datetime.now().isoformat(timespec='seconds')
+        bench = cv.BENCHMARK
+        self.bench_ret = retornos[bench] if bench in retornos.columns else None
+        self._cache = {}
+        self._metricas_level = self._calcular_metricas(LEVEL)
+        self._niveis = OrderedDict()  # level -> tabela de métricas (LRU)
+        self._trava_niveis = threading.Lock()
+        self.segundos = round(time.perf_counter() - t0, 3)
+
+    @classmethod
+    def completo(cls, geracao, retornos):
+        """Fotografia a partir do zero (primeira carga, ticker novo ou histórico revisto)."""
+        t0 = time.perf_counter()
+        acumulador = dm.AcumuladorMomentos(retornos.columns).update(retornos)
+        return cls(geracao, retornos, acumulador, cv.MatrizCovariancia(retornos), 'completa', t0)
+
+    def seguinte(self, geracao, retornos):
+        """
+        Próxima fotografia. Se os retornos atuais são um prefixo dos novos (mesmos tickers,
+        mesmas datas e valores), só os dias novos passam pelos acumuladores e covariâncias.
+        """
+        t0 = time.perf_counter()
+        n = len(self.retornos)
+        prefixo = (list(retornos.columns) == self.tickers and len(retornos) >= n
+                   and retornos.index[:n].equals(self.retornos.index)
+                   and np.array_equal(retornos.to_numpy()[:n], self.retornos.to_numpy(), equal_nan=True))
+        if not prefixo:
+            return EstadoRisco.completo(geracao, retornos)
+        novos = retornos.iloc[n:]
+        acumulador, matriz = copy.deepcopy(self.acumulador), copy.deepcopy(self.matriz)
+        if len(novos):
+            acumulador.update(novos)
+            matriz.atualizar(novos)
+        return EstadoRisco(geracao, retornos, acumulador, matriz, 'incremental', t0)
+
+    def _calcular_metricas(self, level):
+        return mm.tabela_metricas(self.retornos, self.bench_ret, rel.RISK_FREE, 252, level=level)
+
+    def metricas(self, level=LEVEL):
+        """Tabela de métricas (motor_metricas) no nível pedido; cada nível é calculado uma vez."""
+        if level == LEVEL:
+            return self._metricas_level
+        with self._trava_niveis:
+            tabela = self._niveis.get(level)
+            if tabela is not None:
+                self._niveis.move_to_end(level)
+                return tabela
+        tabela = self._calcular_metricas(level)  # Fora da trava; corrida benigna: mesmo resultado
+        with self._trava_niveis:
+            self._niveis[level] = tabela
+            while len(self._niveis) > MAX_NIVEIS_CACHE:
+                self._niveis.popitem(last=False)
+        return tabela
+
+    def cenarios(self):
+        chave = ('cenarios',)
+        if chave not in self._cache:
+            self._cache[chave] = cs.replay_cenarios(self.retornos)
+        return self._cache[chave]
+
+    def resumo(self):
+        return {'geracao': self.geracao, 'ultima_data': self.retornos.index[-1].strftime('%Y-%m-%d'),
+                'ativos': len(self.tickers), 'dias': len(self.retornos), 'carregado_em': self.carregado_em,
+                'modo': self.modo, 'segundos_carga': self.segundos}
+
+
+# ==============================================================================
+# SERVIÇO (REFERÊNCIA AO ESTADO ATUAL + ATUALIZAÇÃO)
+# ==============================================================================
+
+class ServicoRisco:
+    """Mantém o EstadoRisco atual e o troca quando a geração da base muda."""
+
+    def __init__(self, caminho_db=None, tickers=None):
+        self.caminho_db = caminho_db or rel.CAMINHO_DB
+        self.tickers = tickers
+        self.atualizacoes = 0
+        self._trava_atualizacao = threading.Lock()  # Uma atualização por vez; leituras não usam trava
+        self.estado = None
+        self.atualizar()
+        if self.estado is None:
+            raise RuntimeError(f"Sem retornos na base {self.caminho_db}")
+
+    def atualizar(self):
+        """
+        Confere a geração da base e, se mudou, publica o próximo estado. Retorna o que foi feito.
+        A geração é relida depois da carga: se o ETL gravou no meio, os retornos podem ser
+        de uma geração mais nova que a conferida, então a carga é refeita com a nova.
+        """
+        with self._trava_atualizacao:
+            atual = self.estado
+            geracao = sp.geracao_atual(self.caminho_db)
+            if atual is not None and geracao == atual.geracao:
+                return {**atual.resumo(), 'modo': 'inalterada'}
+            for _ in range(TENTATIVAS_LEITURA):
+                retornos = carregar_retornos(self.caminho_db, self.tickers)
+                depois = sp.geracao_atual(self.caminho_db)
+                if depois == geracao:
+                    break
+                geracao = depois
+            else:
+                raise RuntimeError(f"base mudou durante {TENTATIVAS_LEITURA} leituras seguidas; tenta no próximo ciclo")
+            if retornos.empty:
+                return {'modo': 'sem dados'}
+            novo = EstadoRisco.completo(geracao, retornos) if atual is None else atual.seguinte(geracao, retornos)
+            self.estado = novo  # Troca atômica da referência: leituras em curso seguem com o estado anterior
+            if atual is not None:
+                self.atualizacoes += 1
+            return novo.resumo()
+
+
+def _lista(parametros, nome):
+    valor = parametros.get(nome)
+    return [t for t in valor[0].split(',') if t] if valor else None
+
+
+def _numero(parametros, nome, padrao):
+    try:
+        return float(parametros[nome][0]) if nome in parametros else padrao
+    except ValueError:
+        raise ErroConsulta(f"'{nome}' deve ser numérico")
+
+
+def _nivel(valor):
+    """Nível do VaR/ES em %, estritamente entre 0 e 100."""
+    try:
+        level = float(valor)
+    except (TypeError, ValueError):
+        raise ErroConsulta("'level' deve ser numérico")
+    if not 0 < level < 100:  # Também recusa nan
+        raise ErroConsulta(f"'level' deve estar entre 0 e 100 (exclusive), recebido {valor!r}")
+    return level
+
+
+def _flag(parametros, nome, padrao=False):
+    return parametros[nome][0].lower() in ('1', 'true', 'sim') if nome in parametros else padrao
+
+
+def _tickers(estado, pedidos):
+    """Tickers pedidos (padrão: todos), com erro claro para os que não estão na base."""
+    if not pedidos:
+        return estado.tickers
+    faltando = [t for t in pedidos if t not in estado.tickers]
+    if faltando:
+        raise ErroConsulta(f"tickers fora da base: {faltando}")
+    return pedidos
+
+
+def _numerica(linhas, nome):
+    """{linha: {ticker: valor}} -> DataFrame de floats finitos (ausente = 0); senão 400."""
+    tabela = pd.DataFrame.from_dict(linhas, orient='index')
+    try:
+        valores = tabela.to_numpy(dtype=np.float64, copy=True)
+    except (TypeError, ValueError):
+        raise ErroConsulta(f"'{nome}' deve ter valores numéricos")
+    valores[np.isnan(valores)] = 0.0
+    if not np.isfinite(valores).all():
+        raise ErroConsulta(f"'{nome}' deve ter valores finitos")
+    return pd.DataFrame(valores, index=tabela.index, columns=tabela.columns)
+
+
+def _pesos(estado, pesos):
+    """{ticker: peso} ou {nome: {ticker: peso}} -> DataFrame carteiras x tickers da base."""
+    if not isinstance(pesos, dict) or not pesos:
+        raise ErroConsulta("'pesos' deve ser {ticker: peso} ou {nome: {ticker: peso}}")
+    carteiras = pesos if all(isinstance(v, dict) for v in pesos.values()) else {'Carteira': pesos}
+    tabela = _numerica(carteiras, 'pesos')
+    try:
+        W, nomes = rc._como_pesos(tabela, estado.tickers)  # Ticker fora da base -> ValueError
+    except ValueError as e:
+        raise ErroConsulta(str(e))
+    return pd.DataFrame(W, index=nomes, columns=estado.tickers)
+
+
+def _tabela(df):
+    return {str(i): linha for i, linha in df.to_dict(orient='index').items()}
+
+
+# Rotas: (método, caminho) -> função(estado, parâmetros da URL, corpo JSON)
+ROTAS = {}
+
+
+def rota(metodo, caminho):
+    def registrar(func):
+        ROTAS[metodo, caminho] = func
+        return func
+    return registrar
+
+
+@rota('GET', '/metricas')
+def _(estado, q, corpo):
+    level = _nivel(_numero(q, 'level', LEVEL))
+    tabela = estado.metricas(level)
+    return {'level': level, 'metricas': _tabela(tabela.loc[_tickers(estado, _lista(q, 'tickers'))])}
+
+
+@rota('GET', '/momentos')
+def _(estado, q, corpo):
+    acc = estado.acumulador
+    tabela = pd.DataFrame({'n': pd.Series(acc.n, index=acc.tickers), 'media': acc.media(),
+                           'variancia': acc.variancia(), 'skew': acc.skewness(), 'kurt': acc.kurtosis()})
+    return {'momentos': _tabela(tabela.loc[_tickers(estado, _lista(q, 'tickers'))])}
+
+
+@rota('GET', '/covariancia')
+def _(estado, q, corpo):
+    tickers = _tickers(estado, _lista(q, 'tickers'))
+    ewma = _flag(q, 'ewma')
+    matriz = estado.matriz.alinhada(tickers, ewma=ewma)
+    if _flag(q, 'correlacao'):
+        matriz = cv.correlacao_de(matriz)
+    return {'tickers': tickers, 'ewma': ewma, 'matriz': matriz.tolist()}
+
+
+@rota('GET', '/betas')
+def _(estado, q, corpo):
+    bench = q.get('bench', [cv.BENCHMARK])[0]
+    _tickers(estado, [bench])
+    return {'bench': bench, 'betas': estado.matriz.betas(bench, ewma=_flag(q, 'ewma')).to_dict()}
+
+
+@rota('GET', '/cenarios')
+def _(estado, q, corpo):
+    resultado = estado.cenarios()
+    tickers = _tickers(estado, _lista(q, 'tickers'))
+    return {'cenarios': _tabela(resultado['cenarios']),
+            **{k: _tabela(resultado[k][tickers]) for k in ('pnl', 'max_dd', 'pior_dia')}}
+
+
+@rota('POST', '/cenarios')
+def _(estado, q, corpo):
+    pesos = _pesos(estado, corpo.get('pesos'))
+    resultado = cs.replay_cenarios(estado.retornos, pesos)
+    nomes = list(pesos.index)
+    return {'cenarios': _tabela(resultado['cenarios']),
+            **{k: _tabela(resultado[k][nomes]) for k in ('pnl', 'max_dd', 'pior_dia')}}
+
+
+@rota('POST', '/carteira')
+def _(estado, q, corpo):
+    pesos = _pesos(estado, corpo.get('pesos'))
+    level = _nivel(corpo.get('level', LEVEL))
+    usados = list(pesos.columns[(pesos != 0).any()])  # Só os ativos com peso entram no cálculo
+    cov = estado.matriz.alinhada(usados, ewma=True) if corpo.get('ewma') else None
+    risco = rc.risco_carteiras(estado.retornos[usados], pesos[usados], level, cov)
+    return {'level': level, 'ewma': bool(corpo.get('ewma')), 'resumo': _tabela(risco['resumo']),
+            'componente': _tabela(risco['componente'])}
+
+
+@rota('POST', '/choques')
+def _(estado, q, corpo):
+    choques = corpo.get('choques')
+    if not isinstance(choques, dict) or not choques:
+        raise ErroConsulta("'choques' deve ser {ticker: retorno} ou {nome: {ticker: retorno}}")
+    choques = _numerica(choques if all(isinstance(v, dict) for v in choques.values()) else {'Choque': choques},
+                        'choques')
+    _tickers(estado, list(choques.columns))
+    return {'pnl': _tabela(cs.aplicar_choques(_pesos(estado, corpo.get('pesos')), choques, estado.tickers))}
+
+
+def _json(obj):
+    """NaN/inf -> null, datas -> ISO, tipos NumPy -> nativos (JSON estrito)."""
+    if isinstance(obj, dict):
+        return {str(k): _json(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_json(v) for v in obj]
+    if isinstance(obj, (float, np.floating)):
+        return float(obj) if math.isfinite(obj) else None
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, (pd.Timestamp, datetime)):
+        return obj.strftime('%Y-%m-%d')
+    return obj
+
+
+# ==============================================================================
+# HTTP
+# ==============================================================================
+
+class _Requisicao(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # Conexão persistente: o cliente não paga um handshake por consulta
+    disable_nagle_algorithm = True  # Cabeçalho e corpo saem em writes separados (sem esperar o ACK atrasado)
+
+    def _responder(self, codigo, conteudo):
+        corpo = json.dumps(_json(conteudo), ensure_ascii=False).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _tratar(self, metodo):
+        partes = urlsplit(self.path)
+        q = parse_qs(partes.query)
+        try:
+            try:
+                tamanho = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                tamanho = -1
+            if not 0 <= tamanho <= LIMITE_CORPO:
+                self.close_connection = True  # O corpo não foi lido: o que vier depois no socket não é requisição
+                raise ErroConsulta(f"Content-Length inválido (entre 0 e {LIMITE_CORPO} bytes): "
+                                   f"{self.headers.get('Content-Length')!r}")
+            corpo = json.loads(self.rfile.read(tamanho) or b'{}') if tamanho else {}
+            if not isinstance(corpo, dict):
+                raise ErroConsulta("o corpo deve ser um objeto JSON")
+            servico = self.server.servico
+            if (metodo, partes.path) == ('POST', '/atualizar'):
+                resposta = servico.atualizar()
+            elif partes.path == '/saude' and metodo == 'GET':
+                resposta = {**servico.estado.resumo(), 'atualizacoes': servico.atualizacoes}
+            elif (metodo, partes.path) in ROTAS:
+                estado = servico.estado  # Uma referência por requisição: resposta coerente mesmo durante uma atualização
+                t0 = time.perf_counter()
+                resposta = ROTAS[metodo, partes.path](estado, q, corpo)
+                resposta.update(geracao=estado.geracao, ms=round((time.perf_counter() - t0) * 1000, 3))
+            else:
+                self._responder(404, {'erro': f"rota inexistente: {metodo} {partes.path}"})
+                return
+        except (ErroConsulta, json.JSONDecodeError) as e:
+            self._responder(400, {'erro': str(e)})
+            return
+        except Exception as e:
+            self._responder(500, {'erro': f"{type(e).__name__}: {e}"})
+            return
+        self._responder(200, resposta)
+
+    def do_GET(self):
+        self._tratar('GET')
+
+    def do_POST(self):
+        self._tratar('POST')
+
+    def log_message(self, formato, *args):
+        pass  # Sem uma linha no console por consulta
+
+
+class ServidorRisco(ThreadingHTTPServer):
+    """
+    Serviço HTTP em 127.0.0.1 numa thread de fundo, como o smtp_local:
+        with ServidorRisco(servico) as srv:
+            ... http://127.0.0.1:{srv.porta}/metricas ...
+    intervalo > 0 liga a thread que confere a geração da base.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, servico, porta=PORTA, intervalo=INTERVALO_VERIFICACAO):
+        super().__init__(('127.0.0.1', porta), _Requisicao)
+        self.porta = self.server_address[1]
+        self.servico = servico
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+        self._vigia = None
+
+    def _vigiar(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                resultado = self.servico.atualizar()
+                if resultado.get('modo') not in ('inalterada', 'sem dados'):
+                    print(f"🔄 Estado atualizado ({resultado['modo']}): geração {resultado['geracao']}, "
+                          f"{resultado['dias']} dias x {resultado['ativos']} ativos em {resultado['segundos_carga']:.2f}s")
+            except Exception as e:  # A base pode estar no meio de uma carga; tenta de novo no próximo ciclo
+                print(f"⚠️ Atualização falhou: {type(e).__name__}: {e}")
+
+    def iniciar_vigia(self):
+        if self.intervalo:
+            self._vigia = threading.Thread(target=self._vigiar, name='servico_risco_vigia', daemon=True)
+            self._vigia.start()
+        return self
+
+    def iniciar(self):
+        self.iniciar_vigia()
+        threading.Thread(target=self.serve_forever, name='servico_risco', daemon=True).start()
+        return self
+
+    def fechar(self):
+        self._parar.set()
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviço de risco residente (API JSON em 127.0.0.1)")
+    parser.add_argument("--porta", type=int, default=PORTA)
+    parser.add_argument("--db", default=rel.CAMINHO_DB, help="caminho do mercado.db")
+    parser.add_argument("--intervalo", type=float, default=INTERVALO_VERIFICACAO,
+                        help="segundos entre conferências da base (0 = só POST /atualizar)")
+    parser.add_argument("--tickers", nargs="+", help="só estes tickers (padrão: todos da base)")
+    args = parser.parse_args(argv)
+
+    with ins.execucao('servico_carga', args.db):
+        with ins.etapa('estado_inicial'):
+            servico = ServicoRisco(args.db, args.tickers)
+    r = servico.estado.resumo()
+    srv = ServidorRisco(servico, args.porta, args.intervalo)
+    print(f"🛰️  Serviço de risco em http://127.0.0.1:{srv.porta} ({r['ativos']} ativos x {r['dias']} dias, "
+          f"até {r['ultima_data']}, geração {r['geracao']})")
+    srv.iniciar_vigia()
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{servico.atualizacoes} atualizações do estado")
+        srv._parar.set()
+        srv.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+import threading
+import socketserver
+
+# ==============================================================================
+# SERVIDOR SMTP LOCAL (DUBLÊ PARA TESTES E BENCHMARKS)
+# Implementa só o necessário do protocolo (EHLO/HELO, MAIL, RCPT, DATA, RSET,
+# NOOP, QUIT) para medir a distribuição offline, sem relay nem internet.
+# Cada conexão roda numa thread; as mensagens são contadas e, se houver pasta,
+# gravadas como .eml. Falhas podem ser simuladas:
+#   recusar={emails}     -> 550 no RCPT (falha permanente, sem retentativa)
+#   falhas_temporarias=n -> as n primeiras mensagens recebem 451 no fim do DATA
+#   derrubar_a_cada=n    -> fecha a conexão depois de n mensagens aceitas
+#   atraso=s             -> espera s segundos antes de aceitar cada mensagem (latência)
+# Como Postfix/Exchange, recusa (550) o DATA com LF sem CR antes (proteção contra
+# SMTP smuggling): um cabeçalho dobrado com '\n' não passa despercebido nos testes.
+# Uso: python smtp_local.py [porta] [pasta]    (Ctrl+C para parar)
+# ==============================================================================
+
+LIMITE_LINHA = 1 << 16
+
+
+class _Sessao(socketserver.StreamRequestHandler):
+    """Uma conexão SMTP: lê comandos linha a linha e responde no formato do RFC 5321."""
+
+    def responder(self, texto):  # Respostas em ASCII puro (RFC 5321)
+        self.wfile.write(texto.encode('ascii') + b"\r\n")
+
+    def handle(self):
+        srv = self.server
+        self.responder("220 smtp_local pronto")
+        remetente, destinatarios, aceitas = None, [], 0
+        while True:
+            linha = self.rfile.readline(LIMITE_LINHA)
+            if not linha:
+                return
+            comando = linha.decode('utf-8', 'replace').strip()
+            verbo = comando[:4].upper()
+            if verbo == 'EHLO':
+                self.wfile.write(b"250-smtp_local\r\n250-8BITMIME\r\n250 SIZE 0\r\n")
+            elif verbo == 'HELO':
+                self.responder("250 smtp_local")
+            elif verbo == 'MAIL':
+                remetente, destinatarios = comando[10:].strip(' <>'), []
+                self.responder("250 OK")
+            elif verbo == 'RCPT':
+                email = comando[8:].strip(' <>')
+                if email in srv.recusar:
+                    self.responder(f"550 Caixa inexistente: {email}")
+                else:
+                    destinatarios.append(email)
+                    self.responder("250 OK")
+            elif verbo == 'DATA':
+                if not destinatarios:
+                    self.responder("503 Sem destinatarios")
+                    continue
+                self.responder("354 Termine com <CRLF>.<CRLF>")
+                corpo, lf_solto = self._ler_dados()
+                if corpo is None:
+                    return
+                if lf_solto:
+                    self.responder("550 LF sem CR no DATA (RFC 5321 2.3.8)")
+                    remetente, destinatarios = None, []
+                    continue
+                if srv.atraso:
+                    time.sleep(srv.atraso)
+                if srv.registrar(remetente, destinatarios, corpo):
+                    self.responder("250 OK: mensagem aceita")
+                    aceitas += 1
+                else:
+                    self.responder("451 Falha temporaria simulada")
+                remetente, destinatarios = None, []
+                if srv.derrubar_a_cada and aceitas >= srv.derrubar_a_cada:
+                    return  # Sem 221: o cliente vê a conexão cair no próximo comando
+            elif verbo == 'RSET':
+                remetente, destinatarios = None, []
+                self.responder("250 OK")
+            elif verbo == 'NOOP':
+                self.responder("250 OK")
+            elif verbo == 'QUIT':
+                self.responder("221 Ate logo")
+                return
+            else:
+                self.responder("502 Comando nao implementado")
+
+    def _ler_dados(self):
+        """
+        Lê o conteúdo do DATA até a linha com um ponto só (desfazendo o dot-stuffing).
+        Devolve (conteúdo, houve LF sem CR); (None, False) se a conexão cair.
+        """
+        partes, lf_solto = [], False
+        while True:
+            linha = self.rfile.readline(LIMITE_LINHA)
+            if not linha:
+                return None, False
+            if linha == b".\r\n":
+                return b"".join(partes), lf_solto
+            lf_solto |= linha.endswith(b"\n") and not linha.endswith(b"\r\n")
+            partes.append(linha[1:] if linha.startswith(b"..") else linha)
+
+
+class ServidorSMTPLocal(socketserver.ThreadingTCPServer):
+    """
+    Servidor SMTP em memória numa thread de fundo. Use como context manager:
+        with ServidorSMTPLocal() as srv:
+            ... host='127.0.0.1', porta=srv.porta ...
+        srv.mensagens, srv.bytes, srv.destinatarios
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, porta=0, pasta=None, recusar=(), falhas_temporarias=0, derrubar_a_cada=None, atraso=0.0):
+        super().__init__(('127.0.0.1', porta), _Sessao)
+        self.porta = self.server_address[1]
+        self.pasta = pasta
+        self.recusar = set(recusar)
+        self.falhas_temporarias = falhas_temporarias
+        self.derrubar_a_cada = derrubar_a_cada
+        self.atraso = atraso
+        self.mensagens = 0
+        self.bytes = 0
+        self.destinatarios = []
+        self._trava = threading.Lock()
+        self._thread = None
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+    def registrar(self, remetente, destinatarios, corpo):
+        """Conta (e grava) a mensagem; False = responder com falha temporária."""
+        with self._trava:
+            if self.falhas_temporarias > 0:
+                self.falhas_temporarias -= 1
+                return False
+            self.mensagens += 1
+            self.bytes += len(corpo)
+            self.destinatarios.extend(destinatarios)
+            n = self.mensagens
+        if self.pasta:
+            with open(os.path.join(self.pasta, f"{n:06d}.eml"), 'wb') as f:
+                f.write(corpo)
+        return True
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='smtp_local', daemon=True)
+        self._thread.start()
+        return self
+
+    def fechar(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+if __name__ == "__main__":
+    porta = int(sys.argv[1]) if len(sys.argv) > 1 else 8025
+    pasta = sys.argv[2] if len(sys.argv) > 2 else None
+    srv = ServidorSMTPLocal(porta, pasta)
+    print(f"📮 SMTP local em 127.0.0.1:{srv.porta}" + (f" (gravando em {pasta})" if pasta else ""))
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{srv.mensagens} mensagens / {srv.bytes / 1e6:.1f} MB recebidos")
+        srv.server_close()
@@ -0,0 +1,170 @@
+import os
+import json
+import sqlite3
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+import base_precos as bp
+
+# ==============================================================================
+# SNAPSHOT COLUNAR DOS PREÇOS (.npy MAPEADO EM MEMÓRIA)
+# O ETL publica, ao lado do mercado.db, uma cópia colunar da tabela 'precos':
+# uma matriz float64 por campo (datas x tickers, ordem Fortran = cada ticker
+# contíguo), o índice de datas e o de tickers. Os leitores abrem com
+# np.load(mmap_mode='r'): sem SQL, sem parse de datas, sem cópia.
+# Validade: o manifesto guarda a geração da base (bp.geracao); qualquer escrita
+# pelo base_precos incrementa a geração e o snapshot deixa de ser usado.
+# ==============================================================================
+
+PASTA = "snapshot_precos"
+MANIFESTO = "manifesto.json"
+
+
+def pasta_snapshot(caminho_db):
+    return os.path.join(os.path.dirname(os.path.abspath(caminho_db)), PASTA)
+
+
+def _arquivo(pasta, geracao, nome):
+    return os.path.join(pasta, f"g{geracao}_{nome}.npy")
+
+
+def _ler_manifesto(pasta):
+    try:
+        with open(os.path.join(pasta, MANIFESTO), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def geracao_atual(caminho_db):
+    """Geração da base lida em modo somente leitura (não cria schema nem arquivo)."""
+    if not os.path.exists(caminho_db):
+        return None
+    try:
+        conn = sqlite3.connect(f"file:{os.path.abspath(caminho_db)}?mode=ro", uri=True, timeout=30)
+        try:
+            return bp.geracao(conn)
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None  # Base antiga, sem a tabela de versão
+
+
+def atual(caminho_db):
+    """True se existe snapshot publicado para a geração atual da base."""
+    manifesto = _ler_manifesto(pasta_snapshot(caminho_db))
+    return manifesto is not None and manifesto["geracao"] == geracao_atual(caminho_db)
+
+
+def publicar(conn, caminho_db, campos=bp.CAMPOS):
+    """
+    Grava o snapshot da tabela inteira para a geração atual. Os arquivos levam a
+    geração no nome e o manifesto é trocado por último (os.replace), então um leitor
+    nunca vê uma mistura de duas publicações. Retorna o manifesto.
+    """
+    pasta = pasta_snapshot(caminho_db)
+    os.makedirs(pasta, exist_ok=True)
+
+    # Geração e dados lidos na mesma transação de leitura (WAL: o ETL não interfere)
+    aberta = not conn.in_transaction
+    if aberta:
+        conn.execute("BEGIN")
+    try:
+        geracao = bp.geracao(conn)
+        matrizes, datas, tickers = bp.ler_matrizes_numpy(conn, campos=campos, ordem="F")
+    finally:
+        if aberta:
+            conn.rollback()
+
+    for campo, matriz in matrizes.items():
+        np.save(_arquivo(pasta, geracao, campo), matriz)
+    np.save(_arquivo(pasta, geracao, "datas"), datas.values.astype("datetime64[ns]"))
+    np.save(_arquivo(pasta, geracao, "tickers"), np.asarray(tickers, dtype=str))
+
+    manifesto = {"geracao": geracao, "campos": list(campos), "datas": len(datas), "tickers": len(tickers),
+                 "publicado_em": datetime.now().isoformat(timespec="seconds")}
+    temporario = os.path.join(pasta, MANIFESTO + ".tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f)
+    os.replace(temporario, os.path.join(pasta, MANIFESTO))
+
+    # Limpa gerações antigas (no Windows um arquivo ainda mapeado por um leitor fica para a próxima)
+    for nome in os.listdir(pasta):
+        if nome.endswith(".npy") and not nome.startswith(f"g{geracao}_"):
+            try:
+                os.remove(os.path.join(pasta, nome))
+            except OSError:
+                pass
+    return manifesto
+
+
+def republicar(conn, caminho_db):
+    """publicar() para quem acabou de gravar: uma falha aqui só avisa (os leitores voltam ao SQLite)."""
+    try:
+        m = publicar(conn, caminho_db)
+        print(f"🗂️ Snapshot colunar publicado: {m['datas']} datas x {m['tickers']} ativos (geração {m['geracao']})")
+        return m
+    except Exception as e:
+        print(f"⚠️ Snapshot colunar não publicado: {e}")
+
+
+def invalidar(caminho_db):
+    """Remove o manifesto: o snapshot deixa de ser lido até a próxima publicação."""
+    try:
+        os.remove(os.path.join(pasta_snapshot(caminho_db), MANIFESTO))
+    except FileNotFoundError:
+        pass
+
+
+def carregar_numpy(caminho_db, campo="adj_close"):
+    """
+    (matriz, datas, tickers) do snapshot, ou None se ausente/desatualizado.
+    A matriz é um np.memmap somente leitura (datas x tickers, ordem Fortran).
+    """
+    pasta = pasta_snapshot(caminho_db)
+    manifesto = _ler_manifesto(pasta)
+    if manifesto is None or campo not in manifesto["campos"] or manifesto["geracao"] != geracao_atual(caminho_db):
+        return None
+    g = manifesto["geracao"]
+    try:
+        matriz = np.load(_arquivo(pasta, g, campo), mmap_mode="r")
+        datas = pd.DatetimeIndex(np.load(_arquivo(pasta, g, "datas")), name="Date")
+        tickers = np.load(_arquivo(pasta, g, "tickers")).tolist()
+    except (OSError, ValueError):
+        return None
+    return matriz, datas, tickers
+
+
+def carregar(caminho_db, tickers=None, campo="adj_close"):
+    """
+    Mesmo contrato de bp.ler_matriz (DataFrame Date x Ticker), mas do snapshot.
+    Sem filtro de tickers o DataFrame é uma vista do memmap (zero cópia).
+    Retorna None se o snapshot estiver ausente ou desatualizado.
+    """
+    lido = carregar_numpy(caminho_db, campo)
+    if lido is None:
+        return None
+    matriz, datas, colunas = lido
+    df = pd.DataFrame(matriz, index=datas, columns=colunas, copy=False)
+    if tickers is None:
+        return df
+    tickers = list(tickers)
+    return df.reindex(columns=tickers).dropna(how="all")
+
+
+def ler_precos(caminho_db, tickers=None, campo="adj_close"):
+    """Caminho rápido com fallback: snapshot se estiver em dia; senão republica a partir do SQLite."""
+    df = carregar(caminho_db, tickers, campo)
+    if df is not None:
+        return df
+    conn = bp.conectar(caminho_db)
+    try:
+        try:
+            publicar(conn, caminho_db)
+            df = carregar(caminho_db, tickers, campo)
+        except OSError as e:
+            print(f"⚠️ Snapshot de preços não publicado: {e}")
+        return df if df is not None else bp.ler_matriz(conn, tickers, campo=campo)
+    finally:
+        conn.close()
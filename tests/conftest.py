@@ -0,0 +1,37 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Os módulos ficam soltos em src/scripts (como os scripts os importam)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "scripts"))
+
+import base_precos as bp  # noqa: E402
+
+
+@pytest.fixture
+def criar_base(tmp_path):
+    """
+    Fábrica de mercado.db sintético: retornos normais -> preços (base 100) gravados com bp.upsert.
+    - crise: (início, fim, deslocamento) somado aos retornos de todos os ativos no período.
+    - estreias: {ticker: data} = sem cotação antes dessa data (IPO).
+    - dias_fora: últimos dias que NÃO vão para a base (o teste grava depois).
+    Retorna (caminho, preços de todos os dias).
+    """
+    def criar(datas, tickers, seed, media=0.0, vol=0.01, crise=None, estreias=None, dias_fora=0):
+        datas = pd.DatetimeIndex(datas, name='Date')
+        retornos = np.random.default_rng(seed).normal(media, vol, (len(datas), len(tickers)))
+        if crise is not None:
+            inicio, fim, deslocamento = crise
+            retornos[(datas >= inicio) & (datas <= fim)] += deslocamento
+        precos = pd.DataFrame(100 * np.cumprod(1 + retornos, axis=0), index=datas, columns=tickers)
+        for ticker, estreia in (estreias or {}).items():
+            precos.loc[precos.index < estreia, ticker] = np.nan
+        caminho = str(tmp_path / 'mercado.db')
+        conn = bp.conectar(caminho)
+        bp.upsert(conn, bp.para_formato_longo(precos.iloc[:len(precos) - dias_fora]))
+        conn.close()
+        return caminho, precos
+    return criar
@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.stats
+
+import backtest_var as bt
+import dados_mercado as dm
+
+JANELA = 100
+NIVEIS = (1, 5)
+PREVISORES = {
+    'Histórico': lambda w, nivel: dm.var_historic(w, level=nivel),
+    'Normal': lambda w, nivel: dm.var_gaussian(w, level=nivel),
+    'Cornish-Fisher': lambda w, nivel: dm.var_gaussian(w, level=nivel, modified=True),
+}
+
+
+@pytest.fixture(scope='module')
+def retornos():
+    gerador = np.random.default_rng(8)
+    datas = pd.bdate_range('2020-01-02', periods=420)
+    r = pd.DataFrame(gerador.standard_t(3, (len(datas), 2)) * 0.015, index=datas, columns=['AAAA3', 'BBBB3'])
+    r.iloc[200:205, 1] *= 4  # Exceções em sequência (Christoffersen)
+    r.iloc[300, 0] = np.nan
+    return r
+
+
+def _ll(n, p):
+    return n * math.log(p) if n > 0 else 0.0
+
+
+def _referencia(r, modelo, nivel):
+    """Um ativo, dia a dia: VaR da janela que termina em t-1 contra o retorno de t."""
+    p = nivel / 100
+    excecoes = []
+    for t in range(JANELA, len(r)):
+        janela = r.iloc[t - JANELA:t]
+        if janela.isna().any() or np.isnan(r.iloc[t]):
+            excecoes.append(None)
+            continue
+        excecoes.append(bool(r.iloc[t] < -PREVISORES[modelo](janela, nivel)))
+    validas = [e for e in excecoes if e is not None]
+    n, x = len(validas), sum(validas)
+    phat = x / n
+    lr_pof = max(-2 * (_ll(n - x, 1 - p) + _ll(x, p)) + 2 * (_ll(n - x, 1 - phat) + _ll(x, phat)), 0.0)
+
+    contagem = {(a, b): 0 for a in (False, True) for b in (False, True)}
+    for a, b in zip(excecoes[:-1], excecoes[1:]):
+        if a is not None and b is not None:
+            contagem[a, b] += 1
+    n00, n01, n10, n11 = (contagem[k] for k in [(False, False), (False, True), (True, False), (True, True)])
+    pi01 = n01 / (n00 + n01)
+    pi11 = n11 / (n10 + n11) if n10 + n11 else 0.0
+    pi = (n01 + n11) / (n00 + n01 + n10 + n11)
+    livre = _ll(n00, 1 - pi01) + _ll(n01, pi01) + _ll(n10, 1 - pi11) + _ll(n11, pi11)
+    lr_ind = max(-2 * (_ll(n00 + n10, 1 - pi) + _ll(n01 + n11, pi) - livre), 0.0)
+    return {'Observações': n, 'Exceções': x, 'LR_Kupiec': lr_pof, 'p_Kupiec': scipy.stats.chi2.sf(lr_pof, 1),
+            'LR_Christoffersen': lr_ind, 'p_CC': scipy.stats.chi2.sf(lr_pof + lr_ind, 2)}
+
+
+def test_backtest_bate_com_o_laco_por_ativo(retornos):
+    tabela = bt.backtest_var(retornos, janela=JANELA, niveis=NIVEIS).set_index(['Ativo', 'Modelo', 'Nível'])
+    assert tabela['Exceções'].sum() > 0
+    for ativo in retornos.columns:
+        for modelo in bt.MODELOS:
+            for nivel in NIVEIS:
+                linha = tabela.loc[(ativo, modelo, nivel)]
+                esperado = _referencia(retornos[ativo], modelo, nivel)
+                assert linha['Observações'] == esperado['Observações']
+                assert linha['Exceções'] == esperado['Exceções'], (ativo, modelo, nivel)
+                for coluna in ('LR_Kupiec', 'p_Kupiec', 'LR_Christoffersen', 'p_CC'):
+                    assert linha[coluna] == pytest.approx(esperado[coluna], rel=1e-9, abs=1e-12), coluna
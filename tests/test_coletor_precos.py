@@ -0,0 +1,85 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import coletor_precos as cp
+import etl_sql
+
+TICKERS = [f'T{i:02d}' for i in range(25)]
+
+
+@pytest.fixture(scope='module')
+def arquivo(tmp_path_factory):
+    datas = pd.bdate_range('2024-01-02', periods=30, name='Date')
+    precos = pd.DataFrame(np.random.default_rng(2).uniform(10, 20, (len(datas), len(TICKERS))),
+                          index=datas, columns=TICKERS)
+    caminho = tmp_path_factory.mktemp('coletor') / 'precos.csv'
+    precos.to_csv(caminho)
+    return str(caminho)
+
+
+class Relogio:
+    """dormir falso: guarda as esperas pedidas (e o instante alvo) sem esperar de verdade."""
+
+    def __init__(self):
+        self.esperas, self.alvos = [], []
+        self._trava = threading.Lock()
+
+    def __call__(self, segundos):
+        with self._trava:
+            self.esperas.append(segundos)
+            self.alvos.append(time.monotonic() + segundos)
+
+
+def _coletar(coletor, tickers=TICKERS):
+    resultados = list(coletor.coletar({pd.Timestamp('2024-01-02'): tickers}))
+    partes = [longo for longo, _ in resultados if longo is not None]
+    status = cp.tabela_status([linha for _, linhas in resultados for linha in linhas])
+    return (pd.concat(partes, ignore_index=True) if partes else None), status.set_index('Ticker')
+
+
+def test_ticker_com_erro_nao_derruba_o_lote(arquivo):
+    provedor = etl_sql.ProvedorArquivo(arquivo, mapa_nomes={}, tickers_com_erro=['T05'])
+    longo, status = _coletar(cp.Coletor(provedor, tamanho_lote=8, max_threads=1, dormir=Relogio()), TICKERS[:8])
+    assert status.loc['T05', 'Status'] == 'erro' and 'T05' in status.loc['T05', 'Erro']
+    ok = status.drop('T05')
+    assert (ok['Status'] == 'ok').all() and (ok['Cotações'] == 30).all()
+    assert sorted(longo['ticker'].unique()) == sorted(ok.index)
+    # 8 -> 4 -> 2 -> 1: cada nível gasta 1 chamada na metade boa e 3 (tentativas) na ruim
+    assert provedor.chamadas == 3 + 3 * (1 + 3)
+    assert status.loc['T05', 'Tentativas'] == 3 * 4
+
+
+def test_provedor_fora_do_ar_para_a_bissecao(arquivo):
+    provedor = etl_sql.ProvedorArquivo(arquivo, mapa_nomes={}, taxa_falha=1.0)
+    longo, status = _coletar(cp.Coletor(provedor, tamanho_lote=25, dormir=Relogio()))
+    assert longo is None
+    assert (status['Status'] == 'erro').all() and status['Erro'].str.startswith('ConnectionError').all()
+    assert provedor.chamadas == 3 * 3  # O lote e as duas metades, nada de descer até cada ticker
+
+
+def test_falhas_transitorias_com_backoff(arquivo):
+    relogio = Relogio()
+    provedor = etl_sql.ProvedorArquivo(arquivo, mapa_nomes={}, taxa_falha=0.3, seed=7)
+    coletor = cp.Coletor(provedor, tamanho_lote=5, max_threads=1, tentativas=10,
+                         espera_inicial=1.0, espera_maxima=4.0, dormir=relogio)
+    longo, status = _coletar(coletor)
+    assert (status['Status'] == 'ok').all() and len(longo) == 30 * len(TICKERS)
+    assert provedor.chamadas == status['Tentativas'].groupby(np.arange(len(TICKERS)) // 5).first().sum()
+    assert provedor.chamadas > 5 and len(relogio.esperas) == provedor.chamadas - 5
+    # Jitter entre metade e o total da espera, que dobra até espera_maxima
+    assert all(0.5 <= e <= 4.0 for e in relogio.esperas)
+
+
+def test_limite_de_chamadas_por_segundo(arquivo):
+    relogio = Relogio()
+    provedor = etl_sql.ProvedorArquivo(arquivo, mapa_nomes={})
+    coletor = cp.Coletor(provedor, tamanho_lote=3, max_threads=4, chamadas_por_segundo=10, dormir=relogio)
+    _, status = _coletar(coletor)
+    assert (status['Status'] == 'ok').all()
+    # Todas as chamadas menos a primeira esperam a vez; as vezes ficam espaçadas de 1/10 s
+    assert len(relogio.alvos) == provedor.chamadas - 1 == 8
+    assert (np.diff(sorted(relogio.alvos)) >= 0.1 - 1e-3).all()
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import covariancia as cv
+import dados_mercado as dm
+
+TICKERS = ['^BVSP', 'AAAA3', 'BBBB3', 'CCCC3']
+
+
+@pytest.fixture(scope='module')
+def retornos():
+    gerador = np.random.default_rng(5)
+    datas = pd.bdate_range('2022-01-03', periods=300)
+    r = gerador.standard_t(3, (len(datas), len(TICKERS))) * 0.015
+    r[:, 1:] += r[:, :1] * np.array([0.5, 1.0, 1.5])
+    return pd.DataFrame(r, index=datas, columns=TICKERS)
+
+
+def _ewma_laco(R, lam, semente):
+    """Recursão dia a dia do RiskMetrics: Σ = λ Σ + (1 - λ) r rᵀ."""
+    sigma = semente.copy()
+    for r in R:
+        sigma = lam * sigma + (1 - lam) * np.outer(r, r)
+    return sigma
+
+
+def test_amostral_bate_com_pandas_e_np_cov(retornos):
+    matriz = cv.MatrizCovariancia(retornos)
+    pd.testing.assert_frame_equal(matriz.covariancia(), retornos.cov(), rtol=1e-12)
+    pd.testing.assert_frame_equal(matriz.correlacao(), retornos.corr(), rtol=1e-12)
+    pd.testing.assert_series_equal(matriz.volatilidade(periods_per_year=252), dm.annualize_vol(retornos, 252), check_names=False, rtol=1e-12)
+    bench = retornos['^BVSP']
+    for ticker in TICKERS:
+        c = np.cov(retornos[ticker], bench)
+        assert matriz.betas()[ticker] == pytest.approx(c[0, 1] / c[1, 1], rel=1e-12)
+
+
+def test_ewma_e_atualizar_batem_com_a_recursao(retornos):
+    R = retornos.to_numpy()
+    inicial = retornos.iloc[:200]
+    semente = inicial.to_numpy().T @ inicial.to_numpy() / len(inicial)
+
+    matriz = cv.MatrizCovariancia(inicial, lam=0.94)
+    np.testing.assert_allclose(matriz.matriz(ewma=True), _ewma_laco(R[:200], 0.94, semente), rtol=1e-10)
+
+    # Lote sobreposto: só os dias depois de ultima_data entram, em duas levas
+    matriz.atualizar(retornos.iloc[:250]).atualizar(retornos)
+    np.testing.assert_allclose(matriz.matriz(ewma=True), _ewma_laco(R[200:], 0.94, _ewma_laco(R[:200], 0.94, semente)),
+                               rtol=1e-10)
+    pd.testing.assert_frame_equal(matriz.covariancia(), retornos.cov(), rtol=1e-10)
+    assert matriz.ultima_data == retornos.index[-1]
@@ -0,0 +1,56 @@
+import sqlite3
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dados_mercado as dm
+
+
+@pytest.mark.parametrize('copula,marginais', [('gaussiana', 'normal'), ('gaussiana', 'empirica'),
+                                              ('t', 'normal'), ('t', 'empirica')])
+def test_monte_carlo_respeita_memoria_max(copula, marginais):
+    retornos = pd.DataFrame(np.random.default_rng(1).standard_t(4, (1000, 40)) * 0.01)
+    sim = dm.SimuladorMonteCarlo(retornos, copula=copula, marginais=marginais)
+    sim.simular_var(n_cenarios=1000)  # Importa o scipy fora da medição
+    memoria_max = 8 * 1024**2
+    pesos = np.full((3, 40), 1 / 40)
+    tracemalloc.start()
+    try:
+        tabela = sim.simular_var(pesos, level=[1, 5], horizonte=2, n_cenarios=200_000, memoria_max=memoria_max)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert pico <= memoria_max
+    # Vários lotes dão o mesmo VaR que um lote só, a menos do ruído de simulação
+    unico = sim.simular_var(pesos, level=[1, 5], horizonte=2, n_cenarios=200_000, memoria_max=2 * 1024**3)
+    np.testing.assert_allclose(tabela.to_numpy(), unico.to_numpy(), rtol=0.05)
+
+
+def test_acumulador_momentos_merge_persistencia_e_marca_dagua(tmp_path):
+    datas = pd.bdate_range('2022-01-03', periods=600)
+    gerador = np.random.default_rng(11)
+    retornos = pd.DataFrame(gerador.standard_t(3, (len(datas), 3)) * 0.02, index=datas, columns=['A', 'B', 'C'])
+    retornos.iloc[:50, 2] = np.nan  # 'C' começa depois
+    retornos.iloc[[100, 250], 0] = np.nan
+
+    # Duas partições em paralelo + merge, depois persiste e recarrega
+    acc = dm.AcumuladorMomentos().update(retornos.iloc[:300]).merge(
+        dm.AcumuladorMomentos().update(retornos.iloc[300:500]))
+    conn = sqlite3.connect(str(tmp_path / "estado.db"))
+    acc.salvar(conn, "teste")
+    recarregado = dm.AcumuladorMomentos.carregar(conn, "teste")
+    assert recarregado.ultima_data().eq(datas[499]).all()
+
+    # Lote sobreposto (todo o histórico de novo): só os 100 dias novos entram
+    recarregado.update(retornos)
+    pd.testing.assert_series_equal(recarregado.skewness(), dm.skewness(retornos), check_names=False, rtol=1e-9)
+    pd.testing.assert_series_equal(recarregado.kurtosis(), dm.kurtosis(retornos), check_names=False, rtol=1e-9)
+    np.testing.assert_array_equal(recarregado.n, retornos.notna().sum().to_numpy())
+    pd.testing.assert_series_equal(recarregado.variancia(), retornos.var(), check_names=False, rtol=1e-9)
+
+    # Ticker novo depois da carga: o histórico dele entra inteiro (marca d'água por ticker)
+    recarregado.update(pd.DataFrame({'D': retornos['A']}))
+    assert recarregado.n[recarregado.tickers.index('D')] == retornos['A'].notna().sum()
+    conn.close()
@@ -0,0 +1,116 @@
+import os
+import email
+import email.policy
+
+import pytest
+
+import distribuicao as dist
+from smtp_local import ServidorSMTPLocal
+
+# ==============================================================================
+# DISTRIBUIÇÃO SMTP CONTRA O SERVIDOR LOCAL (SEM REDE)
+# Recusa permanente, falha temporária, conexão derrubada, reexecução pulada
+# pela tabela 'status_envio', nome do anexo com acento (RFC 2231) e assunto
+# longo dobrado com CRLF (o servidor local recusa LF solto, como o Postfix).
+# ==============================================================================
+
+ANEXO = "Relatório Ações.xlsx"
+
+
+@pytest.fixture
+def anexo(tmp_path):
+    caminho = tmp_path / ANEXO
+    caminho.write_bytes(os.urandom(200_000))
+    return str(caminho)
+
+
+def _config(porta, n=6, **smtp):
+    return {'smtp': {'host': '127.0.0.1', 'porta': porta, 'conexoes': 2, **smtp},
+            'destinatarios': [{'email': f"analista{i}@lab.local", 'nome': f"Analista {i}"} for i in range(n)]}
+
+
+def _distribuidor(config):
+    # Sem espera real entre tentativas
+    return dist.Distribuidor(config['smtp'], tentativas=3, dormir=lambda s: None)
+
+
+def test_recusa_permanente_nao_e_retentada(anexo):
+    with ServidorSMTPLocal(recusar={'analista1@lab.local'}) as srv:
+        config = _config(srv.porta)
+        status = dist.distribuir(config, anexo, distribuidor=_distribuidor(config)).set_index('Email')
+    recusado = status.loc['analista1@lab.local']
+    assert recusado['Status'] == 'recusado'
+    assert recusado['Tentativas'] == 1
+    assert (status.drop('analista1@lab.local')['Status'] == 'enviado').all()
+    assert srv.mensagens == 5
+
+
+def test_falha_temporaria_e_retentada(anexo):
+    with ServidorSMTPLocal(falhas_temporarias=2) as srv:
+        config = _config(srv.porta)
+        status = dist.distribuir(config, anexo, distribuidor=_distribuidor(config))
+    assert (status['Status'] == 'enviado').all()
+    assert status['Tentativas'].sum() == len(status) + 2
+    assert srv.mensagens == len(status)
+
+
+def test_conexao_derrubada_reconecta(anexo):
+    with ServidorSMTPLocal(derrubar_a_cada=2) as srv:
+        config = _config(srv.porta, n=9)
+        status = dist.distribuir(config, anexo, distribuidor=_distribuidor(config))
+    assert (status['Status'] == 'enviado').all()
+    assert sorted(srv.destinatarios) == sorted(d['email'] for d in config['destinatarios'])
+
+
+def test_reexecucao_pula_quem_ja_recebeu(anexo, tmp_path):
+    caminho_db = str(tmp_path / "mercado.db")
+    with ServidorSMTPLocal(recusar={'analista0@lab.local'}) as srv:
+        config = _config(srv.porta, n=4)
+        primeira = dist.distribuir(config, anexo, caminho_db=caminho_db, distribuidor=_distribuidor(config))
+        segunda = dist.distribuir(config, anexo, caminho_db=caminho_db, distribuidor=_distribuidor(config))
+    assert (primeira['Status'] == 'enviado').sum() == 3
+    situacao = segunda.set_index('Email')['Status']
+    assert situacao['analista0@lab.local'] == 'recusado'  # Recusa não conta como entregue: tenta de novo
+    assert (situacao.drop('analista0@lab.local') == 'ja_enviado').all()
+    assert srv.mensagens == 3
+
+    # Conteúdo novo = chave nova: todos recebem de novo
+    with open(anexo, 'ab') as f:
+        f.write(b"x")
+    with ServidorSMTPLocal() as srv:
+        config = _config(srv.porta, n=4)
+        terceira = dist.distribuir(config, anexo, caminho_db=caminho_db, distribuidor=_distribuidor(config))
+    assert (terceira['Status'] == 'enviado').all()
+
+
+def test_anexo_chega_intacto_com_nome_rfc2231(anexo, tmp_path):
+    pasta = tmp_path / "eml"
+    with ServidorSMTPLocal(pasta=str(pasta)) as srv:
+        config = _config(srv.porta, n=1)
+        dist.distribuir(config, anexo, distribuidor=_distribuidor(config))
+    with open(pasta / "000001.eml", 'rb') as f:
+        msg = email.message_from_binary_file(f, policy=email.policy.default)
+    partes = [p for p in msg.iter_attachments()]
+    assert len(partes) == 1
+    assert partes[0].get_filename() == ANEXO
+    with open(anexo, 'rb') as f:
+        assert partes[0].get_content() == f.read()
+
+
+def test_assunto_longo_dobrado_com_crlf(anexo, tmp_path):
+    pasta = tmp_path / "eml"
+    config_assunto = "Relatório de Risco{da_carteira} — VaR, CVaR, estresse e backtest — {nome} — {data}"
+    with ServidorSMTPLocal(pasta=str(pasta)) as srv:
+        config = {**_config(srv.porta, n=2), 'assunto': config_assunto}
+        config['destinatarios'][1]['carteira'] = "Ações Brasil"
+        status = dist.distribuir(config, anexo, distribuidor=_distribuidor(config))
+    assert (status['Status'] == 'enviado').all()  # O smtp_local recusa LF sem CR, como o Postfix
+    assuntos = []
+    for eml in sorted(pasta.iterdir()):
+        bruto = eml.read_bytes()
+        assert b"\n" not in bruto.replace(b"\r\n", b"")
+        msg = email.message_from_bytes(bruto, policy=email.policy.default)
+        assert b"\r\n =?utf-8?" in bruto.split(b"\r\nDate:")[0]  # Assunto codificado e dobrado
+        assuntos.append(str(msg['Subject']))
+    assert all(a.startswith("Relatório de Risco") for a in assuntos)
+    assert sum("da carteira Ações Brasil" in a for a in assuntos) == 1  # Modelo aplicado por destinatário
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import dados_mercado as dm
+import metricas_paralelas as mp
+import motor_metricas as mm
+import relatorio_excel as rel
+
+# ==============================================================================
+# PARIDADE DO MOTOR VETORIZADO COM AS FUNÇÕES DE 'dados_mercado' ATIVO A ATIVO
+# A referência é o laço por ticker que o calcular_metricas_sql fazia antes do
+# motor (mesmas funções, mesma ordem de operações), sobre preços com caudas
+# gordas, buracos e um ativo que começa depois (o dropna das linhas alinha tudo).
+# ==============================================================================
+
+TICKERS = ['^BVSP', 'AAAA3', 'BBBB3', 'CCCC3', 'DDDD3', 'EEEE3']
+
+
+@pytest.fixture(scope='module')
+def retornos():
+    gerador = np.random.default_rng(21)
+    datas = pd.bdate_range('2019-01-02', periods=900)
+    mercado = gerador.standard_t(3, len(datas)) * 0.012
+    choques = gerador.standard_t(3, (len(datas), len(TICKERS))) * 0.015
+    r = mercado[:, None] * np.linspace(0, 1.6, len(TICKERS)) + choques
+    r[:, 0] = mercado
+    precos = pd.DataFrame(50 * np.cumprod(1 + r, axis=0), index=datas, columns=TICKERS)
+    precos.iloc[:120, 3] = np.nan                       # 'CCCC3' estreia depois
+    precos.iloc[[200, 201, 450], [1, 4]] = np.nan       # Pregões sem cotação
+    return rel.retornos_de(precos, TICKERS)
+
+
+def _duracao_dd(r):
+    """Maior sequência de dias abaixo do pico anterior (dm.drawdown)."""
+    abaixo = (dm.drawdown(r)['Drawdown'] < 0).to_numpy()
+    maior = atual = 0
+    for b in abaixo:
+        atual = atual + 1 if b else 0
+        maior = max(maior, atual)
+    return maior
+
+
+def _referencia(retornos, level=5):
+    bench = retornos['^BVSP']
+    linhas = {}
+    for ticker in retornos.columns:
+        r = retornos[ticker]
+        max_dd = dm.drawdown(r)['Drawdown'].min()
+        downside_dev = r[r < 0].std(ddof=0) * np.sqrt(252)
+        ann_ret = dm.annualize_rets(r, 252)
+        matriz = np.cov(r, bench)
+        linhas[ticker] = {
+            'Retorno': dm.total_return(r), 'Retorno Anual': ann_ret, 'Volatilidade': dm.annualize_vol(r, 252),
+            'Sharpe': dm.sharpe_ratio(r, rel.RISK_FREE, 252),
+            'Sortino': (ann_ret - rel.RISK_FREE) / downside_dev if downside_dev != 0 else 0,
+            'Beta': matriz[0, 1] / matriz[1, 1], 'Max DD': max_dd, 'Duração DD': _duracao_dd(r),
+            'VaR_Normal': dm.var_gaussian(r, level=level, modified=False),
+            'VaR_Hist': dm.var_historic(r, level=level),
+            'VaR_CF': dm.var_gaussian(r, level=level, modified=True),
+            'CVaR': dm.cvar_historic(r, level=level), 'Worst Day': r.min(),
+            'Skew': dm.skewness(r), 'Kurt': dm.kurtosis(r),
+            'Calmar': ann_ret / abs(max_dd) if max_dd != 0 else 0,
+        }
+    return pd.DataFrame.from_dict(linhas, orient='index')[mm.COLUNAS_METRICAS].astype(float)
+
+
+@pytest.mark.parametrize('level', [1, 5])
+def test_tabela_metricas_bate_com_dados_mercado(retornos, level):
+    tabela = mm.tabela_metricas(retornos, retornos['^BVSP'], rel.RISK_FREE, 252, level=level)
+    esperado = _referencia(retornos, level)
+    pd.testing.assert_frame_equal(tabela, esperado, check_names=False, rtol=1e-9, atol=1e-12)
+
+
+def test_calcular_metricas_sql_e_shards_batem_com_a_referencia(retornos, monkeypatch):
+    monkeypatch.setattr(rel, 'USAR_CACHE', False)
+    mapa = dict.fromkeys(TICKERS, 'Setor')
+    df = rel.calcular_metricas_sql(retornos, mapa).set_index('Ativo')
+    esperado = _referencia(retornos)
+    colunas = [c for c in rel.COLUNAS_RELATORIO if c in esperado.columns]
+    pd.testing.assert_frame_equal(df[colunas].astype(float), esperado[colunas], check_names=False,
+                                  rtol=1e-9, atol=1e-12)
+
+    paralela = mp.tabela_metricas_paralela(retornos, retornos['^BVSP'], rel.RISK_FREE, 252, level=5,
+                                           n_processos=2, tamanho_shard=2)
+    pd.testing.assert_frame_equal(paralela, esperado, check_names=False, rtol=1e-9, atol=1e-12)
+
+
+def _referencia_drawdown(retornos):
+    linhas = {}
+    for ticker in retornos.columns:
+        dd = dm.drawdown(retornos[ticker])['Drawdown']
+        vale = dd.idxmin()
+        antes, depois = dd.loc[:vale], dd.loc[vale:].iloc[1:]
+        recuperacao = depois.index[depois >= 0][0] if (depois >= 0).any() else pd.NaT
+        linhas[ticker] = {
+            'Max DD': dd.min(), 'DD Médio': dd.mean(), 'Ulcer': np.sqrt((dd**2).mean()),
+            'Duração DD': _duracao_dd(retornos[ticker]),
+            'Dias p/ Recuperação': np.nan if recuperacao is pd.NaT else dd.index.get_loc(recuperacao) - dd.index.get_loc(vale),
+            'Pico': antes.index[antes >= 0][-1], 'Vale': vale, 'Recuperação': recuperacao,
+        }
+    return pd.DataFrame.from_dict(linhas, orient='index')
+
+
+def test_tabela_drawdown_bate_com_dados_mercado(retornos):
+    # Um ativo que afunda no fim e não volta ao pico: Recuperação NaT
+    retornos = retornos.assign(QUEDA=np.r_[retornos['AAAA3'].to_numpy()[:-100], np.full(100, -0.01)])
+    tabela = mm.tabela_drawdown(retornos)
+    esperado = _referencia_drawdown(retornos)
+    assert tabela.loc['QUEDA', 'Recuperação'] is pd.NaT and tabela['Recuperação'].notna().any()
+    pd.testing.assert_frame_equal(tabela, esperado[tabela.columns], check_names=False, check_dtype=False,
+                                  check_index_type=False, rtol=1e-9, atol=1e-12)
@@ -0,0 +1,35 @@
+import json
+
+import distribuicao as dist
+import enviar_email
+import pipeline
+from smtp_local import ServidorSMTPLocal
+
+
+def test_impressao_do_email_acompanha_distribuicao(tmp_path, monkeypatch):
+    caminho_config = tmp_path / "distribuicao.json"
+    caminho_db = str(tmp_path / "mercado.db")
+    monkeypatch.setattr(dist, 'CAMINHO_CONFIG', str(caminho_config))
+    monkeypatch.setattr(enviar_email, 'CAMINHO_DB', caminho_db)
+    anexo = tmp_path / "Relatorio.xlsx"
+    anexo.write_bytes(b"relatorio" * 1000)
+
+    def impressao(config):
+        caminho_config.write_text(json.dumps(config), encoding='utf-8')
+        return pipeline._impressao_email(None)
+
+    with ServidorSMTPLocal(recusar={'b@lab.local'}) as srv:
+        config = {'smtp': {'host': '127.0.0.1', 'porta': srv.porta},
+                  'destinatarios': [{'email': 'a@lab.local'}, {'email': 'b@lab.local'}]}
+        antes = impressao(config)
+        assert antes[1] == ['a@lab.local', 'b@lab.local']
+        dist.distribuir(config, str(anexo), caminho_db=caminho_db,
+                        distribuidor=dist.Distribuidor(config['smtp'], dormir=lambda s: None))
+    depois = impressao(config)
+    assert depois[1] == ['b@lab.local']  # Recusado segue pendente; quem recebeu sai
+    assert impressao(config) == depois    # Sem mudança: a etapa pode ser pulada
+
+    # Endereço corrigido (ou destinatário novo) muda a impressão mesmo com o relatório igual
+    config['destinatarios'][1]['email'] = 'b.correto@lab.local'
+    corrigida = impressao(config)
+    assert corrigida[0] != depois[0] and corrigida[1] == ['b.correto@lab.local']
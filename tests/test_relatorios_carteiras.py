@@ -0,0 +1,61 @@
+import json
+
+import pandas as pd
+import pytest
+
+import relatorio_excel as rel
+import relatorios_carteiras as rcar
+
+# Base sintética cobrindo o crash de 2020 (replay das crises) e com mais de um ano
+# de pregões (backtest); 'NOVA3' só começa a negociar em meados de 2021 (IPO).
+MESA_LONGA = {'nome': 'Longa', 'mapa_setores': {'^BVSP': 'Benchmark', 'AAAA3': 'Financeiro', 'BBBB3': 'Commodity'},
+              'pesos': {'AAAA3': 0.6, 'BBBB3': 0.4}}
+MESA_IPO = {'nome': 'IPO', 'mapa_setores': {'^BVSP': 'Benchmark', 'AAAA3': 'Financeiro', 'NOVA3': 'Varejo'},
+            'pesos': {'AAAA3': 0.5, 'NOVA3': 0.5}}
+
+
+@pytest.fixture
+def caminho_db(criar_base, monkeypatch):
+    monkeypatch.setattr(rel, 'USAR_CACHE', False)
+    caminho, _ = criar_base(pd.bdate_range('2019-01-02', '2021-12-30'), ['^BVSP', 'AAAA3', 'BBBB3', 'NOVA3'],
+                            seed=7, media=0.0003, vol=0.015, crise=('2020-02-24', '2020-03-23', -0.02),
+                            estreias={'NOVA3': '2021-06-01'})
+    return caminho
+
+
+def test_carteira_nao_depende_das_outras(caminho_db):
+    sozinha = rcar.fatiar(rcar.preparar([MESA_LONGA], caminho_db), MESA_LONGA)
+    comum = rcar.preparar([MESA_LONGA, MESA_IPO], caminho_db)
+    junto = rcar.fatiar(comum, MESA_LONGA)
+
+    assert not sozinha[1].empty and not sozinha[2].empty
+    for a, b in zip(sozinha, junto):
+        pd.testing.assert_frame_equal(a, b)
+    # A mesa do IPO tem a própria janela (mais curta), sem encurtar a outra
+    assert comum['de_carteira']['Longa'] != comum['de_carteira']['IPO']
+    assert 'Carteira IPO' in set(rcar.fatiar(comum, MESA_IPO)[0]['Ativo'])
+
+
+def test_peso_fora_do_mapa_rejeitado(tmp_path):
+    mesa = {**MESA_LONGA, 'setores': ['Benchmark', 'Financeiro']}  # BBBB3 (com peso) sai no filtro
+    caminho = tmp_path / 'carteiras.json'
+    caminho.write_text(json.dumps({'carteiras': [mesa]}), encoding='utf-8')
+    with pytest.raises(ValueError, match='BBBB3'):
+        rcar.carregar_config(str(caminho))
+
+
+def test_peso_sem_precos_rejeitado(caminho_db):
+    mesa = {**MESA_LONGA, 'mapa_setores': {**MESA_LONGA['mapa_setores'], 'ZZZZ3': 'Varejo'},
+            'pesos': {'AAAA3': 0.5, 'ZZZZ3': 0.5}}
+    with pytest.raises(ValueError, match='ZZZZ3'):
+        rcar.preparar([mesa], caminho_db)
+
+
+def test_relatorios_deterministicos(caminho_db, tmp_path):
+    manifestos = []
+    for pasta, n_processos in [('a', 1), ('b', 2)]:  # Com e sem pool: mesmos bytes
+        rcar.gerar_relatorios([MESA_LONGA, MESA_IPO], caminho_db, str(tmp_path / pasta), n_processos)
+        with open(tmp_path / pasta / rcar.NOME_MANIFESTO, encoding='utf-8') as f:
+            manifestos.append({e['arquivo']: e['sha256'] for e in json.load(f)['relatorios']})
+    assert len(manifestos[0]) == 2
+    assert manifestos[0] == manifestos[1]
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import cenarios_stress as cs
+import risco_carteira as rc
+
+
+@pytest.fixture
+def retornos():
+    datas = pd.bdate_range('2020-01-02', periods=200)
+    return pd.DataFrame(np.random.default_rng(5).normal(0, 0.01, (len(datas), 2)), index=datas, columns=['A', 'B'])
+
+
+def test_peso_em_ticker_desconhecido_e_erro(retornos):
+    pesos = pd.Series({'A': 0.5, 'ZZZ': 0.5})
+    with pytest.raises(ValueError, match='ZZZ'):
+        rc._como_pesos(pesos, list(retornos.columns))
+    with pytest.raises(ValueError, match='ZZZ'):
+        rc.risco_carteiras(retornos, pesos)
+    with pytest.raises(ValueError, match='ZZZ'):
+        cs.replay_cenarios(retornos, pesos)
+    with pytest.raises(ValueError, match='ZZZ'):
+        cs.aplicar_choques(pesos, {'A': -0.1}, list(retornos.columns))
+
+
+def test_pesos_parciais_completam_com_zero(retornos):
+    W, nomes = rc._como_pesos(pd.DataFrame({'B': [1.0]}, index=['So B']), list(retornos.columns))
+    assert nomes == ['So B']
+    np.testing.assert_array_equal(W, [[0.0, 1.0]])
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import dados_mercado as dm
+import risco_movel as rm
+
+JANELA = 60
+
+
+@pytest.fixture(scope='module')
+def retornos():
+    gerador = np.random.default_rng(4)
+    datas = pd.bdate_range('2021-01-04', periods=260)
+    r = pd.DataFrame(gerador.standard_t(3, (len(datas), 3)) * 0.015, index=datas, columns=['^BVSP', 'AAAA3', 'BBBB3'])
+    r.iloc[:, 1] += 0.8 * r.iloc[:, 0]
+    r.iloc[30, 1] = np.nan    # Buraco num ativo
+    r.iloc[150, 0] = np.nan   # E no benchmark: sem Beta nessas janelas
+    return r
+
+
+def _movel(r, func):
+    return r.rolling(JANELA).apply(func, raw=False)
+
+
+@pytest.mark.parametrize('level', [1, 5])
+def test_metricas_moveis_batem_com_pandas_rolling(retornos, level):
+    res = rm.metricas_moveis(retornos, JANELA, bench_ret='^BVSP', level=level)
+    bench = retornos['^BVSP']
+    esperado = {
+        'Volatilidade': retornos.rolling(JANELA).std() * np.sqrt(252),
+        'Skew': _movel(retornos, dm.skewness),
+        'Kurt': _movel(retornos, dm.kurtosis),
+        'VaR_Normal': _movel(retornos, lambda w: dm.var_gaussian(w, level=level)),
+        'VaR_CF': _movel(retornos, lambda w: dm.var_gaussian(w, level=level, modified=True)),
+        'VaR_Hist': _movel(retornos, lambda w: dm.var_historic(w, level=level)),
+        'CVaR': _movel(retornos, lambda w: dm.cvar_historic(w, level=level)),
+        'Beta': retornos.rolling(JANELA).cov(bench).div(bench.rolling(JANELA).var(), axis=0),
+    }
+    for nome, df in esperado.items():
+        # Somas acumuladas dos momentos: erro de arredondamento maior que o da conta direta
+        pd.testing.assert_frame_equal(res[nome], df, check_names=False, check_freq=False,
+                                      rtol=1e-6, atol=1e-9, obj=nome)
+
+
+def test_vars_moveis_batem_com_metricas_moveis(retornos):
+    vars_ = rm.vars_moveis(retornos, JANELA, niveis=(1, 5))
+    for nivel in (1, 5):
+        res = rm.metricas_moveis(retornos, JANELA, level=nivel)
+        for modelo, nome in [('Histórico', 'VaR_Hist'), ('Normal', 'VaR_Normal'), ('Cornish-Fisher', 'VaR_CF')]:
+            np.testing.assert_allclose(vars_[(modelo, nivel)], res[nome].to_numpy(), rtol=1e-12, equal_nan=True)
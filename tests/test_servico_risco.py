@@ -0,0 +1,124 @@
+import json
+import http.client
+
+import pandas as pd
+import pytest
+
+import base_precos as bp
+import servico_risco as sr
+
+
+@pytest.fixture
+def caminho_db(criar_base):
+    # Os 5 últimos pregões ficam fora da base: o teste de atualização grava depois
+    return criar_base(pd.bdate_range('2023-01-02', periods=300), ['^BVSP', 'AAAA3', 'BBBB3'], seed=3, dias_fora=5)
+
+
+@pytest.fixture
+def servidor(caminho_db):
+    with sr.ServidorRisco(sr.ServicoRisco(caminho_db[0]), porta=0, intervalo=0) as srv:
+        yield srv
+
+
+@pytest.fixture
+def cliente(servidor):
+    conexao = http.client.HTTPConnection('127.0.0.1', servidor.porta)
+
+    def consultar(url, corpo=None):
+        conexao.request('GET' if corpo is None else 'POST', url,
+                        body=None if corpo is None else json.dumps(corpo))
+        resposta = conexao.getresponse()
+        return resposta.status, json.loads(resposta.read())
+    yield consultar
+    conexao.close()
+
+
+@pytest.mark.parametrize('level', ['0', '100', '-1', '150', 'nan', 'abc'])
+def test_level_invalido_na_consulta(cliente, level):
+    status, corpo = cliente(f'/metricas?level={level}')
+    assert status == 400 and 'level' in corpo['erro']
+
+
+@pytest.mark.parametrize('level', [0, 100, 'abc', None, [1]])
+def test_level_invalido_na_carteira(cliente, level):
+    status, corpo = cliente('/carteira', {'pesos': {'AAAA3': 1.0}, 'level': level})
+    assert status == 400 and 'level' in corpo['erro']
+
+
+@pytest.mark.parametrize('corpo', [[1, 2], 'texto', 3])
+def test_corpo_que_nao_e_objeto(cliente, corpo):
+    status, resposta = cliente('/carteira', corpo)
+    assert status == 400 and 'objeto' in resposta['erro']
+
+
+def test_cache_de_niveis_limitado(caminho_db):
+    estado = sr.ServicoRisco(caminho_db[0]).estado
+    niveis = [0.5 + i for i in range(sr.MAX_NIVEIS_CACHE + 3)]  # Nenhum igual ao LEVEL
+    for level in niveis:
+        estado.metricas(level)
+    assert list(estado._niveis) == niveis[-sr.MAX_NIVEIS_CACHE:]
+    assert estado.metricas(sr.LEVEL) is estado._metricas_level
+
+
+def test_escrita_durante_a_carga_nao_fica_na_geracao_antiga(caminho_db, monkeypatch):
+    caminho, precos = caminho_db
+    servico = sr.ServicoRisco(caminho)
+    carregar = sr.carregar_retornos
+
+    def gravar(dias):
+        conn = bp.conectar(caminho)
+        bp.upsert(conn, bp.para_formato_longo(dias))
+        conn.close()
+
+    gravar(precos.iloc[-5:-4])
+    escritas = [precos.iloc[-4:-2], precos.iloc[-2:]]
+
+    def carregar_e_gravar(*args):
+        retornos = carregar(*args)
+        if escritas:  # O "ETL" grava logo depois da leitura, antes da geração ser conferida de novo
+            gravar(escritas.pop(0))
+        return retornos
+
+    monkeypatch.setattr(sr, 'carregar_retornos', carregar_e_gravar)
+    servico.atualizar()
+    conn = bp.conectar(caminho)
+    geracao = bp.geracao(conn)
+    conn.close()
+    # A geração publicada é a dos retornos que estão no estado: todos os dias gravados
+    assert servico.estado.geracao == geracao
+    assert servico.estado.retornos.index[-1] == precos.index[-1]
+    assert servico.atualizar()['modo'] == 'inalterada'
+
+
+def test_peso_fora_da_base_e_400(cliente):
+    status, corpo = cliente('/carteira', {'pesos': {'AAAA3': 0.5, 'ZZZZ3': 0.5}})
+    assert status == 400 and 'ZZZZ3' in corpo['erro']
+
+
+@pytest.mark.parametrize('pesos', [{'AAAA3': 'abc'}, {'AAAA3': [1]}, {'C1': {'AAAA3': 'abc'}}, {'AAAA3': 1e400}])
+def test_peso_nao_numerico_e_400(cliente, pesos):
+    status, corpo = cliente('/carteira', {'pesos': pesos})
+    assert status == 400 and 'pesos' in corpo['erro']
+
+
+@pytest.mark.parametrize('choques', [{'AAAA3': 'abc'}, {'Queda': {'AAAA3': {'x': 1}}}])
+def test_choque_nao_numerico_e_400(cliente, choques):
+    status, corpo = cliente('/choques', {'pesos': {'AAAA3': 1.0}, 'choques': choques})
+    assert status == 400 and 'choques' in corpo['erro']
+
+
+def test_choques_numericos(cliente):
+    status, corpo = cliente('/choques', {'pesos': {'AAAA3': 0.5, 'BBBB3': 0.5}, 'choques': {'AAAA3': -0.1}})
+    assert status == 200 and corpo['pnl']['Carteira']['Choque'] == pytest.approx(-0.05)
+
+
+@pytest.mark.parametrize('tamanho', ['abc', '-5', str(sr.LIMITE_CORPO + 1)])
+def test_content_length_invalido_e_400(servidor, tamanho):
+    conexao = http.client.HTTPConnection('127.0.0.1', servidor.porta, timeout=5)  # -5 bloqueava no read
+    conexao.putrequest('POST', '/carteira')
+    conexao.putheader('Content-Length', tamanho)
+    conexao.endheaders()
+    conexao.send(b'{}')
+    resposta = conexao.getresponse()
+    assert resposta.status == 400 and 'Content-Length' in json.loads(resposta.read())['erro']
+    conexao.close()